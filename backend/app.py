@@ -1,26 +1,236 @@
-from flask import Flask, request, jsonify, send_from_directory
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Blueprint, Flask, Response, current_app, g, has_request_context, request, jsonify, make_response, send_from_directory, stream_with_context
+from werkzeug.local import LocalProxy
 from datetime import date, time, datetime, timedelta
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+import sqlite3
+from sqlalchemy import event, func, tuple_, update, BigInteger
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 from flask_migrate import Migrate
 import os
+import base64
+import csv
+import functools
+import gc
+import hashlib
+import io
+import json
+import itertools
+import secrets
+import zlib
+import click
+from time import perf_counter
 from dotenv import load_dotenv
+try:
+    import orjson # optional: several times faster at encoding large list responses
+except ImportError:
+    orjson = None
+from cache import LRUCache, make_cache
+from conflicts import MAX_SHIFT_LENGTH, ConflictChecker, shift_interval
+from importer import FORMATS as IMPORT_FORMATS, InvalidRecord, chunks, parse_time_entry, read_records
+from metrics import RequestMetrics
+from overtime import daily_overtime
+from passwords import PasswordHasher, PasswordHasherBusy
+from tokens import InvalidToken, issue_token, verify_token
+from workcalendar import YearCalendar, day_type, national_calendar, working_days_by_year
 
 load_dotenv()
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///worktime.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+db = SQLAlchemy()
+migrate = Migrate()
+# Routes and CLI commands live on this blueprint so create_app() can build
+# independently configured apps (tests, benchmarks, WSGI workers).
+api = Blueprint('api', __name__, cli_group=None)
+# The annual report cache of the current app, see create_app()
+report_cache = LocalProxy(lambda: current_app.extensions['report_cache'])
+password_hasher = LocalProxy(lambda: current_app.extensions['password_hasher'])
+# YearCalendars with location closures, see work_calendar()
+calendar_cache = LocalProxy(lambda: current_app.extensions['calendar_cache'])
+request_metrics = LocalProxy(lambda: current_app.extensions['request_metrics'])
+
+def env_flag(name, default):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+def engine_options_for(database_uri):
+    """Connection pool settings for the configured database.
+
+    SQLite keeps SQLAlchemy's defaults and is tuned through PRAGMAs on connect
+    instead (see set_sqlite_pragmas); server databases get a sized pool with
+    pre-ping so workers survive database restarts and idle disconnects.
+    """
+    if database_uri.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': env_flag('DB_POOL_PRE_PING', True),
+    }
+
+def set_sqlite_pragmas(config, dbapi_connection, connection_record):
+    # SQLite ignores foreign keys unless asked; clock_in relies on the user FK.
+    # WAL lets readers run alongside the single writer, and busy_timeout makes
+    # concurrent writers (several worker processes) wait instead of failing
+    # with "database is locked".
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.execute(f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}")
+        if config['SQLITE_WAL']:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}")
+        cursor.close()
+
+def start_sql_timer(conn, cursor, statement, parameters, context, executemany):
+    context.sql_started = perf_counter()
+
+def stop_sql_timer(app, conn, cursor, statement, parameters, context, executemany):
+    # Counted towards the current request, if any; CLI commands only get the slow query log
+    elapsed = perf_counter() - context.sql_started
+    if has_request_context() and 'sql_statements' in g:
+        g.sql_statements += 1
+        g.sql_seconds += elapsed
+    slow_query_ms = app.config['SLOW_QUERY_MS']
+    if slow_query_ms and elapsed * 1000 >= slow_query_ms:
+        app.logger.warning('Slow query (%.1f ms) in %s: %s', elapsed * 1000,
+                           request.endpoint if has_request_context() else 'cli', ' '.join(statement.split())[:1000])
+
+def start_request_metrics():
+    g.request_started = perf_counter()
+    g.sql_statements = 0
+    g.sql_seconds = 0.0
+
+def record_request_metrics(response):
+    """Add the request to request_metrics and log it when over a slow threshold.
+
+    Streamed bodies (?stream=1, exports) are timed until the response
+    starts, not until the last chunk is sent.
+    """
+    elapsed = perf_counter() - g.request_started
+    endpoint = request.endpoint or 'unmatched'
+    request_metrics.observe(endpoint, request.method, response.status_code, elapsed, g.sql_statements, g.sql_seconds)
+    slow_request_ms = current_app.config['SLOW_REQUEST_MS']
+    slow_request_queries = current_app.config['SLOW_REQUEST_QUERIES']
+    if (slow_request_ms and elapsed * 1000 >= slow_request_ms) or (slow_request_queries and g.sql_statements >= slow_request_queries):
+        current_app.logger.warning('Slow request %s %s (%s): %.1f ms, %d SQL statements in %.1f ms', request.method,
+                                   request.path, endpoint, elapsed * 1000, g.sql_statements, g.sql_seconds * 1000)
+    return response
+
+def password_hash_max_pending(request_threads, configured=None):
+    """Hashes that may be running or queued, kept below the request thread count.
+
+    A single-threaded worker can only ever wait on one hash, so it gets one.
+    """
+    if request_threads < 1:
+        raise RuntimeError('REQUEST_THREADS must be at least 1')
+    if configured is None:
+        return max(1, request_threads // 2)
+    max_pending = int(configured)
+    if max_pending < 1 or (request_threads > 1 and max_pending >= request_threads):
+        raise RuntimeError(f'PASSWORD_HASH_MAX_PENDING must be between 1 and REQUEST_THREADS - 1 ({request_threads - 1}), '
+                           'so some request threads stay free during a login burst')
+    return max_pending
+
+def create_app(config=None):
+    """Application factory; config entries override the environment-derived defaults."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or 'sqlite:///worktime.db'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLITE_WAL'] = env_flag('SQLITE_WAL', True)
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    # Annual report cache: in-process LRU by default, shared Redis when a URL is set
+    # (needed once several worker processes must see the same invalidations).
+    app.config['REPORT_CACHE_URL'] = os.environ.get('REPORT_CACHE_URL')
+    app.config['REPORT_CACHE_SIZE'] = int(os.environ.get('REPORT_CACHE_SIZE', 4096))
+    app.config['REPORT_CACHE_TTL'] = int(os.environ.get('REPORT_CACHE_TTL', 3600))
+    # Signs the access tokens issued by /login. Every worker sharing a deployment
+    # needs the same SECRET_KEY; only tests and debug runs may go without one.
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY')
+    app.config['AUTH_TOKEN_TTL'] = int(os.environ.get('AUTH_TOKEN_TTL', 12 * 3600))
+    # Any werkzeug method string, e.g. 'scrypt:16384:8:1' or 'pbkdf2:sha256:600000'.
+    # Existing hashes are upgraded on the next successful login after a change.
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    app.config['PASSWORD_SALT_LENGTH'] = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+    # Request threads per worker process, as given to the server (gunicorn
+    # --threads, waitress threads). A login's request thread waits for its hash,
+    # so at most PASSWORD_HASH_MAX_PENDING of them (default: half) may be busy
+    # hashing; further logins get a 503 at once and the other threads stay free.
+    app.config['REQUEST_THREADS'] = int(os.environ.get('REQUEST_THREADS', 8))
+    # Threads hashing at once per process
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1)))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = os.environ.get('PASSWORD_HASH_MAX_PENDING')
+    # Minimum rest between an employee's shifts on different roster days (11h is
+    # the EU daily rest); split shifts within one day are exempt, 0 turns it off.
+    app.config['SHIFT_MIN_REST_HOURS'] = float(os.environ.get('SHIFT_MIN_REST_HOURS', 11))
+    # Time entry imports commit (and checkpoint) once per chunk of records
+    app.config['IMPORT_CHUNK_SIZE'] = int(os.environ.get('IMPORT_CHUNK_SIZE', 10_000))
+    # Derived overtime ignores days worked less than this beyond the schedule
+    app.config['OVERTIME_MIN_MINUTES'] = float(os.environ.get('OVERTIME_MIN_MINUTES', 15))
+    # Vacation working days accrued per employee and calendar year
+    app.config['VACATION_DAYS_PER_YEAR'] = float(os.environ.get('VACATION_DAYS_PER_YEAR', 20))
+    # Seconds a worker keeps a location's calendar before rereading its closures;
+    # changes made through the same worker apply at once.
+    app.config['CALENDAR_CACHE_TTL'] = int(os.environ.get('CALENDAR_CACHE_TTL', 300))
+    # Per-endpoint latency and SQL statistics, served at /metrics. Scrapers send
+    # METRICS_TOKEN as a bearer token; without one, a manager's token is needed.
+    app.config['METRICS_ENABLED'] = env_flag('METRICS_ENABLED', True)
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Warning log thresholds, 0 disables: one statement's duration, a request's
+    # duration, and a request's statement count (the usual sign of an N+1 loop).
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 0))
+    app.config['SLOW_REQUEST_MS'] = float(os.environ.get('SLOW_REQUEST_MS', 0))
+    app.config['SLOW_REQUEST_QUERIES'] = int(os.environ.get('SLOW_REQUEST_QUERIES', 0))
+    if config:
+        app.config.update(config)
+    if not app.config['SECRET_KEY']:
+        if not (app.config['TESTING'] or app.config['DEBUG']):
+            # A per-process random key would make each worker reject the tokens
+            # of the others, and log everyone out on every restart.
+            raise RuntimeError('SECRET_KEY is not set')
+        app.config['SECRET_KEY'] = secrets.token_hex(32)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options_for(app.config['SQLALCHEMY_DATABASE_URI']))
+    app.config['PASSWORD_HASH_MAX_PENDING'] = password_hash_max_pending(
+        app.config['REQUEST_THREADS'], app.config['PASSWORD_HASH_MAX_PENDING'])
+
+    db.init_app(app)
+    migrate.init_app(app, db)
+    app.extensions['report_cache'] = make_cache(
+        app.config['REPORT_CACHE_URL'], maxsize=app.config['REPORT_CACHE_SIZE'], ttl=app.config['REPORT_CACHE_TTL']
+    )
+    app.extensions['password_hasher'] = PasswordHasher(
+        app.config['PASSWORD_HASH_METHOD'], salt_length=app.config['PASSWORD_SALT_LENGTH'],
+        workers=app.config['PASSWORD_HASH_WORKERS'], max_pending=app.config['PASSWORD_HASH_MAX_PENDING']
+    )
+    app.extensions['calendar_cache'] = LRUCache(maxsize=256, ttl=app.config['CALENDAR_CACHE_TTL'])
+    app.extensions['request_metrics'] = RequestMetrics()
+    app.register_blueprint(api)
+    if app.config['METRICS_ENABLED']:
+        app.before_request(start_request_metrics)
+        app.after_request(record_request_metrics)
+
+    with app.app_context():
+        event.listen(db.engine, 'connect', functools.partial(set_sqlite_pragmas, app.config))
+        if app.config['METRICS_ENABLED'] or app.config['SLOW_QUERY_MS']:
+            event.listen(db.engine, 'before_cursor_execute', start_sql_timer)
+            event.listen(db.engine, 'after_cursor_execute', functools.partial(stop_sql_timer, app))
+
+    # Modules, models and the app itself live as long as the process. Moving
+    # them out of the collector's generations keeps the full collections that
+    # large responses (the schedule matrix, exports) trigger from walking them
+    # every time.
+    gc.collect()
+    gc.freeze()
+    return app
 
 # Define Models
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(120), nullable=False) # Store hashed passwords
+    password_hash = db.Column(db.String(255), nullable=False) # Store hashed passwords
     email = db.Column(db.String(120), unique=True, nullable=False)
     role = db.Column(db.String(20), nullable=False, default='employee') # e.g., employee, manager, admin
     # Add relationships
@@ -34,15 +244,23 @@ class User(db.Model):
 
 class Shift(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    date = db.Column(db.Date, nullable=False)
-    start_time = db.Column(db.Time, nullable=False)
-    end_time = db.Column(db.Time, nullable=False)
+    date = db.Column(db.Date, nullable=False) # Roster day, the day the shift starts
+    # Normalized [start_at, end_at) interval; a night shift ends on the next day
+    start_at = db.Column(db.DateTime, nullable=False)
+    end_at = db.Column(db.DateTime, nullable=False)
     location = db.Column(db.String(100))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     # status (e.g., pending, confirmed, cancelled) - can be added later
 
+    __table_args__ = (
+        db.Index('ix_shift_user_id_date', 'user_id', 'date'),
+        # Team-wide views (schedule matrix, manager date ranges) filter on date alone
+        db.Index('ix_shift_date', 'date'),
+        db.CheckConstraint('end_at > start_at', name='ck_shift_end_after_start'),
+    )
+
     def __repr__(self):
-        return f'<Shift {self.date} {self.start_time}-{self.end_time}>'
+        return f'<Shift {self.start_at}-{self.end_at}>'
 
 class TimeEntry(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -51,6 +269,16 @@ class TimeEntry(db.Model):
     clock_out_time = db.Column(db.DateTime)
     date = db.Column(db.Date, nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_time_entry_user_id_date', 'user_id', 'date'),
+        # Team-wide date ranges (payroll export, overtime derivation) filter on date alone
+        db.Index('ix_time_entry_date', 'date'),
+        # At most one open entry per user; clock_in relies on this instead of a pre-check
+        db.Index('uq_time_entry_user_id_open', 'user_id', unique=True,
+                 sqlite_where=db.text('clock_out_time IS NULL'),
+                 postgresql_where=db.text('clock_out_time IS NULL')),
+    )
+
     def __repr__(self):
         return f'<TimeEntry {self.user_id} on {self.date}>'
 
@@ -63,6 +291,11 @@ class VacationRequest(db.Model):
     reason = db.Column(db.String(200))
     requested_at = db.Column(db.DateTime, server_default=db.func.now())
 
+    __table_args__ = (
+        db.Index('ix_vacation_request_user_id_status_start_date', 'user_id', 'status', 'start_date'),
+        db.Index('ix_vacation_request_user_id_status_end_date', 'user_id', 'status', 'end_date'),
+    )
+
     def __repr__(self):
         return f'<VacationRequest {self.user_id} from {self.start_date} to {self.end_date}>'
 
@@ -75,14 +308,687 @@ class OvertimeEntry(db.Model):
     notes = db.Column(db.String(200))
     status = db.Column(db.String(20), nullable=False, default='pending') # pending, approved, rejected
     requested_at = db.Column(db.DateTime, server_default=db.func.now())
+    # manual (POST /overtime_entries) or derived (derive_overtime_entries)
+    source = db.Column(db.String(20), nullable=False, default='manual', server_default='manual')
+
+    __table_args__ = (
+        db.Index('ix_overtime_entry_user_id_date', 'user_id', 'date'),
+        # At most one derived entry per user and day, so reruns update it in place
+        db.Index('uq_overtime_entry_user_id_date_derived', 'user_id', 'date', unique=True,
+                 sqlite_where=db.text("source = 'derived'"),
+                 postgresql_where=db.text("source = 'derived'")),
+    )
 
     def __repr__(self):
         return f'<OvertimeEntry {self.user_id} on {self.date} for {self.hours} hours>'
 
-if __name__ == '__main__':
-    app.run(debug=True)
+class MonthlyHoursRollup(db.Model):
+    # Worked time per user and calendar month, kept in step with clock-outs so
+    # reports read at most 12 rows instead of every TimeEntry.
+    __tablename__ = 'monthly_hours_rollup'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    month = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    worked_microseconds = db.Column(db.BigInteger, nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<MonthlyHoursRollup {self.user_id} {self.year}-{self.month:02d}>'
+
+class VacationLedger(db.Model):
+    # Vacation working days per user and calendar year: the accrual and the
+    # days debited by approved (used) and pending requests. Recomputed from
+    # the user's requests whenever they change, so a balance is one row read.
+    __tablename__ = 'vacation_ledger'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    year = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    accrued_days = db.Column(db.Float, nullable=False)
+    used_days = db.Column(db.Integer, nullable=False, default=0)
+    pending_days = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<VacationLedger {self.user_id} {self.year}>'
+
+class ImportCheckpoint(db.Model):
+    # Progress of a resumable time entry import, written in the same
+    # transaction as each chunk so it never disagrees with the imported rows.
+    __tablename__ = 'import_checkpoint'
+    name = db.Column(db.String(255), primary_key=True)
+    records_done = db.Column(db.Integer, nullable=False, default=0)
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        return f'<ImportCheckpoint {self.name} at record {self.records_done}>'
+
+class LocationClosure(db.Model):
+    # Extra closed day of one work location (matching Shift.location), e.g. the
+    # patron saint's day, on top of the national holidays in workcalendar.
+    __tablename__ = 'location_closure'
+    id = db.Column(db.Integer, primary_key=True)
+    location = db.Column(db.String(100), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    name = db.Column(db.String(100), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('location', 'date', name='uq_location_closure_location_date'),
+    )
+
+    def __repr__(self):
+        return f'<LocationClosure {self.location} {self.date}>'
+
+# --- Helpers ---
+def month_bounds(year, month):
+    """Return the half-open date range [start, end) covering the given month."""
+    month_start = date(year, month, 1)
+    if month == 12:
+        month_end = date(year + 1, 1, 1)
+    else:
+        month_end = date(year, month + 1, 1)
+    return month_start, month_end
+
+class duration_microseconds(FunctionElement):
+    """Whole microseconds between two DateTime columns, as a portable SQL expression."""
+    type = BigInteger()
+    inherit_cache = True
+    name = 'duration_microseconds'
+
+@compiles(duration_microseconds)
+def _compile_duration_microseconds(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'CAST(EXTRACT(EPOCH FROM (%s - %s)) * 1000000 AS BIGINT)' % (
+        compiler.process(end, **kw), compiler.process(start, **kw))
+
+@compiles(duration_microseconds, 'sqlite')
+def _compile_duration_microseconds_sqlite(element, compiler, **kw):
+    # SQLite stores DateTime as 'YYYY-MM-DD HH:MM:SS.ffffff'. julianday() is a
+    # double and drifts by tens of microseconds, so combine whole epoch seconds
+    # with the fractional digits to keep the sum exact.
+    start, end = (compiler.process(clause, **kw) for clause in element.clauses)
+    return ("((CAST(strftime('%%s', %(end)s) AS INTEGER) - CAST(strftime('%%s', %(start)s) AS INTEGER)) * 1000000"
+            " + CAST(substr(%(end)s, 21, 6) AS INTEGER) - CAST(substr(%(start)s, 21, 6) AS INTEGER))"
+            % {'start': start, 'end': end})
+
+def split_by_month(start, end):
+    """Split [start, end) at month boundaries into (year, month, microseconds) parts.
+
+    An entry running past midnight at the end of a month (or year) counts
+    toward both months; there is always at least one part.
+    """
+    if start.month == end.month and start.year == end.year:
+        return [(start.year, start.month, (end - start) // timedelta(microseconds=1))]
+    parts = []
+    while True:
+        next_month = datetime.combine(month_bounds(start.year, start.month)[1], time())
+        part_end = min(end, next_month)
+        parts.append((start.year, start.month, (part_end - start) // timedelta(microseconds=1)))
+        if part_end >= end:
+            return parts
+        start = part_end
+
+def add_to_monthly_hours_rollup(user_id, year, month, worked_microseconds):
+    """Add one completed entry's time in a month to its rollup row in the current transaction."""
+    updated = MonthlyHoursRollup.query.filter_by(
+        user_id=user_id, year=year, month=month
+    ).update({
+        MonthlyHoursRollup.worked_microseconds: MonthlyHoursRollup.worked_microseconds + worked_microseconds,
+        MonthlyHoursRollup.entry_count: MonthlyHoursRollup.entry_count + 1
+    }, synchronize_session=False)
+    if not updated:
+        db.session.add(MonthlyHoursRollup(
+            user_id=user_id, year=year, month=month,
+            worked_microseconds=worked_microseconds, entry_count=1
+        ))
+
+def add_monthly_hours_deltas(deltas):
+    """Add {(user_id, year, month): [worked_microseconds, entry_count]} to the rollup.
+
+    Three statements however many months are touched: one read of the
+    existing keys, then an executemany UPDATE and an executemany INSERT.
+    Runs in the current transaction.
+    """
+    table = MonthlyHoursRollup.__table__
+    existing = set(db.session.execute(
+        db.select(table.c.user_id, table.c.year, table.c.month)
+        .where(table.c.user_id.in_({user_id for user_id, _, _ in deltas}))
+    ).all())
+    updates = []
+    inserts = []
+    for (user_id, year, month), (worked_microseconds, entry_count) in deltas.items():
+        if (user_id, year, month) in existing:
+            updates.append({'key_user_id': user_id, 'key_year': year, 'key_month': month,
+                            'add_microseconds': worked_microseconds, 'add_count': entry_count})
+        else:
+            inserts.append({'user_id': user_id, 'year': year, 'month': month,
+                            'worked_microseconds': worked_microseconds, 'entry_count': entry_count})
+    if updates:
+        db.session.execute(table.update().where(
+            table.c.user_id == db.bindparam('key_user_id'),
+            table.c.year == db.bindparam('key_year'),
+            table.c.month == db.bindparam('key_month')
+        ).values(
+            worked_microseconds=table.c.worked_microseconds + db.bindparam('add_microseconds'),
+            entry_count=table.c.entry_count + db.bindparam('add_count')
+        ), updates)
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+
+def rebuild_monthly_hours_rollup(user_id=None):
+    """Recompute monthly_hours_rollup from time_entry, for one user or everyone.
+
+    Returns the number of rollup rows written. The caller commits.
+    """
+    year_col = db.extract('year', TimeEntry.clock_in_time)
+    month_col = db.extract('month', TimeEntry.clock_in_time)
+    same_month = db.and_(
+        year_col == db.extract('year', TimeEntry.clock_out_time),
+        month_col == db.extract('month', TimeEntry.clock_out_time)
+    )
+    source = db.select(
+        TimeEntry.user_id,
+        year_col,
+        month_col,
+        func.sum(duration_microseconds(TimeEntry.clock_in_time, TimeEntry.clock_out_time)),
+        func.count(TimeEntry.id)
+    ).where(TimeEntry.clock_out_time.isnot(None), same_month).group_by(TimeEntry.user_id, year_col, month_col)
+    crossing = db.select(TimeEntry.user_id, TimeEntry.clock_in_time, TimeEntry.clock_out_time).where(
+        TimeEntry.clock_out_time.isnot(None), db.not_(same_month)
+    )
+
+    delete_rollup = MonthlyHoursRollup.query
+    if user_id is not None:
+        source = source.where(TimeEntry.user_id == user_id)
+        crossing = crossing.where(TimeEntry.user_id == user_id)
+        delete_rollup = delete_rollup.filter_by(user_id=user_id)
+    delete_rollup.delete(synchronize_session=False)
+
+    # Entries within one month are summed in SQL; the few that run past
+    # midnight into the next month are split here and added on top.
+    db.session.execute(MonthlyHoursRollup.__table__.insert().from_select(
+        ['user_id', 'year', 'month', 'worked_microseconds', 'entry_count'], source
+    ))
+    for entry_user_id, clock_in_time, clock_out_time in db.session.execute(crossing).all():
+        for year, month, worked_microseconds in split_by_month(clock_in_time, clock_out_time):
+            add_to_monthly_hours_rollup(entry_user_id, year, month, worked_microseconds)
+
+    return delete_rollup.count()
+
+def work_calendar(year, location=None):
+    """YearCalendar of a year with the closures of a Shift.location on top.
+
+    Without a location this is the shared national calendar. A location's
+    calendar costs one query and is then kept in calendar_cache.
+    """
+    if not location:
+        return national_calendar(year)
+    calendar = calendar_cache.get((year, location))
+    if calendar is None:
+        closures = db.session.execute(db.select(LocationClosure.date, LocationClosure.name).where(
+            LocationClosure.location == location,
+            LocationClosure.date >= date(year, 1, 1), LocationClosure.date < date(year + 1, 1, 1)
+        )).all()
+        calendar = YearCalendar(year, dict(closures))
+        calendar_cache.set((year, location), calendar)
+    return calendar
+
+def vacation_ledger_rows(requests):
+    """Ledger rows for (user_id, start_date, end_date, status) requests.
+
+    Days are working days of the national calendar (employees have no home
+    location), split by calendar year for requests spanning New Year;
+    rejected requests are ignored.
+    """
+    totals = {}
+    for user_id, start_date, end_date, status in requests:
+        if status not in ('approved', 'pending'):
+            continue
+        for year, days in working_days_by_year(start_date, end_date).items():
+            used_and_pending = totals.setdefault((user_id, year), [0, 0])
+            used_and_pending[0 if status == 'approved' else 1] += days
+    accrued_days = current_app.config['VACATION_DAYS_PER_YEAR']
+    return [{'user_id': user_id, 'year': year, 'accrued_days': accrued_days, 'used_days': used, 'pending_days': pending}
+            for (user_id, year), (used, pending) in totals.items()]
+
+def rebuild_vacation_ledger(user_id=None):
+    """Recompute vacation_ledger from the requests, for one user or everyone.
+
+    Returns the number of ledger rows written. The caller commits.
+    """
+    requests = db.select(
+        VacationRequest.user_id, VacationRequest.start_date, VacationRequest.end_date, VacationRequest.status
+    ).where(VacationRequest.status.in_(('approved', 'pending')))
+    delete_ledger = VacationLedger.query
+    if user_id is not None:
+        requests = requests.where(VacationRequest.user_id == user_id)
+        delete_ledger = delete_ledger.filter_by(user_id=user_id)
+    delete_ledger.delete(synchronize_session=False)
+
+    rows = vacation_ledger_rows(db.session.execute(requests, execution_options={'yield_per': EXPORT_BATCH_SIZE}))
+    if rows:
+        db.session.execute(VacationLedger.__table__.insert(), rows)
+    return len(rows)
+
+MAX_IMPORT_ERRORS = 100 # Rejected records reported back individually
+
+def import_time_entries(records, checkpoint=None, chunk_size=10_000, progress=None):
+    """Insert completed time entries from import records, one transaction per chunk.
+
+    Users are validated against an id set loaded once up front. With a
+    checkpoint name, records covered by an earlier run under that name are
+    skipped and progress is saved with each chunk, so an interrupted import
+    resumes where it stopped. progress(stats) is called after every commit.
+    Returns the totals with up to MAX_IMPORT_ERRORS rejected records.
+    """
+    user_ids_by_name = dict(db.session.execute(db.select(User.username, User.id)).all())
+    user_ids = set(user_ids_by_name.values())
+    state = db.session.get(ImportCheckpoint, checkpoint) if checkpoint else None
+    if checkpoint and state is None:
+        state = ImportCheckpoint(name=checkpoint, records_done=0, imported=0, rejected=0)
+    skipped = state.records_done if state else 0
+
+    stats = {'records': skipped, 'skipped': skipped, 'imported': 0, 'rejected': 0, 'errors': []}
+    started = perf_counter()
+    for chunk in chunks(itertools.islice(records, skipped, None), chunk_size):
+        rows = []
+        deltas = {}
+        for record in chunk:
+            stats['records'] += 1
+            try:
+                row = parse_time_entry(record, user_ids, user_ids_by_name)
+            except InvalidRecord as e:
+                stats['rejected'] += 1
+                if len(stats['errors']) < MAX_IMPORT_ERRORS:
+                    stats['errors'].append({'record': stats['records'], 'message': str(e)})
+                continue
+            rows.append(row)
+            for year, month, worked_microseconds in split_by_month(row['clock_in_time'], row['clock_out_time']):
+                delta = deltas.setdefault((row['user_id'], year, month), [0, 0])
+                delta[0] += worked_microseconds
+                delta[1] += 1
+
+        try:
+            if rows:
+                db.session.execute(TimeEntry.__table__.insert(), rows)
+                add_monthly_hours_deltas(deltas)
+            if state is not None:
+                state.records_done = stats['records']
+                state.imported += len(rows)
+                state.rejected += len(chunk) - len(rows)
+                state.updated_at = datetime.now()
+                db.session.add(state)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        stats['imported'] += len(rows)
+        # After the commit, as in clock_out: the version bump keeps reports
+        # built from the pre-import rollup out of the cache.
+        for user_id, year in {(user_id, year) for user_id, year, _ in deltas}:
+            report_cache.delete((user_id, year))
+
+        elapsed = perf_counter() - started
+        stats['seconds'] = round(elapsed, 3)
+        stats['rows_per_second'] = round((stats['records'] - skipped) / elapsed) if elapsed else 0
+        if progress:
+            progress(stats)
+
+    stats.setdefault('seconds', round(perf_counter() - started, 3))
+    stats.setdefault('rows_per_second', 0)
+    return stats
+
+MAX_PAGE_SIZE = 1000
+STREAM_BATCH_SIZE = 500
+
+def encode_cursor(date_value, row_id):
+    return base64.urlsafe_b64encode(f'{date_value.isoformat()},{row_id}'.encode()).decode()
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; raises ValueError on anything malformed."""
+    try:
+        date_str, id_str = base64.urlsafe_b64decode(cursor.encode()).decode().split(',')
+    except ValueError: # also covers binascii.Error and UnicodeDecodeError
+        raise ValueError('Malformed cursor')
+    return date.fromisoformat(date_str), int(id_str)
+
+def iso(value):
+    return None if value is None else value.isoformat()
+
+def json_dumps(payload):
+    """Encode to compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+def json_response(payload, status=200):
+    return Response(json_dumps(payload), status=status, mimetype='application/json')
+
+class ListSerializer:
+    """Selects only the columns a list endpoint returns and formats rows in bulk.
+
+    fields are (name, column, formatter) triples, formatter None for values
+    that are already JSON-ready; computed are (name, function) pairs whose
+    function receives the raw column values by name and returns one list.
+    Each formatter is mapped over a whole column at once instead of building
+    an ORM object and a dict per row.
+    """
+
+    def __init__(self, fields, joins=(), computed=()):
+        self.fields = fields
+        self.joins = joins
+        self.computed = computed
+        self.names = [name for name, _, _ in fields] + [name for name, _ in computed]
+
+    def statement(self, query):
+        """Core SELECT of just these columns, keeping the query's filters and order."""
+        for target, onclause in self.joins:
+            query = query.join(target, onclause)
+        return query.with_entities(*(column for _, column, _ in self.fields)).statement
+
+    def to_columns(self, rows):
+        raw = list(zip(*rows)) or [()] * len(self.fields)
+        columns = [list(map(formatter, values)) if formatter else list(values)
+                   for (_, _, formatter), values in zip(self.fields, raw)]
+        if self.computed:
+            raw_by_name = {name: values for (name, _, _), values in zip(self.fields, raw)}
+            columns.extend(compute(raw_by_name) for _, compute in self.computed)
+        return columns
+
+    def to_dicts(self, rows):
+        return [dict(zip(self.names, values)) for values in zip(*self.to_columns(rows))]
+
+    def to_columnar(self, rows):
+        return {'fields': self.names, 'columns': self.to_columns(rows)}
+
+def list_response(query, serializer, date_column, id_column, descending=False):
+    """Build the response for a list endpoint from an ORM query.
+
+    Without paging parameters the full list is returned, as before.
+    ?limit=N[&cursor=...] switches to keyset pagination on (date, id) and
+    returns {"items": [...], "next_cursor": ...}. ?stream=1 writes the JSON
+    array incrementally from a server-side cursor so memory stays flat.
+    ?format=columnar returns {"fields": [...], "columns": [[...], ...]} with
+    one array per field instead of an object per row.
+    """
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    columnar = request.args.get('format') == 'columnar'
+    stream = request.args.get('stream') in ('1', 'true')
+
+    if request.args.get('format') not in (None, 'columnar'):
+        return jsonify({'message': "format must be 'columnar'"}), 400
+    if columnar and stream:
+        return jsonify({'message': 'format=columnar cannot be streamed'}), 400
+
+    statement = serializer.statement(query)
+    serialize = serializer.to_columnar if columnar else serializer.to_dicts
+
+    if stream:
+        def generate():
+            yield b'['
+            result = db.session.execute(statement, execution_options={'yield_per': STREAM_BATCH_SIZE})
+            for index, rows in enumerate(result.partitions()):
+                # Each batch is encoded as one array; drop its brackets to splice it in
+                yield (b',' if index else b'') + json_dumps(serializer.to_dicts(rows))[1:-1]
+            yield b']'
+        return Response(stream_with_context(generate()), mimetype='application/json')
+
+    if limit is None and cursor is None:
+        return json_response(serialize(db.session.execute(statement).all()))
+
+    limit = MAX_PAGE_SIZE if limit is None else limit
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        return jsonify({'message': f'limit must be between 1 and {MAX_PAGE_SIZE}'}), 400
+
+    key = tuple_(date_column, id_column)
+    if descending:
+        statement = statement.order_by(None).order_by(date_column.desc(), id_column.desc())
+    else:
+        statement = statement.order_by(None).order_by(date_column, id_column)
+    if cursor:
+        try:
+            cursor_key = decode_cursor(cursor)
+        except ValueError:
+            return jsonify({'message': 'Invalid cursor'}), 400
+        statement = statement.where(key < cursor_key if descending else key > cursor_key)
+
+    rows = db.session.execute(statement.limit(limit + 1)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(getattr(rows[-1], date_column.key), getattr(rows[-1], id_column.key))
+
+    return json_response({'items': serialize(rows), 'next_cursor': next_cursor})
+
+PAST_YEAR_MAX_AGE = 7 * 24 * 3600
+
+def conditional_response(stamp, build_response, max_age=None):
+    """Answer with 304 when the client's ETag matches, otherwise build the body.
+
+    stamp is any cheap value that changes whenever the underlying rows do; it is
+    hashed together with the URL into a weak ETag. Without max_age the client
+    must revalidate on every use (no-cache), which costs one stamp query.
+    """
+    etag = hashlib.sha1(f'{request.full_path}|{tuple(stamp)}'.encode()).hexdigest()
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(build_response())
+    if response.status_code in (200, 304):
+        response.set_etag(etag, weak=True)
+        response.cache_control.private = True
+        if max_age:
+            response.cache_control.max_age = max_age
+        else:
+            response.cache_control.no_cache = True
+    return response
+
+def parse_date(value):
+    """Parse YYYY-MM-DD; same result as strptime but much cheaper in bulk."""
+    if len(value) == 10:
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def parse_hhmm(value):
+    """Parse HH:MM; same result as strptime but much cheaper in bulk."""
+    if len(value) == 5 and value[2] == ':':
+        try:
+            return time.fromisoformat(value)
+        except ValueError:
+            pass
+    return datetime.strptime(value, '%H:%M').time()
+
+def parse_shift_fields(data):
+    """Validate a shift payload and convert it to Shift column values.
+
+    Returns (fields, None) on success or (None, error_message).
+    """
+    user_id = data.get('user_id')
+    shift_date_str = data.get('date') # Expected format: YYYY-MM-DD
+    start_time_str = data.get('start_time') # Expected format: HH:MM
+    end_time_str = data.get('end_time') # Expected format: HH:MM
 
-@app.route('/register', methods=['POST'])
+    if not all([user_id, shift_date_str, start_time_str, end_time_str]):
+        return None, 'Missing required fields (user_id, date, start_time, end_time)'
+
+    try:
+        user_id = int(user_id)
+        shift_date = parse_date(shift_date_str)
+        start_time = parse_hhmm(start_time_str)
+        end_time = parse_hhmm(end_time_str)
+    except (TypeError, ValueError):
+        return None, 'Invalid date or time format. Use YYYY-MM-DD for date and HH:MM for time.'
+
+    if start_time == end_time:
+        return None, 'start_time and end_time must differ (an end before the start is on the next day)'
+
+    # An end before the start (22:00-06:00) is on the next day
+    start_at, end_at = shift_interval(shift_date, start_time, end_time)
+    return {
+        'user_id': user_id,
+        'date': shift_date,
+        'start_at': start_at,
+        'end_at': end_at,
+        'location': data.get('location')
+    }, None
+
+MANAGER_ROLES = ('manager', 'admin')
+
+def token_required(view):
+    """Require a valid 'Authorization: Bearer <token>' header.
+
+    The token is checked against its signature and expiry only, so no database
+    query is needed; its claims are available to the view as g.auth.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer' or not token:
+            return jsonify({'message': 'Missing bearer token'}), 401
+        try:
+            g.auth = verify_token(current_app.config['SECRET_KEY'], token.strip())
+        except InvalidToken as e:
+            return jsonify({'message': f'Invalid token: {e}'}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+def is_manager():
+    return g.auth['role'] in MANAGER_ROLES
+
+def resolve_user_id(requested_user_id):
+    """Return the id of the user a request acts on, defaulting to the caller.
+
+    Returns (user_id, None) or (None, error_response). Employees may only name
+    themselves; managers may name anyone, and only then is the user looked up.
+    """
+    own_user_id = g.auth['user_id']
+    if requested_user_id in (None, ''):
+        return own_user_id, None
+    try:
+        requested_user_id = int(requested_user_id)
+    except (TypeError, ValueError):
+        return None, (jsonify({'message': 'user_id must be an integer'}), 400)
+    if requested_user_id == own_user_id:
+        return own_user_id, None
+    if not is_manager():
+        return None, (jsonify({'message': "Not allowed to access another user's records"}), 403)
+    if db.session.get(User, requested_user_id) is None:
+        return None, (jsonify({'message': 'User not found'}), 404)
+    return requested_user_id, None
+
+def load_conflict_checker(user_ids, first_day, last_day):
+    """ConflictChecker indexing the users' shifts and approved vacations around [first_day, last_day].
+
+    Two indexed range queries, whatever the number of users or new shifts.
+    """
+    checker = ConflictChecker(min_rest=timedelta(hours=current_app.config['SHIFT_MIN_REST_HOURS']))
+    # Existing shifts that could overlap or crowd the new ones start at most
+    # one shift length plus the minimum rest away.
+    margin = timedelta(days=(MAX_SHIFT_LENGTH + checker.min_rest).days + 1)
+    shifts = db.session.execute(
+        db.select(Shift.id, Shift.user_id, Shift.date, Shift.start_at, Shift.end_at)
+        .where(Shift.user_id.in_(user_ids), Shift.date >= first_day - margin, Shift.date <= last_day + margin)
+    )
+    for shift_id, user_id, shift_date, start_at, end_at in shifts:
+        checker.add_shift(user_id, start_at, end_at, ref={'shift_id': shift_id}, day=shift_date)
+
+    vacations = {}
+    rows = db.session.execute(
+        db.select(VacationRequest.user_id, VacationRequest.start_date, VacationRequest.end_date)
+        .where(VacationRequest.user_id.in_(user_ids), VacationRequest.status == 'approved',
+               VacationRequest.start_date <= last_day + timedelta(days=1), VacationRequest.end_date >= first_day)
+    )
+    for user_id, start_date, end_date in rows:
+        vacations.setdefault(user_id, []).append((start_date, end_date))
+    for user_id, ranges in vacations.items():
+        checker.set_vacations(user_id, ranges)
+    return checker
+
+@api.cli.command('rebuild-hours-rollup')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s rows.')
+def rebuild_hours_rollup_command(user_id):
+    """Rebuild the monthly hours rollup from the time_entry history."""
+    rows = rebuild_monthly_hours_rollup(user_id)
+    db.session.commit()
+    report_cache.clear()
+    click.echo(f'Rebuilt {rows} monthly rollup rows.')
+
+@api.cli.command('rebuild-vacation-ledger')
+@click.option('--user-id', type=int, default=None, help='Only rebuild this user\'s rows.')
+def rebuild_vacation_ledger_command(user_id):
+    """Rebuild the vacation balance ledger from the vacation request history."""
+    rows = rebuild_vacation_ledger(user_id)
+    db.session.commit()
+    click.echo(f'Rebuilt {rows} vacation ledger rows.')
+
+@api.cli.command('set-user-role')
+@click.argument('username')
+@click.argument('role', type=click.Choice(['employee', 'manager', 'admin']))
+def set_user_role_command(username, role):
+    """Change a user's role, e.g. to create the first manager."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f'No user named {username}')
+    user.role = role
+    db.session.commit()
+    click.echo(f'{username} is now {role}; existing tokens keep the old role until they expire.')
+
+@api.cli.command('import-time-entries')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Defaults to csv for .csv files and ndjson otherwise.')
+@click.option('--checkpoint', default=None, help='Resume name; defaults to the file\'s absolute path.')
+@click.option('--restart', is_flag=True, help='Forget the checkpoint and import from the first record.')
+@click.option('--chunk-size', type=int, default=None, help='Records per transaction (IMPORT_CHUNK_SIZE).')
+def import_time_entries_command(path, fmt, checkpoint, restart, chunk_size):
+    """Import completed time entries from a CSV or NDJSON file.
+
+    Columns/keys: user_id or username, clock_in_time, clock_out_time and an
+    optional date, times in ISO 8601 local time. Rerunning after an
+    interruption resumes from the last committed chunk.
+    """
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    checkpoint = checkpoint or os.path.abspath(path)
+    if restart:
+        ImportCheckpoint.query.filter_by(name=checkpoint).delete()
+        db.session.commit()
+
+    def progress(stats):
+        click.echo(f"{stats['records']:,} records: {stats['imported']:,} imported, "
+                   f"{stats['rejected']:,} rejected, {stats['rows_per_second']:,} rows/s", err=True)
+
+    with open(path, encoding='utf-8-sig', newline='') as stream:
+        stats = import_time_entries(read_records(stream, fmt), checkpoint,
+                                    chunk_size or current_app.config['IMPORT_CHUNK_SIZE'], progress)
+    for error in stats['errors']:
+        click.echo(f"record {error['record']}: {error['message']}", err=True)
+    if stats['skipped']:
+        click.echo(f"Resumed after {stats['skipped']:,} records already imported under this checkpoint.")
+    click.echo(f"Imported {stats['imported']:,} time entries, rejected {stats['rejected']:,} "
+               f"in {stats['seconds']:.1f}s ({stats['rows_per_second']:,} rows/s).")
+
+@api.cli.command('derive-overtime')
+@click.argument('start_date', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.argument('end_date', type=click.DateTime(formats=['%Y-%m-%d']))
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Only these users (repeatable).')
+def derive_overtime_command(start_date, end_date, user_ids):
+    """Derive pending overtime entries from time entries and shifts, dates inclusive."""
+    started = perf_counter()
+    counts = derive_overtime_entries(start_date.date(), end_date.date(), list(user_ids) or None)
+    db.session.commit()
+    click.echo(f"Derived overtime in {perf_counter() - started:.2f}s: {counts['inserted']} inserted, "
+               f"{counts['updated']} updated, {counts['deleted']} deleted, {counts['unchanged']} unchanged, "
+               f"{counts['skipped']} skipped for manual entries.")
+
+def busy_response():
+    response = jsonify({'message': 'Too many logins in progress, please retry shortly'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+@api.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
     username = data.get('username')
@@ -93,10 +999,23 @@ def register():
     if not username or not password or not email:
         return jsonify({'message': 'Missing username, password, or email'}), 400
 
+    if role != 'employee':
+        # Tokens carry the role, so privileged accounts may only be created by a manager
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        try:
+            caller = verify_token(current_app.config['SECRET_KEY'], token.strip()) if scheme.lower() == 'bearer' else None
+        except InvalidToken:
+            caller = None
+        if not caller or caller['role'] not in MANAGER_ROLES:
+            return jsonify({'message': 'Only a manager can create accounts with this role'}), 403
+
     if User.query.filter_by(username=username).first() or User.query.filter_by(email=email).first():
         return jsonify({'message': 'User already exists'}), 409
 
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = password_hasher.hash(password)
+    except PasswordHasherBusy:
+        return busy_response()
     new_user = User(username=username, password_hash=hashed_password, email=email, role=role)
 
     try:
@@ -107,7 +1026,7 @@ def register():
         db.session.rollback()
         return jsonify({'message': 'Failed to create user', 'error': str(e)}), 500
 
-@app.route('/login', methods=['POST'])
+@api.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     username = data.get('username')
@@ -118,47 +1037,49 @@ def login():
 
     user = User.query.filter_by(username=username).first()
 
-    if user and check_password_hash(user.password_hash, password):
-        # For now, just return a success message.
-        # Later, implement session management or token generation here.
-        # For example, using Flask-Login: login_user(user)
-        return jsonify({'message': 'Login successful', 'user_id': user.id, 'username': user.username, 'email': user.email, 'role': user.role}), 200
+    try:
+        valid = user is not None and password_hasher.verify(user.password_hash, password)
+        if valid and password_hasher.needs_rehash(user.password_hash):
+            # Hash settings changed since this password was stored; upgrade it
+            # now that the plaintext is at hand.
+            user.password_hash = password_hasher.hash(password)
+            db.session.commit()
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return busy_response()
+
+    if valid:
+        # Later requests authenticate with this token (see token_required)
+        token, expires_at = issue_token(
+            current_app.config['SECRET_KEY'], user.id, user.role, current_app.config['AUTH_TOKEN_TTL']
+        )
+        return jsonify({
+            'message': 'Login successful', 'user_id': user.id, 'username': user.username, 'email': user.email, 'role': user.role,
+            'token': token, 'token_type': 'Bearer', 'expires_at': expires_at
+        }), 200
     else:
         return jsonify({'message': 'Invalid username or password'}), 401
 
 # --- Shift Management ---
-@app.route('/shifts', methods=['POST'])
+@api.route('/shifts', methods=['POST'])
+@token_required
 def create_shift():
     data = request.get_json()
 
-    user_id = data.get('user_id')
-    shift_date_str = data.get('date') # Expected format: YYYY-MM-DD
-    start_time_str = data.get('start_time') # Expected format: HH:MM
-    end_time_str = data.get('end_time') # Expected format: HH:MM
-    location = data.get('location')
-
-    if not all([user_id, shift_date_str, start_time_str, end_time_str]):
-        return jsonify({'message': 'Missing required fields (user_id, date, start_time, end_time)'}), 400
+    user_id, error_response = resolve_user_id(data.get('user_id'))
+    if error_response:
+        return error_response
 
-    try:
-        shift_date = datetime.strptime(shift_date_str, '%Y-%m-%d').date()
-        start_time = datetime.strptime(start_time_str, '%H:%M').time()
-        end_time = datetime.strptime(end_time_str, '%H:%M').time()
-    except ValueError:
-        return jsonify({'message': 'Invalid date or time format. Use YYYY-MM-DD for date and HH:MM for time.'}), 400
+    fields, error = parse_shift_fields(dict(data, user_id=user_id))
+    if error:
+        return jsonify({'message': error}), 400
 
-    # Check if user exists
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    checker = load_conflict_checker([user_id], fields['date'], fields['date'])
+    conflicts = checker.check(user_id, fields['start_at'], fields['end_at'], day=fields['date'])
+    if conflicts:
+        return jsonify({'message': 'Shift conflicts with the existing schedule', 'conflicts': conflicts}), 409
 
-    new_shift = Shift(
-        user_id=user_id,
-        date=shift_date,
-        start_time=start_time,
-        end_time=end_time,
-        location=location
-    )
+    new_shift = Shift(**fields)
 
     try:
         db.session.add(new_shift)
@@ -169,8 +1090,10 @@ def create_shift():
                 'id': new_shift.id,
                 'user_id': new_shift.user_id,
                 'date': new_shift.date.isoformat(),
-                'start_time': new_shift.start_time.isoformat(),
-                'end_time': new_shift.end_time.isoformat(),
+                'start_time': new_shift.start_at.time().isoformat(),
+                'end_time': new_shift.end_at.time().isoformat(),
+                'start_at': new_shift.start_at.isoformat(),
+                'end_at': new_shift.end_at.isoformat(),
                 'location': new_shift.location
             }
         }), 201
@@ -178,149 +1101,487 @@ def create_shift():
         db.session.rollback()
         return jsonify({'message': 'Failed to create shift', 'error': str(e)}), 500
 
-@app.route('/shifts', methods=['GET'])
+@api.route('/shifts/bulk', methods=['POST'])
+@token_required
+def create_shifts_bulk():
+    # Accepts either a bare JSON array or {"shifts": [...]}. The roster is
+    # all-or-nothing: any invalid row rejects the whole batch.
+    data = request.get_json()
+    if isinstance(data, dict):
+        data = data.get('shifts')
+    if not isinstance(data, list) or not data:
+        return jsonify({'message': 'Expected a non-empty array of shifts'}), 400
+
+    own_user_id = g.auth['user_id']
+    rows = []
+    errors = []
+    for index, item in enumerate(data):
+        if isinstance(item, dict):
+            fields, error = parse_shift_fields(dict(item, user_id=item.get('user_id') or own_user_id))
+        else:
+            fields, error = None, 'Shift must be an object'
+        if not error and fields['user_id'] != own_user_id and not is_manager():
+            fields, error = None, "Not allowed to access another user's records"
+        if error:
+            errors.append({'index': index, 'message': error})
+        else:
+            rows.append((index, fields))
+
+    # One IN query for every other referenced user instead of a lookup per row;
+    # the caller's own id is vouched for by the token.
+    requested_user_ids = {fields['user_id'] for _, fields in rows} - {own_user_id}
+    existing_user_ids = set(db.session.scalars(
+        db.select(User.id).where(User.id.in_(requested_user_ids))
+    )) if requested_user_ids else set()
+    for index, fields in rows:
+        if fields['user_id'] != own_user_id and fields['user_id'] not in existing_user_ids:
+            errors.append({'index': index, 'message': 'User not found'})
+
+    # Check every row against the stored schedule and against the rows before
+    # it, which join the index once accepted.
+    if rows and not errors:
+        checker = load_conflict_checker(
+            {fields['user_id'] for _, fields in rows},
+            min(fields['date'] for _, fields in rows), max(fields['date'] for _, fields in rows)
+        )
+        for index, fields in rows:
+            conflicts = checker.check(fields['user_id'], fields['start_at'], fields['end_at'], day=fields['date'])
+            if conflicts:
+                errors.append({'index': index, 'message': 'Shift conflicts with the existing schedule', 'conflicts': conflicts})
+            checker.add_shift(fields['user_id'], fields['start_at'], fields['end_at'], ref={'index': index}, day=fields['date'])
+
+    if errors:
+        errors.sort(key=lambda e: e['index'])
+        return jsonify({'message': 'No shifts were created', 'errors': errors}), 400
+
+    try:
+        # Single executemany in one transaction
+        db.session.execute(Shift.__table__.insert(), [fields for _, fields in rows])
+        db.session.commit()
+        return jsonify({
+            'message': 'Shifts created successfully',
+            'created': len(rows)
+        }), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to create shifts', 'error': str(e)}), 500
+
+SHIFT_SERIALIZER = ListSerializer([
+    ('id', Shift.id, None),
+    ('user_id', Shift.user_id, None),
+    ('username', User.username, None),
+    ('date', Shift.date, date.isoformat),
+    ('start_at', Shift.start_at, datetime.isoformat),
+    ('end_at', Shift.end_at, datetime.isoformat),
+    ('location', Shift.location, None),
+], joins=[(User, Shift.user_id == User.id)], computed=[
+    ('start_time', lambda columns: [start_at.time().isoformat() for start_at in columns['start_at']]),
+    ('end_time', lambda columns: [end_at.time().isoformat() for end_at in columns['end_at']]),
+])
+
+@api.route('/shifts', methods=['GET'])
+@token_required
 def get_shifts():
     # Get query parameters
     user_id = request.args.get('user_id', type=int)
+    user_ids_str = request.args.get('user_ids') # Comma-separated, e.g. for a manager's team
     year = request.args.get('year', type=int)
     month = request.args.get('month', type=int)
+    start_date_str = request.args.get('start_date') # YYYY-MM-DD, inclusive
+    end_date_str = request.args.get('end_date')     # YYYY-MM-DD, inclusive
+    group_by = request.args.get('group_by')
+
+    if group_by not in (None, 'date'):
+        return jsonify({'message': "group_by must be 'date'"}), 400
+
+    user_ids = None
+    if user_ids_str:
+        try:
+            user_ids = {int(part) for part in user_ids_str.split(',') if part.strip()}
+        except ValueError:
+            return jsonify({'message': 'user_ids must be a comma-separated list of integers'}), 400
+
+    if not is_manager():
+        # Employees only ever see their own shifts
+        own_user_id = g.auth['user_id']
+        if (user_id and user_id != own_user_id) or (user_ids and user_ids != {own_user_id}):
+            return jsonify({'message': "Not allowed to access another user's records"}), 403
+        user_id, user_ids = own_user_id, None
 
     query = Shift.query
 
     if user_id:
         query = query.filter_by(user_id=user_id)
 
+    if user_ids:
+        query = query.filter(Shift.user_id.in_(user_ids))
+
     if year and month:
-        # Filter by shifts within the given month and year
-        # This requires ensuring the date column in Shift model is compatible
-        # For SQLite, we might need to extract year and month from the date
-        # For more complex queries, SQLAlchemy's func might be needed, e.g. db.extract
-        # For now, let's assume a simple filter that might need adjustment based on DB
-        # A more robust way for date filtering:
-        # from sqlalchemy import extract
-        # query = query.filter(extract('year', Shift.date) == year, extract('month', Shift.date) == month)
-        # For simplicity here, we'll retrieve all and let frontend filter, or refine this if subtask fails.
-        # Let's try a direct string comparison approach first for SQLite if date is stored as string,
-        # or rely on Python filtering after fetching if it's too complex for a quick subtask.
-        # Given Shift.date is db.Column(db.Date), direct filtering should work.
-        query = query.filter(db.extract('year', Shift.date) == year, db.extract('month', Shift.date) == month)
-
-
-    shifts_list = []
-    for shift in query.all():
-        shifts_list.append({
-            'id': shift.id,
-            'user_id': shift.user_id,
-            'username': shift.employee.username, # Accessing username via backref
-            'date': shift.date.isoformat(),
-            'start_time': shift.start_time.isoformat(),
-            'end_time': shift.end_time.isoformat(),
-            'location': shift.location
-        })
+        # Half-open [first of month, first of next month) range so the
+        # (user_id, date) index can be used instead of scanning the table.
+        try:
+            month_start, month_end = month_bounds(year, month)
+        except ValueError:
+            return jsonify({'message': 'Invalid year or month.'}), 400
+        query = query.filter(Shift.date >= month_start, Shift.date < month_end)
 
-    return jsonify(shifts_list), 200
+    try:
+        if start_date_str:
+            query = query.filter(Shift.date >= parse_date(start_date_str))
+        if end_date_str:
+            query = query.filter(Shift.date < parse_date(end_date_str) + timedelta(days=1))
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD.'}), 400
 
-# --- Time Tracking (Clock-in/Clock-out) ---
-@app.route('/time_entries/clock_in', methods=['POST'])
-def clock_in():
-    data = request.get_json()
-    user_id = data.get('user_id')
+    # Shifts are insert-only, so row count plus highest id identifies the
+    # current contents; both come from the same index range as the listing.
+    stamp = query.with_entities(func.count(Shift.id), func.max(Shift.id)).one()
 
-    if not user_id:
-        return jsonify({'message': 'Missing user_id'}), 400
+    if group_by == 'date':
+        return conditional_response(stamp, lambda: shifts_by_date_response(query))
 
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    return conditional_response(stamp, lambda: list_response(query, SHIFT_SERIALIZER, Shift.date, Shift.id))
+
+SHIFT_DAY_FIELDS = ['id', 'user_id', 'start_time', 'end_time', 'location']
+
+def shifts_by_date_response(query):
+    """Compact calendar payload: one entry per day with the day's shifts as rows.
+
+    Only the needed columns are selected and each shift is a positional row
+    described once by 'fields', so several months fit in one small response.
+    """
+    rows = query.with_entities(
+        Shift.date, Shift.id, Shift.user_id, Shift.start_at, Shift.end_at, Shift.location
+    ).order_by(Shift.date, Shift.start_at, Shift.id)
+
+    days = {}
+    for shift_date, shift_id, shift_user_id, start_at, end_at, location in rows:
+        day = days.get(shift_date)
+        if day is None:
+            day = days[shift_date] = {'count': 0, 'shifts': []}
+        day['count'] += 1
+        day['shifts'].append([shift_id, shift_user_id, start_at.time().isoformat(), end_at.time().isoformat(), location])
+
+    return json_response({
+        'fields': SHIFT_DAY_FIELDS,
+        'days': {shift_date.isoformat(): day for shift_date, day in days.items()}
+    })
+
+MAX_MATRIX_DAYS = 92
+SCHEDULE_CELL_FIELDS = ['id', 'start_time', 'end_time', 'location']
+
+@api.route('/schedule/matrix', methods=['GET'])
+@token_required
+def get_schedule_matrix():
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+
+    start_str = request.args.get('start') # YYYY-MM-DD, inclusive
+    end_str = request.args.get('end')     # YYYY-MM-DD, inclusive
+    location = request.args.get('location')
+
+    if not start_str or not end_str:
+        return jsonify({'message': 'Missing start or end parameter (YYYY-MM-DD)'}), 400
+    try:
+        start = parse_date(start_str)
+        end = parse_date(end_str)
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD.'}), 400
+
+    n_days = (end - start).days + 1
+    if n_days < 1 or n_days > MAX_MATRIX_DAYS:
+        return jsonify({'message': f'end must be on or after start and at most {MAX_MATRIX_DAYS} days later'}), 400
+
+    conditions = [Shift.date >= start, Shift.date <= end]
+    closures = {}
+    if location:
+        conditions.append(Shift.location == location)
+        closures = dict(db.session.execute(db.select(LocationClosure.date, LocationClosure.name).where(
+            LocationClosure.location == location, LocationClosure.date >= start, LocationClosure.date <= end
+        )).all())
+
+    stamp = db.session.execute(db.select(func.count(Shift.id), func.max(Shift.id)).where(*conditions)).one()
+    stamp = (*stamp, *sorted(closures.items()))
+    return conditional_response(stamp, lambda: schedule_matrix_response(conditions, start, n_days, closures))
+
+def schedule_matrix_response(conditions, start, n_days, closures):
+    """Pivot one date range query into a users x days grid.
+
+    Each user row holds one cell per day, indexed by the day's offset from
+    start; a cell lists that day's shifts as positional rows described by
+    'fields'. Only users with at least one shift in the range appear.
+    'holidays' names each day's national holiday or location closure.
+    """
+    # Plain Core execution on the session's connection: the rows are
+    # tuples of column values, with no ORM result processing. They come
+    # unsorted; only a split shift's cell needs ordering, done below. Rows
+    # arrive in batches, each freed once pivoted, so the whole range is
+    # never held as rows.
+    result = db.session.connection().execute(
+        db.select(Shift.user_id, User.username, Shift.date, Shift.id, Shift.start_at, Shift.end_at, Shift.location)
+        .join(User, Shift.user_id == User.id)
+        .where(*conditions)
+        .execution_options(yield_per=1000)
+    )
+
+    start_ordinal = start.toordinal()
+    # Cells without shifts share one empty tuple (serialized as []); only
+    # days with a shift get a list of their own.
+    empty = ()
+    users = {}
+    split_cells = []
+    # A roster only uses a handful of distinct start/end times
+    time_text = {}
+    for rows in result.partitions():
+        for user_id, username, shift_date, shift_id, start_at, end_at, location in rows:
+            user = users.get(user_id)
+            if user is None:
+                user = users[user_id] = {'user_id': user_id, 'username': username, 'cells': [empty] * n_days}
+            start_time, end_time = start_at.time(), end_at.time()
+            start_text = time_text.get(start_time) or time_text.setdefault(start_time, start_time.isoformat())
+            end_text = time_text.get(end_time) or time_text.setdefault(end_time, end_time.isoformat())
+            cells = user['cells']
+            offset = shift_date.toordinal() - start_ordinal
+            cell = cells[offset]
+            if cell:
+                if len(cell) == 1:
+                    split_cells.append(cell)
+                cell.append((shift_id, start_text, end_text, location))
+            else:
+                cells[offset] = [(shift_id, start_text, end_text, location)]
+    # Every shift starts on its roster day, so the time text orders them
+    for cell in split_cells:
+        cell.sort(key=lambda shift: (shift[1], shift[0]))
+
+    days = [date.fromordinal(start_ordinal + offset) for offset in range(n_days)]
+    return json_response({
+        'days': [day.isoformat() for day in days],
+        'holidays': [closures.get(day) or national_calendar(day.year).names.get(day) for day in days],
+        'fields': SCHEDULE_CELL_FIELDS,
+        'users': sorted(users.values(), key=lambda user: (user['username'], user['user_id']))
+    })
+
+# --- Working Calendar ---
+@api.route('/calendar', methods=['GET'])
+@token_required
+def get_calendar():
+    # ?year= (defaults to this year) &location= (adds that Shift.location's closures)
+    year = request.args.get('year', type=int) or date.today().year
+    if not 1 <= year <= 9998:
+        return jsonify({'message': 'Invalid year'}), 400
+    location = request.args.get('location') or None
+    calendar = work_calendar(year, location)
+    return jsonify({
+        'year': year,
+        'location': location,
+        'working_days': calendar.working_days(date(year, 1, 1), date(year, 12, 31)),
+        'holidays': [{'date': day.isoformat(), 'name': name} for day, name in calendar.holidays()],
+    }), 200
+
+CLOSURE_SERIALIZER = ListSerializer([
+    ('id', LocationClosure.id, None),
+    ('location', LocationClosure.location, None),
+    ('date', LocationClosure.date, date.isoformat),
+    ('name', LocationClosure.name, None),
+])
+
+@api.route('/calendar/closures', methods=['GET'])
+@token_required
+def get_location_closures():
+    # ?location= &year= both optional
+    query = LocationClosure.query
+    location = request.args.get('location')
+    if location:
+        query = query.filter(LocationClosure.location == location)
+    year = request.args.get('year', type=int)
+    if year:
+        query = query.filter(LocationClosure.date >= date(year, 1, 1), LocationClosure.date < date(year + 1, 1, 1))
+    return list_response(query, CLOSURE_SERIALIZER, LocationClosure.date, LocationClosure.id)
+
+@api.route('/calendar/closures', methods=['POST'])
+@token_required
+def create_location_closure():
+    # Body: {"location": "Milano", "date": "YYYY-MM-DD", "name": "Sant'Ambrogio"}
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    data = request.get_json(silent=True) or {}
+    location, name = data.get('location'), data.get('name')
+    if not isinstance(location, str) or not location or len(location) > 100:
+        return jsonify({'message': 'location is required (at most 100 characters)'}), 400
+    if not isinstance(name, str) or not name or len(name) > 100:
+        return jsonify({'message': 'name is required (at most 100 characters)'}), 400
+    try:
+        closure_date = parse_date(data['date'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'date is required (YYYY-MM-DD)'}), 400
+
+    closure = LocationClosure(location=location, date=closure_date, name=name)
+    try:
+        db.session.add(closure)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': f'{location} already has a closure on {closure_date.isoformat()}'}), 409
+    calendar_cache.delete((closure_date.year, location))
+    return jsonify({'message': 'Closure created successfully', 'closure': {
+        'id': closure.id, 'location': location, 'date': closure_date.isoformat(), 'name': name
+    }}), 201
+
+@api.route('/calendar/closures/<int:closure_id>', methods=['DELETE'])
+@token_required
+def delete_location_closure(closure_id):
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    closure = db.session.get(LocationClosure, closure_id)
+    if closure is None:
+        return jsonify({'message': 'Closure not found'}), 404
+    db.session.delete(closure)
+    db.session.commit()
+    calendar_cache.delete((closure.date.year, closure.location))
+    return jsonify({'message': 'Closure deleted'}), 200
+
+# --- Time Tracking (Clock-in/Clock-out) ---
+@api.route('/time_entries/clock_in', methods=['POST'])
+@token_required
+def clock_in():
+    data = request.get_json(silent=True) or {}
+    user_id, error_response = resolve_user_id(data.get('user_id'))
+    if error_response:
+        return error_response
 
     now = datetime.now()
     today = now.date()
 
-    # Check if there's already an open clock-in for today for this user
-    existing_open_entry = TimeEntry.query.filter_by(user_id=user_id, date=today, clock_out_time=None).first()
-    if existing_open_entry:
-        return jsonify({'message': 'User already clocked in today and not clocked out'}), 409
-
     new_time_entry = TimeEntry(
         user_id=user_id,
         clock_in_time=now,
         date=today
     )
 
+    # A single INSERT: the partial unique index rejects a second open entry and
+    # the user FK rejects unknown users, so concurrent taps cannot both succeed.
     try:
         db.session.add(new_time_entry)
         db.session.commit()
-        return jsonify({
-            'message': 'Clock-in successful',
-            'time_entry': {
-                'id': new_time_entry.id,
-                'user_id': new_time_entry.user_id,
-                'clock_in_time': new_time_entry.clock_in_time.isoformat(),
-                'date': new_time_entry.date.isoformat()
-            }
-        }), 201
+    except IntegrityError:
+        db.session.rollback()
+        if db.session.get(User, user_id) is None:
+            return jsonify({'message': 'User not found'}), 404
+        return jsonify({'message': 'User already clocked in and not clocked out'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Failed to clock in', 'error': str(e)}), 500
 
-@app.route('/time_entries/clock_out', methods=['POST'])
+    return jsonify({
+        'message': 'Clock-in successful',
+        'time_entry': {
+            'id': new_time_entry.id,
+            'user_id': new_time_entry.user_id,
+            'clock_in_time': new_time_entry.clock_in_time.isoformat(),
+            'date': new_time_entry.date.isoformat()
+        }
+    }), 201
+
+@api.route('/time_entries/clock_out', methods=['POST'])
+@token_required
 def clock_out():
-    data = request.get_json()
-    user_id = data.get('user_id')
-
-    if not user_id:
-        return jsonify({'message': 'Missing user_id'}), 400
-
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    data = request.get_json(silent=True) or {}
+    user_id, error_response = resolve_user_id(data.get('user_id'))
+    if error_response:
+        return error_response
 
     now = datetime.now()
-    today = now.date()
-
-    # Find the most recent open time entry for this user for today
-    time_entry = TimeEntry.query.filter_by(user_id=user_id, date=today, clock_out_time=None).order_by(TimeEntry.clock_in_time.desc()).first()
-
-    if not time_entry:
-        # Option 1: Create a new entry with only clock-out (might be problematic for duration calculation)
-        # Option 2: Return an error, user must clock in first. This is generally safer.
-        return jsonify({'message': 'No open clock-in found for today. Please clock in first.'}), 404
-
-    time_entry.clock_out_time = now
 
     try:
+        # Close the user's open entry (at most one, see uq_time_entry_user_id_open)
+        # in one UPDATE ... RETURNING instead of a read followed by a write.
+        closed = db.session.execute(
+            update(TimeEntry)
+            .where(TimeEntry.user_id == user_id, TimeEntry.clock_out_time.is_(None))
+            .values(clock_out_time=now)
+            .returning(TimeEntry.id, TimeEntry.user_id, TimeEntry.clock_in_time, TimeEntry.date),
+            execution_options={'synchronize_session': False}
+        ).first()
+
+        if not closed:
+            db.session.rollback()
+            if db.session.get(User, user_id) is None:
+                return jsonify({'message': 'User not found'}), 404
+            # Option 1: Create a new entry with only clock-out (might be problematic for duration calculation)
+            # Option 2: Return an error, user must clock in first. This is generally safer.
+            return jsonify({'message': 'No open clock-in found. Please clock in first.'}), 404
+
+        duration = now - closed.clock_in_time
+        month_parts = split_by_month(closed.clock_in_time, now)
+        for year, month, worked_microseconds in month_parts:
+            add_to_monthly_hours_rollup(closed.user_id, year, month, worked_microseconds)
         db.session.commit()
-        # Calculate duration
-        duration = time_entry.clock_out_time - time_entry.clock_in_time
-        duration_hours = duration.total_seconds() / 3600
-
-        return jsonify({
-            'message': 'Clock-out successful',
-            'time_entry': {
-                'id': time_entry.id,
-                'user_id': time_entry.user_id,
-                'clock_in_time': time_entry.clock_in_time.isoformat(),
-                'clock_out_time': time_entry.clock_out_time.isoformat(),
-                'date': time_entry.date.isoformat(),
-                'duration_hours': round(duration_hours, 2)
-            }
-        }), 200
     except Exception as e:
         db.session.rollback()
         return jsonify({'message': 'Failed to clock out', 'error': str(e)}), 500
 
-@app.route('/time_entries', methods=['GET'])
+    # The entry's months just changed in the rollup; drop the cached reports
+    # after the commit. The delete also bumps their cache version, so a report
+    # read from the database before the commit is not cached afterwards.
+    for year in {year for year, _, _ in month_parts}:
+        report_cache.delete((closed.user_id, year))
+
+    return jsonify({
+        'message': 'Clock-out successful',
+        'time_entry': {
+            'id': closed.id,
+            'user_id': closed.user_id,
+            'clock_in_time': closed.clock_in_time.isoformat(),
+            'clock_out_time': now.isoformat(),
+            'date': closed.date.isoformat(),
+            'duration_hours': round(duration.total_seconds() / 3600, 2)
+        }
+    }), 200
+
+@api.route('/time_entries/import', methods=['POST'])
+@token_required
+def import_time_entries_endpoint():
+    # The body is the raw CSV or NDJSON file, read as a stream. Resending the
+    # same file with the same ?checkpoint= after a failure skips the records
+    # that were already committed.
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    fmt = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'ndjson'
+                                         if request.mimetype in ('application/x-ndjson', 'application/jsonl') else None)
+    if fmt not in IMPORT_FORMATS:
+        return jsonify({'message': 'Send text/csv or application/x-ndjson, or pass format=csv|ndjson'}), 400
+
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    try:
+        stats = import_time_entries(read_records(stream, fmt), request.args.get('checkpoint'),
+                                    current_app.config['IMPORT_CHUNK_SIZE'])
+    except UnicodeDecodeError:
+        return jsonify({'message': 'The file must be UTF-8 encoded'}), 400
+    except Exception as e:
+        return jsonify({'message': 'Import failed; resend with the same checkpoint to resume', 'error': str(e)}), 500
+    return jsonify(stats), 200
+
+def duration_hours_column(columns):
+    return [round((clock_out - clock_in).total_seconds() / 3600, 2) if clock_in and clock_out else None
+            for clock_in, clock_out in zip(columns['clock_in_time'], columns['clock_out_time'])]
+
+TIME_ENTRY_SERIALIZER = ListSerializer([
+    ('id', TimeEntry.id, None),
+    ('user_id', TimeEntry.user_id, None),
+    ('date', TimeEntry.date, date.isoformat),
+    ('clock_in_time', TimeEntry.clock_in_time, iso),
+    ('clock_out_time', TimeEntry.clock_out_time, iso),
+], computed=[('duration_hours', duration_hours_column)])
+
+@api.route('/time_entries', methods=['GET'])
+@token_required
 def get_time_entries():
-    user_id = request.args.get('user_id', type=int)
     start_date_str = request.args.get('start_date') # YYYY-MM-DD
     end_date_str = request.args.get('end_date')     # YYYY-MM-DD
 
-    if not user_id:
-        return jsonify({'message': 'Missing user_id parameter'}), 400
-
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user_id, error_response = resolve_user_id(request.args.get('user_id'))
+    if error_response:
+        return error_response
 
     query = TimeEntry.query.filter_by(user_id=user_id)
 
@@ -336,35 +1597,19 @@ def get_time_entries():
 
     query = query.order_by(TimeEntry.date.desc(), TimeEntry.clock_in_time.desc())
 
-    time_entries_list = []
-    for entry in query.all():
-        duration_hours = None
-        if entry.clock_in_time and entry.clock_out_time:
-            duration = entry.clock_out_time - entry.clock_in_time
-            duration_hours = round(duration.total_seconds() / 3600, 2)
-
-        time_entries_list.append({
-            'id': entry.id,
-            'user_id': entry.user_id,
-            'date': entry.date.isoformat(),
-            'clock_in_time': entry.clock_in_time.isoformat() if entry.clock_in_time else None,
-            'clock_out_time': entry.clock_out_time.isoformat() if entry.clock_out_time else None,
-            'duration_hours': duration_hours
-        })
-
-    return jsonify(time_entries_list), 200
+    return list_response(query, TIME_ENTRY_SERIALIZER, TimeEntry.date, TimeEntry.id, descending=True)
 
 # --- Vacation Management ---
-@app.route('/vacation_requests', methods=['POST'])
+@api.route('/vacation_requests', methods=['POST'])
+@token_required
 def create_vacation_request():
     data = request.get_json()
-    user_id = data.get('user_id')
     start_date_str = data.get('start_date') # Expected format: YYYY-MM-DD
     end_date_str = data.get('end_date')     # Expected format: YYYY-MM-DD
     reason = data.get('reason')
 
-    if not all([user_id, start_date_str, end_date_str]):
-        return jsonify({'message': 'Missing required fields (user_id, start_date, end_date)'}), 400
+    if not all([start_date_str, end_date_str]):
+        return jsonify({'message': 'Missing required fields (start_date, end_date)'}), 400
 
     try:
         start_date_obj = datetime.strptime(start_date_str, '%Y-%m-%d').date()
@@ -375,9 +1620,9 @@ def create_vacation_request():
     if start_date_obj > end_date_obj:
         return jsonify({'message': 'Start date cannot be after end date.'}), 400
 
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user_id, error_response = resolve_user_id(data.get('user_id'))
+    if error_response:
+        return error_response
 
     new_request = VacationRequest(
         user_id=user_id,
@@ -389,6 +1634,8 @@ def create_vacation_request():
 
     try:
         db.session.add(new_request)
+        db.session.flush()
+        rebuild_vacation_ledger(user_id)
         db.session.commit()
         return jsonify({
             'message': 'Vacation request created successfully',
@@ -406,70 +1653,179 @@ def create_vacation_request():
         db.session.rollback()
         return jsonify({'message': 'Failed to create vacation request', 'error': str(e)}), 500
 
-@app.route('/vacation_requests', methods=['GET'])
+VACATION_REQUEST_SERIALIZER = ListSerializer([
+    ('id', VacationRequest.id, None),
+    ('user_id', VacationRequest.user_id, None),
+    ('username', User.username, None),
+    ('start_date', VacationRequest.start_date, date.isoformat),
+    ('end_date', VacationRequest.end_date, date.isoformat),
+    ('reason', VacationRequest.reason, None),
+    ('status', VacationRequest.status, None),
+    ('requested_at', VacationRequest.requested_at, iso),
+], joins=[(User, VacationRequest.user_id == User.id)])
+
+@api.route('/vacation_requests', methods=['GET'])
+@token_required
 def get_vacation_requests():
-    user_id = request.args.get('user_id', type=int)
-    status = request.args.get('status') # e.g., pending, approved, rejected
-    # Additional filters for 'upcoming', 'past' can be added based on current date
-    # For 'upcoming': query where start_date >= today and status == 'approved'
-    # For 'history': query where end_date < today or status in ['rejected', 'approved'] (and in the past)
+    status = request.args.get('status') # e.g., pending, or several: approved,rejected
+    view = request.args.get('view') # upcoming, pending or history (the gestioneferie.html tabs)
+    start_date_str = request.args.get('start_date') # YYYY-MM-DD, requests ending on/after
+    end_date_str = request.args.get('end_date')     # YYYY-MM-DD, requests starting on/before
 
-    if not user_id:
-        return jsonify({'message': 'Missing user_id parameter'}), 400
+    if view not in (None, 'upcoming', 'pending', 'history'):
+        return jsonify({'message': 'view must be one of upcoming, pending, history'}), 400
 
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user_id, error_response = resolve_user_id(request.args.get('user_id'))
+    if error_response:
+        return error_response
 
     query = VacationRequest.query.filter_by(user_id=user_id)
 
     if status:
-        query = query.filter(VacationRequest.status == status)
-
-    # Example for 'Prossime' (Upcoming approved):
-    # if request.args.get('view') == 'upcoming':
-    #    today = date.today()
-    #    query = query.filter(VacationRequest.status == 'approved', VacationRequest.start_date >= today)
-    # Example for 'Storico' (Past or decided):
-    # if request.args.get('view') == 'history':
-    #    today = date.today()
-    #    query = query.filter((VacationRequest.status == 'approved' & VacationRequest.end_date < today) | VacationRequest.status == 'rejected')
-    # For simplicity, these specific views ('Prossime', 'In Attesa', 'Storico') might be handled by combining status and date range filters on the client or specific server-side flags.
-    # The current GET allows filtering by status, which covers 'In Attesa'. 'Prossime' and 'Storico' would need date logic.
-
-    query = query.order_by(VacationRequest.start_date.desc())
+        statuses = [s.strip() for s in status.split(',') if s.strip()]
+        query = query.filter(VacationRequest.status.in_(statuses))
+
+    # Every view constrains status, so the filtering happens on the
+    # (user_id, status, start_date) / (user_id, status, end_date) indexes
+    # rather than in the client.
+    today = date.today()
+    if view == 'upcoming': # 'Prossime'
+        query = query.filter(VacationRequest.status == 'approved', VacationRequest.start_date >= today)
+    elif view == 'pending': # 'In Attesa'
+        query = query.filter(VacationRequest.status == 'pending')
+    elif view == 'history': # 'Storico'
+        query = query.filter(db.or_(
+            db.and_(VacationRequest.status == 'approved', VacationRequest.end_date < today),
+            VacationRequest.status == 'rejected'
+        ))
 
-    requests_list = []
-    for req in query.all():
-        requests_list.append({
-            'id': req.id,
-            'user_id': req.user_id,
-            'username': req.employee.username,
-            'start_date': req.start_date.isoformat(),
-            'end_date': req.end_date.isoformat(),
-            'reason': req.reason,
-            'status': req.status,
-            'requested_at': req.requested_at.isoformat()
-        })
+    try:
+        if start_date_str:
+            query = query.filter(VacationRequest.end_date >= parse_date(start_date_str))
+        if end_date_str:
+            query = query.filter(VacationRequest.start_date <= parse_date(end_date_str))
+    except ValueError:
+        return jsonify({'message': 'Invalid date format. Use YYYY-MM-DD.'}), 400
 
-    return jsonify(requests_list), 200
+    query = query.order_by(VacationRequest.start_date.desc())
 
-# TODO for later: Add endpoints for updating status (approve/reject) by a manager
-# @app.route('/vacation_requests/<int:request_id>/approve', methods=['POST']) (Manager role)
-# @app.route('/vacation_requests/<int:request_id>/reject', methods=['POST']) (Manager role)
+    return list_response(query, VACATION_REQUEST_SERIALIZER, VacationRequest.start_date, VacationRequest.id, descending=True)
+
+DECISION_STATUSES = {'approve': 'approved', 'reject': 'rejected'}
+MAX_DECISION_IDS = 1000
+
+def parse_decisions(data):
+    """Validate a {"ids": [...], "decision": "approve"|"reject"} body.
+
+    Returns (ids, status, None) or (None, None, error_response).
+    """
+    data = data if isinstance(data, dict) else {}
+    ids = data.get('ids')
+    status = DECISION_STATUSES.get(data.get('decision'))
+    if status is None:
+        return None, None, (jsonify({'message': "decision must be 'approve' or 'reject'"}), 400)
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return None, None, (jsonify({'message': 'ids must be a non-empty list of integers'}), 400)
+    if len(ids) > MAX_DECISION_IDS:
+        return None, None, (jsonify({'message': f'At most {MAX_DECISION_IDS} ids per request'}), 400)
+    return list(dict.fromkeys(ids)), status, None
+
+def decide_pending(model, ids, status):
+    """Move the pending rows among ids to status with one set-based UPDATE.
+
+    "AND status = 'pending'" is the optimistic concurrency check: a row that
+    someone else decided in the meantime is reported as a conflict, not
+    overwritten. Returns (results, affected): one {'id', 'outcome', 'status'}
+    per id in request order, and {user_id: [ids]} of the rows that changed,
+    so per-user aggregates are recomputed once per user. The caller commits.
+    """
+    table = model.__table__
+    changed = db.session.execute(
+        table.update().where(table.c.id.in_(ids), table.c.status == 'pending')
+        .values(status=status).returning(table.c.id, table.c.user_id)
+    ).all()
+    affected = {}
+    for row_id, user_id in changed:
+        affected.setdefault(user_id, []).append(row_id)
+    current = {row_id: status for row_id, _ in changed}
+    unchanged_ids = [row_id for row_id in ids if row_id not in current]
+    if unchanged_ids:
+        current.update(db.session.execute(
+            db.select(table.c.id, table.c.status).where(table.c.id.in_(unchanged_ids))
+        ).all())
+
+    changed_ids = {row_id for row_id, _ in changed}
+    results = []
+    for row_id in ids:
+        if row_id in changed_ids:
+            outcome = 'updated'
+        elif row_id in current:
+            outcome = 'conflict'
+        else:
+            outcome = 'not_found'
+        results.append({'id': row_id, 'outcome': outcome, 'status': current.get(row_id)})
+    return results, affected
+
+def decisions_response(model, label, refresh_user=None):
+    """Apply a decisions request; refresh_user(user_id) runs once per affected user before the commit."""
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    ids, status, error_response = parse_decisions(request.get_json(silent=True))
+    if error_response:
+        return error_response
+    try:
+        results, affected = decide_pending(model, ids, status)
+        if refresh_user:
+            for user_id in affected:
+                refresh_user(user_id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': f'Failed to update {label}', 'error': str(e)}), 500
+    return jsonify({'updated': sum(len(decided) for decided in affected.values()), 'results': results}), 200
+
+@api.route('/vacation_requests/decisions', methods=['POST'])
+@token_required
+def decide_vacation_requests():
+    # Body: {"ids": [1, 2, ...], "decision": "approve" | "reject"}; only pending requests change
+    return decisions_response(VacationRequest, 'vacation requests', refresh_user=rebuild_vacation_ledger)
+
+@api.route('/vacation_balance', methods=['GET'])
+@token_required
+def get_vacation_balance():
+    # ?user_id= (managers, defaults to the caller) &year= (defaults to this year)
+    user_id, error_response = resolve_user_id(request.args.get('user_id'))
+    if error_response:
+        return error_response
+    year = request.args.get('year', type=int) or date.today().year
+
+    # One primary-key read; a year without requests has the plain accrual
+    ledger = db.session.get(VacationLedger, (user_id, year))
+    accrued_days = ledger.accrued_days if ledger else current_app.config['VACATION_DAYS_PER_YEAR']
+    used_days = ledger.used_days if ledger else 0
+    pending_days = ledger.pending_days if ledger else 0
+    return jsonify({
+        'user_id': user_id,
+        'year': year,
+        'accrued_days': accrued_days,
+        'used_days': used_days,
+        'pending_days': pending_days,
+        'remaining_days': accrued_days - used_days,
+        'available_days': accrued_days - used_days - pending_days,
+    }), 200
 
 # --- Overtime Management ---
-@app.route('/overtime_entries', methods=['POST'])
+@api.route('/overtime_entries', methods=['POST'])
+@token_required
 def create_overtime_entry():
     data = request.get_json()
-    user_id = data.get('user_id')
     overtime_date_str = data.get('date') # Expected format: YYYY-MM-DD
     hours = data.get('hours')
     overtime_type = data.get('overtime_type')
     notes = data.get('notes')
 
-    if not all([user_id, overtime_date_str, hours, overtime_type]):
-        return jsonify({'message': 'Missing required fields (user_id, date, hours, overtime_type)'}), 400
+    if not all([overtime_date_str, hours, overtime_type]):
+        return jsonify({'message': 'Missing required fields (date, hours, overtime_type)'}), 400
 
     try:
         overtime_date_obj = datetime.strptime(overtime_date_str, '%Y-%m-%d').date()
@@ -479,9 +1835,9 @@ def create_overtime_entry():
     except ValueError:
         return jsonify({'message': 'Invalid date or hours format. Use YYYY-MM-DD for date and a positive number for hours.'}), 400
 
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user_id, error_response = resolve_user_id(data.get('user_id'))
+    if error_response:
+        return error_response
 
     new_entry = OvertimeEntry(
         user_id=user_id,
@@ -512,17 +1868,27 @@ def create_overtime_entry():
         db.session.rollback()
         return jsonify({'message': 'Failed to create overtime entry', 'error': str(e)}), 500
 
-@app.route('/overtime_entries', methods=['GET'])
+OVERTIME_ENTRY_SERIALIZER = ListSerializer([
+    ('id', OvertimeEntry.id, None),
+    ('user_id', OvertimeEntry.user_id, None),
+    ('username', User.username, None),
+    ('date', OvertimeEntry.date, date.isoformat),
+    ('hours', OvertimeEntry.hours, None),
+    ('overtime_type', OvertimeEntry.overtime_type, None),
+    ('notes', OvertimeEntry.notes, None),
+    ('status', OvertimeEntry.status, None),
+    ('requested_at', OvertimeEntry.requested_at, iso),
+    ('source', OvertimeEntry.source, None),
+], joins=[(User, OvertimeEntry.user_id == User.id)])
+
+@api.route('/overtime_entries', methods=['GET'])
+@token_required
 def get_overtime_entries():
-    user_id = request.args.get('user_id', type=int)
     status = request.args.get('status') # e.g., pending, approved, rejected
 
-    if not user_id:
-        return jsonify({'message': 'Missing user_id parameter'}), 400
-
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
+    user_id, error_response = resolve_user_id(request.args.get('user_id'))
+    if error_response:
+        return error_response
 
     query = OvertimeEntry.query.filter_by(user_id=user_id)
 
@@ -532,61 +1898,298 @@ def get_overtime_entries():
     # Consider adding date range filters if needed for history views later
     query = query.order_by(OvertimeEntry.date.desc())
 
-    entries_list = []
-    for entry in query.all():
-        entries_list.append({
-            'id': entry.id,
-            'user_id': entry.user_id,
-            'username': entry.employee.username,
-            'date': entry.date.isoformat(),
-            'hours': entry.hours,
-            'overtime_type': entry.overtime_type,
-            'notes': entry.notes,
-            'status': entry.status,
-            'requested_at': entry.requested_at.isoformat()
-        })
+    return list_response(query, OVERTIME_ENTRY_SERIALIZER, OvertimeEntry.date, OvertimeEntry.id, descending=True)
+
+def derive_overtime_entries(start_date, end_date, user_ids=None):
+    """Upsert pending derived overtime for worked time beyond the schedule.
+
+    Closed time entries (by TimeEntry.date) and shifts (by Shift.date) are
+    summed per user and day in SQL, both sorted by (user_id, date), and
+    merged in one pass by daily_overtime(). Each day is typed weekday,
+    weekend or holiday, counting the closures of the location of the day's
+    shifts as holidays. Pending derived entries are inserted, updated or
+    deleted to match; approved or rejected ones and manual entries are left
+    alone. Days that already have a manual entry (not rejected) get no
+    derived one, so payroll does not count them twice; they are reported
+    as skipped. The caller commits. Returns the number of rows per outcome.
+    """
+    worked = db.select(
+        TimeEntry.user_id, TimeEntry.date,
+        func.sum(duration_microseconds(TimeEntry.clock_in_time, TimeEntry.clock_out_time))
+    ).where(
+        TimeEntry.date >= start_date, TimeEntry.date <= end_date, TimeEntry.clock_out_time.isnot(None)
+    ).group_by(TimeEntry.user_id, TimeEntry.date).order_by(TimeEntry.user_id, TimeEntry.date)
+    scheduled = db.select(
+        Shift.user_id, Shift.date, func.sum(duration_microseconds(Shift.start_at, Shift.end_at)),
+        func.min(Shift.location)
+    ).where(
+        Shift.date >= start_date, Shift.date <= end_date
+    ).group_by(Shift.user_id, Shift.date).order_by(Shift.user_id, Shift.date)
+    existing = db.select(
+        OvertimeEntry.id, OvertimeEntry.user_id, OvertimeEntry.date, OvertimeEntry.hours,
+        OvertimeEntry.overtime_type, OvertimeEntry.status, OvertimeEntry.source
+    ).where(
+        OvertimeEntry.date >= start_date, OvertimeEntry.date <= end_date
+    )
+    if user_ids is not None:
+        worked = worked.where(TimeEntry.user_id.in_(user_ids))
+        scheduled = scheduled.where(Shift.user_id.in_(user_ids))
+        existing = existing.where(OvertimeEntry.user_id.in_(user_ids))
+
+    derived = {}
+    manual_days = set()
+    for row in db.session.execute(existing):
+        if row.source == 'derived':
+            derived[(row.user_id, row.date)] = row
+        elif row.status != 'rejected':
+            manual_days.add((row.user_id, row.date))
+    scheduled = db.session.execute(scheduled).all()
+    location_by_day = {(user_id, day): location for user_id, day, _, location in scheduled if location}
+    min_overtime = int(current_app.config['OVERTIME_MIN_MINUTES'] * 60_000_000)
+    inserts = []
+    updates = []
+    unchanged = 0
+    skipped = 0
+    for user_id, day, overtime_microseconds in daily_overtime(
+            db.session.execute(worked), scheduled, min_overtime):
+        hours = round(overtime_microseconds / 3600_000_000, 2)
+        if hours <= 0:
+            continue
+        if (user_id, day) in manual_days:
+            # Any pending derived row of the day is left in derived and deleted below
+            skipped += 1
+            continue
+        overtime_type = day_type(day, work_calendar(day.year, location_by_day.get((user_id, day))))
+        current = derived.pop((user_id, day), None)
+        if current is None:
+            inserts.append({'user_id': user_id, 'date': day, 'hours': hours, 'overtime_type': overtime_type,
+                            'status': 'pending', 'source': 'derived'})
+        elif current.status == 'pending' and (current.hours, current.overtime_type) != (hours, overtime_type):
+            updates.append({'entry_id': current.id, 'new_hours': hours, 'new_type': overtime_type})
+        else:
+            unchanged += 1
+    # Whatever is left no longer has overtime behind it (entries or shifts changed)
+    stale_ids = [row.id for row in derived.values() if row.status == 'pending']
+
+    table = OvertimeEntry.__table__
+    if inserts:
+        db.session.execute(table.insert(), inserts)
+    if updates:
+        db.session.execute(table.update().where(table.c.id == db.bindparam('entry_id')).values(
+            hours=db.bindparam('new_hours'), overtime_type=db.bindparam('new_type')
+        ), updates)
+    if stale_ids:
+        db.session.execute(table.delete().where(table.c.id.in_(stale_ids)))
+    return {'inserted': len(inserts), 'updated': len(updates), 'deleted': len(stale_ids), 'unchanged': unchanged,
+            'skipped': skipped}
+
+@api.route('/overtime_entries/derive', methods=['POST'])
+@token_required
+def derive_overtime():
+    # Body: {"start_date": "YYYY-MM-DD", "end_date": "YYYY-MM-DD", "user_ids": [optional]}, dates inclusive
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    data = request.get_json(silent=True) or {}
+    try:
+        start_date = parse_date(data['start_date'])
+        end_date = parse_date(data['end_date'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'start_date and end_date are required (YYYY-MM-DD)'}), 400
+    if end_date < start_date:
+        return jsonify({'message': 'end_date must not be before start_date'}), 400
+    user_ids = data.get('user_ids')
+    if user_ids is not None and not (isinstance(user_ids, list) and all(isinstance(i, int) for i in user_ids)):
+        return jsonify({'message': 'user_ids must be a list of integers'}), 400
 
-    return jsonify(entries_list), 200
+    try:
+        counts = derive_overtime_entries(start_date, end_date, user_ids)
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Overtime is being derived for the same days concurrently, retry shortly'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'message': 'Failed to derive overtime', 'error': str(e)}), 500
+    return jsonify(counts), 200
 
-# TODO for later: Add endpoints for updating status (approve/reject) by a manager
-# @app.route('/overtime_entries/<int:entry_id>/approve', methods=['POST']) (Manager role)
-# @app.route('/overtime_entries/<int:entry_id>/reject', methods=['POST']) (Manager role)
+@api.route('/overtime_entries/decisions', methods=['POST'])
+@token_required
+def decide_overtime_entries():
+    # Body: {"ids": [1, 2, ...], "decision": "approve" | "reject"}; only pending entries change
+    return decisions_response(OvertimeEntry, 'overtime entries')
 
 # --- Reporting ---
-@app.route('/reports/annual_hours/<int:user_id>/<int:year>', methods=['GET'])
+@api.route('/reports/annual_hours/<int:user_id>/<int:year>', methods=['GET'])
+@token_required
 def get_annual_hours_report(user_id, year):
-    user = User.query.get(user_id)
-    if not user:
-        return jsonify({'message': 'User not found'}), 404
-
+    user_id, error_response = resolve_user_id(user_id)
+    if error_response:
+        return error_response
+
+    # clock_out only invalidates the cache it can reach: the shared one, or
+    # with the default per-process LRU just its own worker's. So the current
+    # year is cached only when the cache is shared; past years take no more
+    # clock-ins and are cached either way.
+    cacheable = year < date.today().year or bool(current_app.config['REPORT_CACHE_URL'])
+    cache_key = (user_id, year)
+    report = report_cache.get(cache_key) if cacheable else None
+    if report is None:
+        # Taken before the queries: set() skips the report if a clock-out or
+        # import invalidated the key while it was being built.
+        version = report_cache.version(cache_key) if cacheable else None
+        report = build_annual_hours_report(user_id, year)
+        if cacheable:
+            report_cache.set(cache_key, report, version=version)
+
+    # Past years no longer receive clock-ins, so browsers may keep them for a while.
+    max_age = PAST_YEAR_MAX_AGE if year < date.today().year else None
+    stamp = (json.dumps(report, sort_keys=True),)
+    return conditional_response(stamp, lambda: jsonify(report), max_age=max_age)
+
+@api.route('/reports/cache_stats', methods=['GET'])
+@token_required
+def get_report_cache_stats():
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    return jsonify(report_cache.stats()), 200
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'message': 'Metrics are disabled'}), 404
+    metrics_token = current_app.config['METRICS_TOKEN']
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if metrics_token and scheme.lower() == 'bearer' and secrets.compare_digest(token.strip().encode(), metrics_token.encode()):
+        return metrics_response()
+    return get_metrics_as_manager()
+
+@token_required
+def get_metrics_as_manager():
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    return metrics_response()
+
+def metrics_response():
+    caches = {'report': report_cache.stats(), 'calendar': calendar_cache.stats()}
+    return Response(request_metrics.render(caches), mimetype='text/plain; version=0.0.4')
+
+EXPORT_BATCH_SIZE = 5000
+PAYROLL_FIELDS = ['record_type', 'record_id', 'user_id', 'username', 'date', 'start', 'end', 'hours', 'category', 'status']
+
+def payroll_batches(year, month):
+    """Yield the payroll export rows of a month as lists, one per cursor batch.
+
+    Completed time entries overlapping the month (with the hours inside it,
+    as in the annual report), overtime entries dated in it and vacations
+    overlapping it are read in turn from server-side cursors in user order.
+    Usernames are looked up once per batch, only for users not seen yet.
+    """
+    month_start, month_end = month_bounds(year, month)
+    period_start, period_end = datetime.combine(month_start, time()), datetime.combine(month_end, time())
+    usernames = {}
+
+    def batches(statement):
+        result = db.session.execute(statement, execution_options={'yield_per': EXPORT_BATCH_SIZE})
+        for rows in result.partitions():
+            missing = {row.user_id for row in rows} - usernames.keys()
+            if missing:
+                usernames.update(db.session.execute(db.select(User.id, User.username).where(User.id.in_(missing))).all())
+            yield rows
+
+    # An entry is dated on its clock-in day and lasts under a day, so the date
+    # bound (on ix_time_entry_date) keeps the scan to the month plus the day
+    # before it; the clock times then pick the entries that overlap the month.
+    time_entries = db.select(
+        TimeEntry.id, TimeEntry.user_id, TimeEntry.date, TimeEntry.clock_in_time, TimeEntry.clock_out_time
+    ).where(
+        TimeEntry.date >= month_start - timedelta(days=1), TimeEntry.date < month_end,
+        TimeEntry.clock_in_time < period_end, TimeEntry.clock_out_time > period_start
+    ).order_by(TimeEntry.user_id, TimeEntry.date, TimeEntry.id)
+    for rows in batches(time_entries):
+        yield [['time_entry', row.id, row.user_id, usernames[row.user_id], row.date.isoformat(),
+                row.clock_in_time.isoformat(), row.clock_out_time.isoformat(),
+                round((min(row.clock_out_time, period_end) - max(row.clock_in_time, period_start)).total_seconds() / 3600, 2),
+                None, None] for row in rows]
+
+    overtime_entries = db.select(
+        OvertimeEntry.id, OvertimeEntry.user_id, OvertimeEntry.date, OvertimeEntry.hours,
+        OvertimeEntry.overtime_type, OvertimeEntry.status
+    ).where(
+        OvertimeEntry.date >= month_start, OvertimeEntry.date < month_end
+    ).order_by(OvertimeEntry.user_id, OvertimeEntry.date, OvertimeEntry.id)
+    for rows in batches(overtime_entries):
+        yield [['overtime', row.id, row.user_id, usernames[row.user_id], row.date.isoformat(),
+                None, None, row.hours, row.overtime_type, row.status] for row in rows]
+
+    vacations = db.select(
+        VacationRequest.id, VacationRequest.user_id, VacationRequest.start_date, VacationRequest.end_date,
+        VacationRequest.status
+    ).where(
+        VacationRequest.start_date < month_end, VacationRequest.end_date >= month_start
+    ).order_by(VacationRequest.user_id, VacationRequest.start_date, VacationRequest.id)
+    for rows in batches(vacations):
+        yield [['vacation', row.id, row.user_id, usernames[row.user_id], row.start_date.isoformat(),
+                row.start_date.isoformat(), row.end_date.isoformat(), None, None, row.status] for row in rows]
+
+def gzip_chunks(chunks):
+    """Compress a stream of byte chunks into one gzip member as it goes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+@api.route('/exports/payroll', methods=['GET'])
+@token_required
+def export_payroll():
+    # One streamed file for every employee's month instead of paging through
+    # the list endpoints per user; gzip is applied on the fly when accepted.
+    if not is_manager():
+        return jsonify({'message': 'Manager role required'}), 403
+    year = request.args.get('year', type=int)
+    month = request.args.get('month', type=int)
+    fmt = request.args.get('format', 'csv')
+    if year is None or month is None or not 1 <= month <= 12:
+        return jsonify({'message': 'year and month (1-12) are required'}), 400
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'message': "format must be 'csv' or 'ndjson'"}), 400
+
+    def generate():
+        if fmt == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(PAYROLL_FIELDS)
+            for rows in payroll_batches(year, month):
+                writer.writerows(rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue().encode()
+        else:
+            for rows in payroll_batches(year, month):
+                yield b''.join(json_dumps(dict(zip(PAYROLL_FIELDS, row))) + b'\n' for row in rows)
+
+    chunks = generate()
+    headers = {
+        'Content-Disposition': f'attachment; filename=payroll-{year}-{month:02d}.{fmt}',
+        'Vary': 'Accept-Encoding',
+    }
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
+
+def build_annual_hours_report(user_id, year):
     # --- Calculate Total Annual Hours ---
-    # We need to sum durations of time entries for the user and year.
-    # Duration is clock_out_time - clock_in_time.
-    # This is a bit complex with SQLAlchemy's sum over timedeltas directly.
-    # An alternative is to iterate and sum in Python, or use database-specific functions.
-
-    # Let's iterate and sum in Python for clarity here.
-    # For performance on large datasets, a raw SQL or more advanced SQLAlchemy query might be better.
-
-    time_entries_for_year = TimeEntry.query.filter(
-        TimeEntry.user_id == user_id,
-        db.extract('year', TimeEntry.date) == year,
-        TimeEntry.clock_out_time.isnot(None) # Only include completed entries
-    ).all()
-
-    total_annual_seconds = 0
-    monthly_hours = {month: 0 for month in range(1, 13)} # Initialize all months to 0 hours
-
-    for entry in time_entries_for_year:
-        if entry.clock_in_time and entry.clock_out_time:
-            duration = entry.clock_out_time - entry.clock_in_time
-            duration_seconds = duration.total_seconds()
-            total_annual_seconds += duration_seconds
+    # Read the per-month rollup maintained by clock_out (at most 12 rows), so
+    # the cost stays flat however many years of time entries accumulate.
+    rollup_rows = MonthlyHoursRollup.query.filter_by(user_id=user_id, year=year).all()
+    monthly_microseconds = {row.month: row.worked_microseconds for row in rollup_rows}
+    monthly_hours = {month: monthly_microseconds.get(month, 0) / 3600_000_000 for month in range(1, 13)}
 
-            entry_month = entry.date.month
-            monthly_hours[entry_month] += duration_seconds / 3600 # Convert seconds to hours for monthly sum
-
-    total_annual_hours = round(total_annual_seconds / 3600, 2)
+    total_annual_hours = round(sum(monthly_microseconds.values()) / 3600_000_000, 2)
 
     # Prepare monthly breakdown for JSON response
     monthly_breakdown = []
@@ -597,30 +2200,33 @@ def get_annual_hours_report(user_id, year):
             'total_hours': round(hours_sum, 2)
         })
 
-    return jsonify({
+    return {
         'user_id': user_id,
         'year': year,
         'total_annual_hours': total_annual_hours,
         'monthly_breakdown': monthly_breakdown
-    }), 200
+    }
 
 # --- Static File Serving ---
 # Serve login.html at /login.html and at /
-@app.route('/')
-@app.route('/login.html')
+@api.route('/')
+@api.route('/login.html')
 def serve_login_page():
-    return send_from_directory(os.path.join(os.path.dirname(app.root_path)), 'login.html')
+    return send_from_directory(os.path.join(os.path.dirname(current_app.root_path)), 'login.html')
 
-@app.route('/register.html')
+@api.route('/register.html')
 def serve_register_page():
-    return send_from_directory(os.path.join(os.path.dirname(app.root_path)), 'register.html')
+    return send_from_directory(os.path.join(os.path.dirname(current_app.root_path)), 'register.html')
 
 # Generic route for other HTML files in the root directory
-@app.route('/<path:filename>.html')
+@api.route('/<path:filename>.html')
 def serve_html_page(filename):
-    return send_from_directory(os.path.join(os.path.dirname(app.root_path)), f"{filename}.html")
+    return send_from_directory(os.path.join(os.path.dirname(current_app.root_path)), f"{filename}.html")
 
 # If you have CSS/JS files in a subfolder (e.g., static/):
-# @app.route('/static/<path:filename>')
+# @api.route('/static/<path:filename>')
 # def serve_static_files(filename):
-#     return send_from_directory(os.path.join(os.path.dirname(app.root_path), 'static'), filename)
+#     return send_from_directory(os.path.join(os.path.dirname(current_app.root_path), 'static'), filename)
+
+if __name__ == '__main__':
+    create_app({'DEBUG': True}).run(debug=True)
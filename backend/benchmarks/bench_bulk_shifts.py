@@ -0,0 +1,83 @@
+"""Benchmark: publishing a roster through POST /shifts/bulk vs. one POST /shifts per shift.
+
+Every user already has two weeks of shifts right before the roster, so the
+conflict checks (overlap, minimum rest, vacations) have neighbours to test.
+
+Usage (from backend/):
+    python benchmarks/bench_bulk_shifts.py [--shifts 10000] [--users 300] [--single 500]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+
+from app import create_app, db, User, Shift  # noqa: E402
+from tokens import issue_token  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+
+def roster(n_shifts, n_users, first_day):
+    return [{
+        'user_id': n % n_users + 1,
+        'date': (first_day + timedelta(days=n // n_users)).isoformat(),
+        'start_time': '09:00',
+        'end_time': '17:00',
+        'location': 'Bench',
+    } for n in range(n_shifts)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shifts', type=int, default=10_000)
+    parser.add_argument('--users', type=int, default=300)
+    parser.add_argument('--single', type=int, default=500, help='Shifts to post one at a time for comparison.')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+             'password_hash': 'x', 'role': 'employee'}
+            for i in range(1, args.users + 1)
+        ])
+        for first_day in (date(2025, 1, 1), date(2026, 1, 1)):
+            db.session.execute(Shift.__table__.insert(), [
+                {'user_id': shift['user_id'], 'date': date.fromisoformat(shift['date']), 'location': shift['location'],
+                 'start_at': datetime.fromisoformat(f"{shift['date']}T09:00"),
+                 'end_at': datetime.fromisoformat(f"{shift['date']}T17:00")}
+                for shift in roster(14 * args.users, args.users, first_day - timedelta(days=14))
+            ])
+        db.session.commit()
+
+    client = app.test_client()
+    token, _ = issue_token(app.config['SECRET_KEY'], 1, 'manager', 3600)
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    body = json.dumps(roster(args.shifts, args.users, date(2025, 1, 1)))
+    started = time.perf_counter()
+    response = client.post('/shifts/bulk', data=body, content_type='application/json')
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 201, response.data
+    print(f'POST /shifts/bulk: {args.shifts} shifts in {elapsed * 1000:.0f} ms ({args.shifts / elapsed:,.0f} shifts/s)')
+
+    shifts = roster(args.single, args.users, date(2026, 1, 1))
+    started = time.perf_counter()
+    for shift in shifts:
+        response = client.post('/shifts', data=json.dumps(shift), content_type='application/json')
+        assert response.status_code == 201, response.data
+    elapsed = time.perf_counter() - started
+    print(f'POST /shifts x{args.single}: {elapsed * 1000:.0f} ms ({args.single / elapsed:,.0f} shifts/s)')
+
+
+if __name__ == '__main__':
+    main()
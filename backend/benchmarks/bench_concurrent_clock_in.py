@@ -0,0 +1,88 @@
+"""Benchmark: clock-in/clock-out from several worker processes sharing one SQLite file.
+
+Each process builds its own app with create_app(), like a gunicorn worker,
+and clocks a disjoint set of users in and out. Any 5xx (e.g. "database is
+locked") is counted as an error.
+
+Usage (from backend/):
+    python benchmarks/bench_concurrent_clock_in.py [--workers 4] [--users 50] [--cycles 20] [--no-wal]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app import create_app, db, User  # noqa: E402
+from tokens import issue_token  # noqa: E402
+
+
+def make_app(db_uri, wal):
+    return create_app({'SQLALCHEMY_DATABASE_URI': db_uri, 'SQLITE_WAL': wal, 'SECRET_KEY': 'bench'})
+
+
+def worker(db_uri, wal, user_ids, cycles, results):
+    client = make_app(db_uri, wal).test_client()
+    # Each user taps with their own token, as the kiosk page would
+    auth = {user_id: {'Authorization': f"Bearer {issue_token('bench', user_id, 'employee', 3600)[0]}"}
+            for user_id in user_ids}
+    ok = errors = 0
+    for _ in range(cycles):
+        for url in ('/time_entries/clock_in', '/time_entries/clock_out'):
+            for user_id in user_ids:
+                response = client.post(url, data=json.dumps({'user_id': user_id}), content_type='application/json',
+                                       headers=auth[user_id])
+                if response.status_code >= 500:
+                    errors += 1
+                else:
+                    ok += 1
+    results.put((ok, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--users', type=int, default=50, help='Users per worker.')
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--no-wal', action='store_true', help='Keep the rollback journal for comparison.')
+    args = parser.parse_args()
+
+    db_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+    wal = not args.no_wal
+    total_users = args.workers * args.users
+    with make_app(db_uri, wal).app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+             'password_hash': 'x', 'role': 'employee'}
+            for i in range(1, total_users + 1)
+        ])
+        db.session.commit()
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(
+            db_uri, wal, range(w * args.users + 1, (w + 1) * args.users + 1), args.cycles, results))
+        for w in range(args.workers)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    ok = sum(o for o, _ in outcomes)
+    errors = sum(e for _, e in outcomes)
+    print(f"{args.workers} workers, WAL {'on' if wal else 'off'}: {ok + errors} requests in {elapsed:.2f}s "
+          f"({(ok + errors) / elapsed:,.0f} req/s), {errors} server errors")
+
+
+if __name__ == '__main__':
+    main()
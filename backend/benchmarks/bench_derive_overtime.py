@@ -0,0 +1,73 @@
+"""Benchmark: `flask derive-overtime` over one month for a 1,000-employee team.
+
+Every employee has an 8h shift on each weekday and a time entry on each
+weekday plus some Saturdays, running a little over or under the shift. The
+first run inserts the derived overtime, the second finds it unchanged.
+
+Usage (from backend/):
+    python benchmarks/bench_derive_overtime.py [--users 1000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+
+from app import create_app, db, User, Shift, TimeEntry  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+FIRST_DAY = date(2025, 3, 1)
+N_DAYS = 31
+
+
+def populate(n_users):
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+         'password_hash': 'x', 'role': 'employee'}
+        for i in range(1, n_users + 1)
+    ])
+    for day in (FIRST_DAY + timedelta(days=n) for n in range(N_DAYS)):
+        start_at = datetime.combine(day, dt_time(8))
+        if day.weekday() < 5:
+            db.session.execute(Shift.__table__.insert(), [
+                {'user_id': user_id, 'date': day, 'start_at': start_at, 'end_at': start_at + timedelta(hours=8)}
+                for user_id in range(1, n_users + 1)
+            ])
+        db.session.execute(TimeEntry.__table__.insert(), [
+            {'user_id': user_id, 'date': day, 'clock_in_time': start_at,
+             'clock_out_time': start_at + timedelta(hours=8 if day.weekday() < 5 else 4, minutes=(user_id * day.day) % 90 - 30)}
+            for user_id in range(1, n_users + 1) if day.weekday() < 5 or user_id % 3 == 0
+        ])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        populate(args.users)
+        print(f'{args.users} users, {TimeEntry.query.count():,} time entries, {Shift.query.count():,} shifts')
+
+    runner = app.test_cli_runner()
+    last_day = FIRST_DAY + timedelta(days=N_DAYS - 1)
+    for label in ('first run', 'rerun'):
+        started = time.perf_counter()
+        result = runner.invoke(args=['derive-overtime', FIRST_DAY.isoformat(), last_day.isoformat()])
+        if result.exception:
+            raise result.exception
+        print(f'  {label}: {time.perf_counter() - started:.2f}s  {result.output.strip()}')
+
+
+if __name__ == '__main__':
+    main()
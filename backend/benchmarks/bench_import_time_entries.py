@@ -0,0 +1,85 @@
+"""Benchmark: importing a large CSV of badge records with `flask import-time-entries`.
+
+Writes --rows completed entries for --users employees (one 8-9h entry per
+user and day, going back in time) to a temporary CSV, then imports it into
+a fresh SQLite database through the CLI command and prints its rows/s
+summary. --interrupt-after stops the first run partway and resumes it with
+a second run, to time the checkpoint skip.
+
+Usage (from backend/):
+    python benchmarks/bench_import_time_entries.py [--rows 1000000] [--users 1000] [--interrupt-after 0]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+WORK_DIR = tempfile.mkdtemp(prefix='turni-bench-')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+
+import app as app_module  # noqa: E402
+from app import create_app, db, User  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+
+def write_csv(path, n_rows, n_users):
+    first_day = datetime(2025, 12, 31, 8) - timedelta(days=n_rows // n_users)
+    with open(path, 'w', newline='') as f:
+        f.write('user_id,clock_in_time,clock_out_time\n')
+        for n in range(n_rows):
+            clock_in = first_day + timedelta(days=n // n_users, minutes=n % 60)
+            clock_out = clock_in + timedelta(hours=8, minutes=n % 45)
+            f.write(f'{n % n_users + 1},{clock_in.isoformat()},{clock_out.isoformat()}\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--interrupt-after', type=int, default=0, help='Records to import before a simulated crash.')
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+             'password_hash': 'x', 'role': 'employee'}
+            for i in range(1, args.users + 1)
+        ])
+        db.session.commit()
+
+    path = os.path.join(WORK_DIR, 'entries.csv')
+    started = time.perf_counter()
+    write_csv(path, args.rows, args.users)
+    print(f'wrote {args.rows:,} rows ({os.path.getsize(path) / 1e6:.0f} MB) in {time.perf_counter() - started:.1f}s')
+
+    runner = app.test_cli_runner()
+    if args.interrupt_after:
+        import_time_entries = app_module.import_time_entries
+
+        def crash_after(records, *rest):
+            def limited():
+                for n, record in enumerate(records):
+                    if n == args.interrupt_after:
+                        raise KeyboardInterrupt
+                    yield record
+            return import_time_entries(limited(), *rest)
+        app_module.import_time_entries = crash_after
+        result = runner.invoke(args=['import-time-entries', path])
+        app_module.import_time_entries = import_time_entries
+        print(f'first run stopped: {type(result.exception).__name__}')
+
+    result = runner.invoke(args=['import-time-entries', path])
+    print(result.output.strip())
+    if result.exception:
+        raise result.exception
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark: building a 50k-row shift list, per-row ORM dicts vs. the column serializer.
+
+"orm + jsonify" is the previous code path: Shift entities with a joined
+employee, one dict per row, then jsonify. The other rows go through
+list_response() with SHIFT_SERIALIZER, with and without orjson.
+
+Usage (from backend/):
+    python benchmarks/bench_list_serialization.py [--rows 50000] [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+
+from flask import jsonify  # noqa: E402
+from sqlalchemy.orm import joinedload  # noqa: E402
+
+import app as app_module  # noqa: E402
+from app import create_app, db, list_response, User, Shift, SHIFT_SERIALIZER  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+N_USERS = 500
+
+
+def populate(n_rows):
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+         'password_hash': 'x', 'role': 'employee'}
+        for i in range(1, N_USERS + 1)
+    ])
+    db.session.execute(Shift.__table__.insert(), [{
+        'user_id': n % N_USERS + 1,
+        'date': date(2025, 1, 1) + timedelta(days=n // N_USERS),
+        'start_at': datetime.combine(date(2025, 1, 1) + timedelta(days=n // N_USERS), dt_time(9, 0)),
+        'end_at': datetime.combine(date(2025, 1, 1) + timedelta(days=n // N_USERS), dt_time(17, 0)),
+        'location': 'Bench',
+    } for n in range(n_rows)])
+    db.session.commit()
+
+
+def orm_jsonify():
+    def shift_to_dict(shift):
+        return {
+            'id': shift.id,
+            'user_id': shift.user_id,
+            'username': shift.employee.username,
+            'date': shift.date.isoformat(),
+            'start_time': shift.start_at.time().isoformat(),
+            'end_time': shift.end_at.time().isoformat(),
+            'location': shift.location
+        }
+    return jsonify([shift_to_dict(shift) for shift in Shift.query.options(joinedload(Shift.employee)).all()])
+
+
+def serializer():
+    return list_response(Shift.query, SHIFT_SERIALIZER, Shift.date, Shift.id)
+
+
+def measure(label, url, build, repeat):
+    timings = []
+    for _ in range(repeat):
+        with app.test_request_context(url):
+            started = time.perf_counter()
+            response = build()
+            body = response.get_data()
+            timings.append(time.perf_counter() - started)
+            db.session.remove()
+    print(f'  {label:<32} {min(timings) * 1000:7.0f} ms  {len(body) / 1e6:5.1f} MB')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=50_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with app.app_context():
+        populate(args.rows)
+
+    print(f'{args.rows} shifts (best of {args.repeat}):')
+    measure('orm + jsonify', '/shifts', orm_jsonify, args.repeat)
+    orjson = app_module.orjson
+    for encoder in (['orjson'] if orjson else []) + ['json']:
+        app_module.orjson = orjson if encoder == 'orjson' else None
+        measure(f'serializer, rows ({encoder})', '/shifts', serializer, args.repeat)
+        measure(f'serializer, columnar ({encoder})', '/shifts?format=columnar', serializer, args.repeat)
+    app_module.orjson = orjson
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark: peak Python memory of an unfiltered GET /shifts, buffered vs. ?stream=1.
+
+Usage (from backend/):
+    python benchmarks/bench_list_streaming.py [--rows 200000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, time as dt_time, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+
+from app import create_app, db, User, Shift  # noqa: E402
+from tokens import issue_token  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+N_USERS = 500
+
+
+def populate(n_rows):
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+         'password_hash': 'x', 'role': 'employee'}
+        for i in range(1, N_USERS + 1)
+    ])
+    db.session.execute(Shift.__table__.insert(), [{
+        'user_id': n % N_USERS + 1,
+        'date': date(2020, 1, 1) + timedelta(days=n // N_USERS),
+        'start_at': datetime.combine(date(2020, 1, 1) + timedelta(days=n // N_USERS), dt_time(9, 0)),
+        'end_at': datetime.combine(date(2020, 1, 1) + timedelta(days=n // N_USERS), dt_time(17, 0)),
+        'location': 'Bench',
+    } for n in range(n_rows)])
+    db.session.commit()
+
+
+def measure(client, url, consume):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    consumed = consume(response)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'  {url}: {consumed / 1e6:.1f} MB body, peak {peak / 1e6:.1f} MB, {elapsed:.2f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=200_000)
+    args = parser.parse_args()
+
+    with app.app_context():
+        populate(args.rows)
+    client = app.test_client()
+    token, _ = issue_token(app.config['SECRET_KEY'], 1, 'manager', 3600)
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    def drain(response):
+        # Count bytes chunk by chunk without keeping the body around.
+        return sum(len(chunk) for chunk in response.response)
+
+    print(f'{args.rows} shifts:')
+    measure(client, '/shifts', drain)
+    measure(client, '/shifts?stream=1', drain)
+
+
+if __name__ == '__main__':
+    main()
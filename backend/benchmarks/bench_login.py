@@ -0,0 +1,100 @@
+"""Benchmark: logins per second in one worker process, and clock-in latency meanwhile.
+
+Login threads hammer POST /login while one thread clocks a user in and out,
+so the numbers show both the hashing throughput of the configured method and
+whether a login burst starves the other endpoints. Every thread counts as a
+request thread (REQUEST_THREADS), and a refused login waits for Retry-After
+like a well-behaved client. Fails when the clock-in/out p95 exceeds --max-p95-ms.
+
+Usage (from backend/):
+    python benchmarks/bench_login.py [--threads 16] [--seconds 5] [--methods scrypt pbkdf2:sha256:600000] [--max-p95-ms 250]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app import create_app, db, User, password_hasher  # noqa: E402
+from tokens import issue_token  # noqa: E402
+
+N_USERS = 20
+
+
+def run(method, n_threads, seconds, max_p95_ms):
+    db_uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+    app = create_app({'SQLALCHEMY_DATABASE_URI': db_uri, 'PASSWORD_HASH_METHOD': method,
+                      'REQUEST_THREADS': n_threads + 1, 'SECRET_KEY': 'bench'})
+    with app.app_context():
+        db.create_all()
+        password_hash = password_hasher.hash('password')
+        db.session.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+             'password_hash': password_hash, 'role': 'employee'}
+            for i in range(1, N_USERS + 2)
+        ])
+        db.session.commit()
+
+    deadline = time.perf_counter() + seconds
+    logins = []
+    clock_latencies = []
+
+    def log_in(n):
+        client = app.test_client()
+        done = busy = 0
+        while time.perf_counter() < deadline:
+            body = json.dumps({'username': f'bench{n % N_USERS + 1}', 'password': 'password'})
+            response = client.post('/login', data=body, content_type='application/json')
+            if response.status_code == 200:
+                done += 1
+            elif response.status_code == 503:
+                busy += 1
+                time.sleep(float(response.headers['Retry-After']))
+        logins.append((done, busy))
+
+    def clock():
+        client = app.test_client()
+        token, _ = issue_token(app.config['SECRET_KEY'], N_USERS + 1, 'employee', 3600)
+        client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+        while time.perf_counter() < deadline:
+            for url in ('/time_entries/clock_in', '/time_entries/clock_out'):
+                started = time.perf_counter()
+                client.post(url, data='{}', content_type='application/json')
+                clock_latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=log_in, args=(n,)) for n in range(n_threads)]
+    threads.append(threading.Thread(target=clock))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    done = sum(d for d, _ in logins)
+    busy = sum(b for _, b in logins)
+    quantiles = statistics.quantiles(clock_latencies, n=20)
+    print(f'{method}: {done / seconds:,.0f} logins/s ({busy} refused as busy), '
+          f'clock-in/out p50 {quantiles[9] * 1000:.1f} ms, p95 {quantiles[18] * 1000:.1f} ms '
+          f'({app.config["PASSWORD_HASH_WORKERS"]} hash threads, {app.config["PASSWORD_HASH_MAX_PENDING"]} pending)')
+    assert quantiles[18] * 1000 <= max_p95_ms, f'clock-in/out p95 above {max_p95_ms} ms during the login burst'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='Concurrent login request threads.')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--methods', nargs='+', default=['scrypt', 'pbkdf2:sha256:600000'])
+    parser.add_argument('--max-p95-ms', type=float, default=250, help='Clock-in/out p95 bound during the burst.')
+    args = parser.parse_args()
+
+    for method in args.methods:
+        run(method, args.threads, args.seconds, args.max_p95_ms)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark: GET /exports/payroll for one month of a large team, peak memory and throughput.
+
+Timings are taken under tracemalloc, which slows the export several times
+over; compare them with each other, not with production latency. The table
+also holds --history-days of earlier entries, as after importing past years,
+which the export must skip rather than scan.
+
+Usage (from backend/):
+    python benchmarks/bench_payroll_export.py [--users 2000] [--days 31] [--history-days 365]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+
+from app import create_app, db, User, TimeEntry, OvertimeEntry, VacationRequest  # noqa: E402
+from tokens import issue_token  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+FIRST_DAY = date(2025, 3, 1)
+
+
+def populate(n_users, n_days, history_days):
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i:05d}', 'email': f'bench{i}@example.com',
+         'password_hash': 'x', 'role': 'employee'}
+        for i in range(1, n_users + 1)
+    ])
+    for day in range(-history_days, n_days):
+        entry_date = FIRST_DAY + timedelta(days=day)
+        clock_in = datetime.combine(entry_date, datetime.min.time()) + timedelta(hours=8)
+        db.session.execute(TimeEntry.__table__.insert(), [
+            {'user_id': user_id, 'date': entry_date, 'clock_in_time': clock_in + timedelta(minutes=user_id % 30),
+             'clock_out_time': clock_in + timedelta(hours=8, minutes=user_id % 50)}
+            for user_id in range(1, n_users + 1)
+        ])
+    db.session.execute(OvertimeEntry.__table__.insert(), [
+        {'user_id': user_id, 'date': FIRST_DAY + timedelta(days=user_id % n_days), 'hours': 1.5,
+         'overtime_type': 'weekday', 'status': 'approved'}
+        for user_id in range(1, n_users + 1)
+    ])
+    db.session.execute(VacationRequest.__table__.insert(), [
+        {'user_id': user_id, 'start_date': FIRST_DAY + timedelta(days=user_id % n_days),
+         'end_date': FIRST_DAY + timedelta(days=user_id % n_days + 2), 'status': 'approved'}
+        for user_id in range(1, n_users + 1, 4)
+    ])
+    db.session.commit()
+
+
+def measure(client, url, headers=None):
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(url, headers=headers, buffered=False)
+    # Count bytes chunk by chunk without keeping the body around.
+    size = sum(len(chunk) for chunk in response.response)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    encoding = response.headers.get('Content-Encoding', 'identity')
+    print(f'  {url} ({encoding}): {size / 1e6:.1f} MB, peak {peak / 1e6:.1f} MB, {elapsed:.2f}s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--history-days', type=int, default=365)
+    args = parser.parse_args()
+
+    with app.app_context():
+        populate(args.users, args.days, args.history_days)
+    client = app.test_client()
+    token, _ = issue_token(app.config['SECRET_KEY'], 1, 'manager', 3600)
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    print(f'{args.users} users x {args.days} days of time entries, after {args.history_days} days of history:')
+    url = f'/exports/payroll?year={FIRST_DAY.year}&month={FIRST_DAY.month}'
+    measure(client, url)
+    measure(client, url, {'Accept-Encoding': 'gzip'})
+    measure(client, url + '&format=ndjson')
+    measure(client, url + '&format=ndjson', {'Accept-Encoding': 'gzip'})
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark: GET /schedule/matrix for a 500-employee team over 4 weeks.
+
+The table holds a year of daily shifts for every employee, so the request has
+to pick its 4 weeks out of a much larger history.
+
+Usage (from backend/):
+    python benchmarks/bench_schedule_matrix.py [--users 500] [--days 28] [--history-days 365] [--repeat 10]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+
+from app import create_app, db, User, Shift  # noqa: E402
+from tokens import issue_token  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+FIRST_DAY = date(2025, 1, 1)
+
+
+def populate(n_users, history_days):
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i:04d}', 'email': f'bench{i}@example.com',
+         'password_hash': 'x', 'role': 'employee'}
+        for i in range(1, n_users + 1)
+    ])
+    db.session.execute(Shift.__table__.insert(), [{
+        'user_id': user_id,
+        'date': FIRST_DAY + timedelta(days=day),
+        'start_at': datetime.combine(FIRST_DAY + timedelta(days=day), dt_time(6 + 8 * (user_id % 2), 0)),
+        'end_at': datetime.combine(FIRST_DAY + timedelta(days=day), dt_time(14 + 8 * (user_id % 2), 0)),
+        'location': 'Nord' if user_id % 3 else 'Sud',
+    } for day in range(history_days) for user_id in range(1, n_users + 1)])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=500)
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--history-days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        populate(args.users, args.history_days)
+    client = app.test_client()
+    token, _ = issue_token(app.config['SECRET_KEY'], 1, 'manager', 3600)
+    client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+    start = FIRST_DAY + timedelta(days=args.history_days // 2)
+    end = start + timedelta(days=args.days - 1)
+    for label, extra in (('all locations', ''), ('location=Sud', '&location=Sud')):
+        url = f'/schedule/matrix?start={start}&end={end}{extra}'
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.data
+        print(f'{args.users} users x {args.days} days, {label}: median {statistics.median(timings) * 1000:.0f} ms, '
+              f'best {min(timings) * 1000:.0f} ms, {len(response.data) / 1e3:.0f} kB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark: month filtering on GET /shifts with extract() vs. a half-open date range.
+
+Builds a throwaway SQLite database with --rows shifts (1M by default), then
+prints the query plan and the median latency of both predicates for a single
+user's month, which is what every calendar render in gestioneturni.html asks for.
+
+Usage (from backend/):
+    python benchmarks/bench_shift_month_filter.py [--rows 1000000] [--users 1000]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-bench-'), 'bench.db')
+os.environ['DATABASE_URL'] = f'sqlite:///{DB_FILE}'
+
+from sqlalchemy import select, text  # noqa: E402
+from app import create_app, db, month_bounds, User, Shift  # noqa: E402
+
+app = create_app({'SECRET_KEY': 'bench'})
+
+CHUNK_SIZE = 50_000
+
+
+def populate(n_rows, n_users):
+    db.create_all()
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'bench{i}', 'email': f'bench{i}@example.com',
+         'password_hash': 'x', 'role': 'employee'}
+        for i in range(1, n_users + 1)
+    ])
+    first_day = date(2020, 1, 1)
+    shifts_per_user = n_rows // n_users
+    rows = []
+    for n in range(n_rows):
+        shift_date = first_day + timedelta(days=(n // n_users) % max(shifts_per_user, 1))
+        rows.append({
+            'user_id': n % n_users + 1,
+            'date': shift_date,
+            'start_at': datetime.combine(shift_date, dt_time(9, 0)),
+            'end_at': datetime.combine(shift_date, dt_time(17, 0)),
+            'location': 'Bench',
+        })
+        if len(rows) == CHUNK_SIZE:
+            db.session.execute(Shift.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Shift.__table__.insert(), rows)
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+
+
+def timed(stmt, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = db.session.execute(stmt).all()
+        samples.append(time.perf_counter() - started)
+    return len(result), statistics.median(samples) * 1000
+
+
+def show_plan(label, stmt):
+    compiled = stmt.compile(db.engine, compile_kwargs={'literal_binds': True})
+    plan = db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')).all()
+    print(f'  {label} plan:')
+    for row in plan:
+        print(f'    {row[-1]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        started = time.perf_counter()
+        populate(args.rows, args.users)
+        print(f'Loaded {args.rows} shifts for {args.users} users in {time.perf_counter() - started:.1f}s ({DB_FILE})')
+
+        user_id, year, month = 42, 2020, 6
+        extract_stmt = select(Shift).where(
+            Shift.user_id == user_id,
+            db.extract('year', Shift.date) == year,
+            db.extract('month', Shift.date) == month,
+        )
+        month_start, month_end = month_bounds(year, month)
+        range_stmt = select(Shift).where(
+            Shift.user_id == user_id,
+            Shift.date >= month_start,
+            Shift.date < month_end,
+        )
+
+        for label, stmt in (('extract()', extract_stmt), ('date range', range_stmt)):
+            show_plan(label, stmt)
+            n, median_ms = timed(stmt, args.repeat)
+            print(f'  {label}: {n} rows, median {median_ms:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
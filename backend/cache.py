@@ -0,0 +1,156 @@
+"""Small key/value caches for computed responses.
+
+Two interchangeable backends share the same get/set/delete/clear/stats API:
+
+- LRUCache: in-process, bounded by entry count and a per-entry TTL.
+- RedisCache: any client with the redis-py get/set/delete/scan_iter methods,
+  for deployments with several worker processes that must see the same
+  invalidations.
+
+Keys are tuples (e.g. (user_id, year)); values must be JSON-serialisable.
+
+delete() also bumps a per-key version. A reader that computes a value from
+the database takes version(key) before its queries and passes it to set();
+the value is dropped if the key was invalidated meanwhile, so a writer that
+commits and then deletes cannot have its change overwritten by an older read.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._versions = {}  # key -> number of deletes
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                self._stats.evictions += 1
+                entry = None
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry[1]
+
+    def version(self, key):
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def set(self, key, value, version=None):
+        with self._lock:
+            if version is not None and self._versions.get(key, 0) != version:
+                return
+            self._entries[key] = (self._clock() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            if self._entries.pop(key, None) is not None:
+                self._stats.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._stats.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats.as_dict(), backend='lru', size=len(self._entries), maxsize=self.maxsize)
+
+
+class RedisCache:
+    def __init__(self, client, prefix='turni:cache:', ttl=3600):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    def _key(self, key):
+        return self.prefix + ':'.join(str(part) for part in key)
+
+    def _version_key(self, key):
+        # Outside the prefix so clear() leaves the versions alone
+        return self.prefix.rstrip(':') + '-version:' + ':'.join(str(part) for part in key)
+
+    def version(self, key):
+        return int(self.client.get(self._version_key(key)) or 0)
+
+    def get(self, key):
+        raw = self.client.get(self._key(key))
+        with self._lock:
+            if raw is None:
+                self._stats.misses += 1
+                return None
+            self._stats.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, version=None):
+        self.client.set(self._key(key), json.dumps(value), ex=self.ttl)
+        # Checked after the write: a delete() either bumped the version before
+        # this read, or runs after it and removes the value itself.
+        if version is not None and self.version(key) != version:
+            self.client.delete(self._key(key))
+
+    def delete(self, key):
+        version_key = self._version_key(key)
+        self.client.incr(version_key)
+        self.client.expire(version_key, self.ttl)
+        deleted = self.client.delete(self._key(key))
+        with self._lock:
+            self._stats.invalidations += deleted
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + '*'))
+        deleted = self.client.delete(*keys) if keys else 0
+        with self._lock:
+            self._stats.invalidations += deleted
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats.as_dict(), backend='redis')
+
+
+def make_cache(url=None, maxsize=1024, ttl=3600, prefix='turni:cache:'):
+    """Return a RedisCache when url is a redis:// URL, else an in-process LRUCache."""
+    if url:
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('A Redis cache URL is configured but the redis package is not installed')
+        return RedisCache(redis.Redis.from_url(url), prefix=prefix, ttl=ttl)
+    return LRUCache(maxsize=maxsize, ttl=ttl)
@@ -0,0 +1,85 @@
+"""Shift conflict detection over per-user sorted interval indexes.
+
+ConflictChecker is loaded with the existing shifts and approved vacations
+that surround the shifts to validate (one indexed range query each), then
+answers check() with a couple of bisects and a short scan. Each check is
+independent of how many shifts a user has, so a whole roster validates in
+one pass; adding each accepted shift back to the index also catches
+conflicts inside the roster itself.
+"""
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+# Longest possible shift, see shift_interval(). Bounds how far back an
+# overlapping or too-close shift can start.
+MAX_SHIFT_LENGTH = timedelta(hours=24)
+
+
+def shift_interval(shift_date, start_time, end_time):
+    """Half-open [start, end) datetimes of a shift; an end at or before the start is on the next day."""
+    start = datetime.combine(shift_date, start_time)
+    end = datetime.combine(shift_date, end_time)
+    if end <= start:
+        end += timedelta(days=1)
+    return start, end
+
+
+class ConflictChecker:
+    """Overlaps, minimum rest and approved vacations for new shifts.
+
+    The minimum rest applies between shifts of different roster days only,
+    so a split shift (08:00-12:00 and 15:00-19:00 on one day) is allowed.
+    A min_rest of zero turns the rest rule off.
+    """
+
+    def __init__(self, min_rest=timedelta(hours=11)):
+        self.min_rest = min_rest
+        self._shifts = {}     # user_id -> (starts, [(end, roster day, ref), ...]) sorted by start
+        self._vacations = {}  # user_id -> (starts, ends) of merged approved date ranges
+
+    def add_shift(self, user_id, start, end, ref=None, day=None):
+        """Index a shift of roster day day (default: its start date); ref is a dict identifying it in reported conflicts."""
+        starts, entries = self._shifts.setdefault(user_id, ([], []))
+        index = bisect_right(starts, start)
+        starts.insert(index, start)
+        entries.insert(index, (end, day or start.date(), ref or {}))
+
+    def set_vacations(self, user_id, ranges):
+        """Index a user's approved vacations as inclusive (start_date, end_date) pairs."""
+        merged = []
+        for start_date, end_date in sorted(ranges):
+            if merged and start_date <= merged[-1][1] + timedelta(days=1):
+                merged[-1][1] = max(merged[-1][1], end_date)
+            else:
+                merged.append([start_date, end_date])
+        self._vacations[user_id] = ([start for start, _ in merged], [end for _, end in merged])
+
+    def check(self, user_id, start, end, day=None):
+        """Return the conflicts of a [start, end) shift of roster day day (default: its start date), [] if none."""
+        conflicts = []
+        day = day or start.date()
+
+        starts, entries = self._shifts.get(user_id, ((), ()))
+        lo = bisect_left(starts, start - MAX_SHIFT_LENGTH - self.min_rest)
+        hi = bisect_left(starts, end + self.min_rest)
+        for other_start, (other_end, other_day, ref) in zip(starts[lo:hi], entries[lo:hi]):
+            if other_start < end and other_end > start:
+                conflicts.append(dict(ref, type='overlap', start=other_start.isoformat(), end=other_end.isoformat()))
+                continue
+            if other_day == day:
+                continue
+            rest = start - other_end if other_end <= start else other_start - end
+            if rest < self.min_rest:
+                conflicts.append(dict(ref, type='rest', start=other_start.isoformat(), end=other_end.isoformat(),
+                                      rest_hours=round(rest.total_seconds() / 3600, 2)))
+
+        vacation_starts, vacation_ends = self._vacations.get(user_id, ((), ()))
+        first_day = start.date()
+        last_day = (end - timedelta(microseconds=1)).date()
+        # Merged ranges are disjoint, so only the last one starting by last_day can overlap
+        index = bisect_right(vacation_starts, last_day) - 1
+        if index >= 0 and vacation_ends[index] >= first_day:
+            conflicts.append({'type': 'vacation', 'start_date': vacation_starts[index].isoformat(),
+                              'end_date': vacation_ends[index].isoformat()})
+
+        return conflicts
@@ -0,0 +1,90 @@
+"""Record parsing for bulk time entry imports (CSV or NDJSON badge exports).
+
+Records are read lazily from a text stream, so a file of any size is
+processed in constant memory; app.import_time_entries() takes them a chunk
+at a time and writes each chunk in one transaction.
+"""
+import csv
+import itertools
+import json
+from datetime import date, datetime
+
+try:
+    import orjson # optional: faster NDJSON decoding
+except ImportError:
+    orjson = None
+
+FORMATS = ('csv', 'ndjson')
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+def read_records(stream, fmt):
+    """Yield one dict per record of a CSV (header row first) or NDJSON text stream.
+
+    An NDJSON line that does not decode is yielded as its raw text, so it is
+    rejected by parse_time_entry() like any other bad record instead of
+    aborting the import.
+    """
+    if fmt == 'csv':
+        reader = csv.reader(stream)
+        header = [name.strip() for name in next(reader, [])]
+        for row in reader:
+            if row:
+                yield dict(zip(header, row))
+    elif fmt == 'ndjson':
+        loads = orjson.loads if orjson else json.loads
+        for line in stream:
+            if line.strip():
+                try:
+                    yield loads(line)
+                except ValueError:
+                    yield line
+    else:
+        raise ValueError(f'Unknown format {fmt!r}, expected one of {", ".join(FORMATS)}')
+
+
+def parse_time_entry(record, user_ids, user_ids_by_name):
+    """Return a time_entry row for a record or raise InvalidRecord.
+
+    A record names its user by user_id or username and carries ISO 8601
+    local clock_in_time and clock_out_time; date defaults to the clock-in day.
+    Users are looked up in the caller's cached id set and username map.
+    """
+    if not isinstance(record, dict):
+        raise InvalidRecord('Malformed record')
+
+    user_id = record.get('user_id')
+    if user_id not in (None, ''):
+        try:
+            user_id = int(user_id)
+        except (TypeError, ValueError):
+            raise InvalidRecord('Invalid user_id')
+        if user_id not in user_ids:
+            raise InvalidRecord('User not found')
+    else:
+        user_id = user_ids_by_name.get(record.get('username'))
+        if user_id is None:
+            raise InvalidRecord('User not found')
+
+    try:
+        clock_in_time = datetime.fromisoformat(record['clock_in_time'])
+        clock_out_time = datetime.fromisoformat(record['clock_out_time'])
+        entry_date = date.fromisoformat(record['date']) if record.get('date') else clock_in_time.date()
+    except (KeyError, TypeError, ValueError):
+        raise InvalidRecord('Missing or invalid clock_in_time, clock_out_time or date')
+    if clock_in_time.tzinfo or clock_out_time.tzinfo:
+        raise InvalidRecord('Times must be local, without a UTC offset')
+    if clock_out_time < clock_in_time:
+        raise InvalidRecord('clock_out_time is before clock_in_time')
+
+    return {'user_id': user_id, 'date': entry_date, 'clock_in_time': clock_in_time, 'clock_out_time': clock_out_time}
+
+
+def chunks(iterable, size):
+    """Yield lists of up to size items."""
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
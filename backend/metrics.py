@@ -0,0 +1,126 @@
+"""Per-endpoint request metrics rendered in the Prometheus text format.
+
+RequestMetrics aggregates, per endpoint and method, a latency histogram, a
+histogram of SQL statements per request (an N+1 loop shows up as requests
+in the high buckets) and the total SQL time, plus request counts by status.
+
+Each worker process keeps its own registry, so with several workers a
+scrape only sees the worker that answered it; scrape each worker, or run
+one worker per scrape target.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        """[(le, cumulative count)] with le as Prometheus writes it."""
+        cumulative = 0
+        samples = []
+        for bound, count in zip([*map(str, self.buckets), '+Inf'], self.counts):
+            cumulative += count
+            samples.append((bound, cumulative))
+        return samples
+
+
+class EndpointStats:
+    def __init__(self, latency_buckets, statement_buckets):
+        self.latency = Histogram(latency_buckets)
+        self.sql_statements = Histogram(statement_buckets)
+        self.sql_seconds = 0.0
+
+
+class RequestMetrics:
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, statement_buckets=SQL_STATEMENT_BUCKETS, prefix='worktime'):
+        self.latency_buckets = latency_buckets
+        self.statement_buckets = statement_buckets
+        self.prefix = prefix
+        self._endpoints = {}  # (endpoint, method) -> EndpointStats
+        self._responses = {}  # (endpoint, method, status) -> count
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, method, status, seconds, sql_statements, sql_seconds):
+        with self._lock:
+            stats = self._endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self._endpoints[(endpoint, method)] = EndpointStats(self.latency_buckets, self.statement_buckets)
+            stats.latency.observe(seconds)
+            stats.sql_statements.observe(sql_statements)
+            stats.sql_seconds += sql_seconds
+            key = (endpoint, method, status)
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def render(self, caches=None):
+        """The registry as Prometheus text; caches is {name: cache.stats()}."""
+        p = self.prefix
+        lines = []
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            responses = sorted(self._responses.items())
+
+            lines += metric_header(f'{p}_http_requests_total', 'counter', 'Requests answered, by endpoint, method and status.')
+            for (endpoint, method, status), count in responses:
+                lines.append(sample(f'{p}_http_requests_total', {'endpoint': endpoint, 'method': method, 'status': status}, count))
+
+            lines += metric_header(f'{p}_http_request_duration_seconds', 'histogram',
+                                   'Time from the start of the request until the response is returned.')
+            for (endpoint, method), stats in endpoints:
+                lines += histogram_samples(f'{p}_http_request_duration_seconds', {'endpoint': endpoint, 'method': method}, stats.latency)
+
+            lines += metric_header(f'{p}_sql_statements_per_request', 'histogram', 'SQL statements executed per request.')
+            for (endpoint, method), stats in endpoints:
+                lines += histogram_samples(f'{p}_sql_statements_per_request', {'endpoint': endpoint, 'method': method}, stats.sql_statements)
+
+            lines += metric_header(f'{p}_sql_seconds_total', 'counter', 'Time spent executing SQL statements in requests.')
+            for (endpoint, method), stats in endpoints:
+                lines.append(sample(f'{p}_sql_seconds_total', {'endpoint': endpoint, 'method': method}, stats.sql_seconds))
+
+        for field, kind, help_text in CACHE_FIELDS:
+            values = [(name, stats[field]) for name, stats in sorted((caches or {}).items()) if stats.get(field) is not None]
+            if values:
+                metric = f'{p}_cache_{field}_total' if kind == 'counter' else f'{p}_cache_{field}'
+                lines += metric_header(metric, kind, help_text)
+                lines += [sample(metric, {'cache': name}, value) for name, value in values]
+        return '\n'.join(lines) + '\n'
+
+
+# (cache.stats() key, metric type, help) exported for each cache
+CACHE_FIELDS = [
+    ('hits', 'counter', 'Cache lookups that found an entry.'),
+    ('misses', 'counter', 'Cache lookups that found nothing.'),
+    ('evictions', 'counter', 'Entries dropped for size or age.'),
+    ('invalidations', 'counter', 'Entries removed because their data changed.'),
+    ('size', 'gauge', 'Entries currently held.'),
+]
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def metric_header(name, kind, help_text):
+    return [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+
+
+def sample(name, labels, value):
+    label_text = ','.join(f'{key}="{escape_label(label)}"' for key, label in labels.items())
+    return f'{name}{{{label_text}}} {value}'
+
+
+def histogram_samples(name, labels, histogram):
+    lines = [sample(f'{name}_bucket', dict(labels, le=bound), count) for bound, count in histogram.samples()]
+    lines.append(sample(f'{name}_sum', labels, histogram.sum))
+    lines.append(sample(f'{name}_count', labels, sum(histogram.counts)))
+    return lines
@@ -97,6 +97,14 @@ def run_migrations_online():
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # SQLite batch migrations rebuild a table by copy, drop and rename; with
+        # the app's foreign_keys=ON the drop fails for any referenced table
+        # (e.g. user) that has rows. The pragma only applies outside a transaction.
+        sqlite = connection.dialect.name == 'sqlite'
+        if sqlite:
+            connection.exec_driver_sql('PRAGMA foreign_keys=OFF')
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -106,6 +114,10 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+        if sqlite:
+            connection.exec_driver_sql('PRAGMA foreign_keys=ON')
+            connection.commit()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
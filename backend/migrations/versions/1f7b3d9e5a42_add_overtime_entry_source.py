@@ -0,0 +1,32 @@
+"""Add overtime_entry.source to tell derived overtime from manual entries.
+
+Revision ID: 1f7b3d9e5a42
+Revises: 6d2a8f4c1e39
+Create Date: 2026-10-17 23:40:12.604381
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1f7b3d9e5a42'
+down_revision = '6d2a8f4c1e39'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('overtime_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('source', sa.String(length=20), server_default='manual', nullable=False))
+        batch_op.create_index('uq_overtime_entry_user_id_date_derived', ['user_id', 'date'], unique=True,
+                              sqlite_where=sa.text("source = 'derived'"),
+                              postgresql_where=sa.text("source = 'derived'"))
+
+
+def downgrade():
+    with op.batch_alter_table('overtime_entry', schema=None) as batch_op:
+        batch_op.drop_index('uq_overtime_entry_user_id_date_derived',
+                            sqlite_where=sa.text("source = 'derived'"),
+                            postgresql_where=sa.text("source = 'derived'"))
+        batch_op.drop_column('source')
@@ -0,0 +1,26 @@
+"""Add (user_id, status, end_date) index for vacation request history views.
+
+Revision ID: 2e7f4a9c1b58
+Revises: 9d5b3e8f2a61
+Create Date: 2026-10-17 14:26:05.771358
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2e7f4a9c1b58'
+down_revision = '9d5b3e8f2a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vacation_request', schema=None) as batch_op:
+        batch_op.create_index('ix_vacation_request_user_id_status_end_date', ['user_id', 'status', 'end_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('vacation_request', schema=None) as batch_op:
+        batch_op.drop_index('ix_vacation_request_user_id_status_end_date')
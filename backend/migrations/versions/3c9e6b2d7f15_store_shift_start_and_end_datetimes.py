@@ -0,0 +1,152 @@
+"""Store shifts as start_at/end_at datetimes instead of start/end times.
+
+A shift whose end time is at or before its start time ends on the next day,
+so existing rows are backfilled that way. Monthly hours now split entries at
+midnight on month boundaries, so monthly_hours_rollup is recomputed too.
+
+Revision ID: 3c9e6b2d7f15
+Revises: 8f4a1c6e2d93
+Create Date: 2026-10-17 21:14:05.902417
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c9e6b2d7f15'
+down_revision = '8f4a1c6e2d93'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def _copy_in_batches(select, update, convert):
+    connection = op.get_bind()
+    rows = connection.execute(select)
+    while True:
+        batch = rows.fetchmany(BATCH_SIZE)
+        if not batch:
+            break
+        connection.execute(update, [convert(row) for row in batch])
+
+
+def _duration_microseconds(dialect_name):
+    # Same SQL as app.duration_microseconds; migrations do not import the app.
+    if dialect_name == 'sqlite':
+        return sa.literal_column(
+            "((CAST(strftime('%s', clock_out_time) AS INTEGER) - CAST(strftime('%s', clock_in_time) AS INTEGER)) * 1000000"
+            " + CAST(substr(clock_out_time, 21, 6) AS INTEGER) - CAST(substr(clock_in_time, 21, 6) AS INTEGER))",
+            sa.BigInteger)
+    return sa.literal_column('CAST(EXTRACT(EPOCH FROM (clock_out_time - clock_in_time)) * 1000000 AS BIGINT)', sa.BigInteger)
+
+
+def _rebuild_hours_rollup():
+    # Entries within one month are summed in SQL; the few crossing midnight
+    # into the next month are split in Python and merged in afterwards.
+    connection = op.get_bind()
+    time_entry = sa.table('time_entry', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                          sa.column('clock_in_time', sa.DateTime), sa.column('clock_out_time', sa.DateTime))
+    rollup = sa.table('monthly_hours_rollup', sa.column('user_id', sa.Integer), sa.column('year', sa.Integer),
+                      sa.column('month', sa.Integer), sa.column('worked_microseconds', sa.BigInteger),
+                      sa.column('entry_count', sa.Integer))
+    year = sa.extract('year', time_entry.c.clock_in_time)
+    month = sa.extract('month', time_entry.c.clock_in_time)
+    same_month = sa.and_(year == sa.extract('year', time_entry.c.clock_out_time),
+                         month == sa.extract('month', time_entry.c.clock_out_time))
+
+    connection.execute(rollup.delete())
+    connection.execute(rollup.insert().from_select(
+        ['user_id', 'year', 'month', 'worked_microseconds', 'entry_count'],
+        sa.select(time_entry.c.user_id, year, month, sa.func.sum(_duration_microseconds(connection.dialect.name)),
+                  sa.func.count(time_entry.c.id))
+        .where(time_entry.c.clock_out_time.isnot(None), same_month)
+        .group_by(time_entry.c.user_id, year, month)
+    ))
+
+    parts = {}
+    crossing = sa.select(time_entry.c.user_id, time_entry.c.clock_in_time, time_entry.c.clock_out_time).where(
+        time_entry.c.clock_out_time.isnot(None), sa.not_(same_month))
+    for user_id, start, end in connection.execute(crossing):
+        while start < end:
+            part_end = min(end, datetime(start.year + start.month // 12, start.month % 12 + 1, 1))
+            totals = parts.setdefault((user_id, start.year, start.month), [0, 0])
+            totals[0] += (part_end - start) // timedelta(microseconds=1)
+            totals[1] += 1
+            start = part_end
+    if not parts:
+        return
+    existing = set(connection.execute(sa.select(rollup.c.user_id, rollup.c.year, rollup.c.month)).all())
+    updates = [{'key_user_id': user_id, 'key_year': year_, 'key_month': month_, 'add_microseconds': us, 'add_count': n}
+               for (user_id, year_, month_), (us, n) in parts.items() if (user_id, year_, month_) in existing]
+    inserts = [{'user_id': user_id, 'year': year_, 'month': month_, 'worked_microseconds': us, 'entry_count': n}
+               for (user_id, year_, month_), (us, n) in parts.items() if (user_id, year_, month_) not in existing]
+    if updates:
+        connection.execute(rollup.update().where(
+            rollup.c.user_id == sa.bindparam('key_user_id'), rollup.c.year == sa.bindparam('key_year'),
+            rollup.c.month == sa.bindparam('key_month')
+        ).values(
+            worked_microseconds=rollup.c.worked_microseconds + sa.bindparam('add_microseconds'),
+            entry_count=rollup.c.entry_count + sa.bindparam('add_count')
+        ), updates)
+    if inserts:
+        connection.execute(rollup.insert(), inserts)
+
+
+def upgrade():
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('start_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('end_at', sa.DateTime(), nullable=True))
+
+    shift = sa.table('shift', sa.column('id', sa.Integer), sa.column('date', sa.Date),
+                     sa.column('start_time', sa.Time), sa.column('end_time', sa.Time),
+                     sa.column('start_at', sa.DateTime), sa.column('end_at', sa.DateTime))
+
+    def convert(row):
+        start_at = datetime.combine(row.date, row.start_time)
+        end_at = datetime.combine(row.date, row.end_time)
+        if end_at <= start_at:
+            end_at += timedelta(days=1)
+        return {'shift_id': row.id, 'start_at': start_at, 'end_at': end_at}
+
+    _copy_in_batches(
+        sa.select(shift.c.id, shift.c.date, shift.c.start_time, shift.c.end_time),
+        shift.update().where(shift.c.id == sa.bindparam('shift_id')).values(
+            start_at=sa.bindparam('start_at'), end_at=sa.bindparam('end_at')),
+        convert
+    )
+
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.alter_column('start_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('end_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_check_constraint('ck_shift_end_after_start', 'end_at > start_at')
+        batch_op.drop_column('start_time')
+        batch_op.drop_column('end_time')
+
+    _rebuild_hours_rollup()
+
+
+def downgrade():
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('start_time', sa.Time(), nullable=True))
+        batch_op.add_column(sa.Column('end_time', sa.Time(), nullable=True))
+
+    shift = sa.table('shift', sa.column('id', sa.Integer), sa.column('start_at', sa.DateTime),
+                     sa.column('end_at', sa.DateTime), sa.column('start_time', sa.Time),
+                     sa.column('end_time', sa.Time))
+    _copy_in_batches(
+        sa.select(shift.c.id, shift.c.start_at, shift.c.end_at),
+        shift.update().where(shift.c.id == sa.bindparam('shift_id')).values(
+            start_time=sa.bindparam('start_time'), end_time=sa.bindparam('end_time')),
+        lambda row: {'shift_id': row.id, 'start_time': row.start_at.time(), 'end_time': row.end_at.time()}
+    )
+
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.drop_constraint('ck_shift_end_after_start', type_='check')
+        batch_op.alter_column('start_time', existing_type=sa.Time(), nullable=False)
+        batch_op.alter_column('end_time', existing_type=sa.Time(), nullable=False)
+        batch_op.drop_column('start_at')
+        batch_op.drop_column('end_at')
@@ -0,0 +1,44 @@
+"""Add composite indexes for per-user date filters.
+
+Revision ID: 4c1e7a2d9f3b
+Revises: b69de53c513f
+Create Date: 2026-10-17 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c1e7a2d9f3b'
+down_revision = 'b69de53c513f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.create_index('ix_shift_user_id_date', ['user_id', 'date'], unique=False)
+
+    with op.batch_alter_table('time_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_time_entry_user_id_date', ['user_id', 'date'], unique=False)
+
+    with op.batch_alter_table('overtime_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_overtime_entry_user_id_date', ['user_id', 'date'], unique=False)
+
+    with op.batch_alter_table('vacation_request', schema=None) as batch_op:
+        batch_op.create_index('ix_vacation_request_user_id_status_start_date', ['user_id', 'status', 'start_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('vacation_request', schema=None) as batch_op:
+        batch_op.drop_index('ix_vacation_request_user_id_status_start_date')
+
+    with op.batch_alter_table('overtime_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_overtime_entry_user_id_date')
+
+    with op.batch_alter_table('time_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_entry_user_id_date')
+
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.drop_index('ix_shift_user_id_date')
@@ -0,0 +1,31 @@
+"""Add location_closure table.
+
+Revision ID: 4e8c2a6f9b17
+Revises: 8b5e1c7d3f60
+Create Date: 2026-10-18 09:14:52.603318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8c2a6f9b17'
+down_revision = '8b5e1c7d3f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('location_closure',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('location', sa.String(length=100), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('location', 'date', name='uq_location_closure_location_date')
+    )
+
+
+def downgrade():
+    op.drop_table('location_closure')
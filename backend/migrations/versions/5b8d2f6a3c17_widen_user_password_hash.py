@@ -0,0 +1,32 @@
+"""Widen user.password_hash to fit scrypt and tuned pbkdf2 hashes.
+
+Revision ID: 5b8d2f6a3c17
+Revises: 7a3c5e1f8b24
+Create Date: 2026-10-17 17:02:41.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8d2f6a3c17'
+down_revision = '7a3c5e1f8b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=120),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('password_hash',
+               existing_type=sa.String(length=255),
+               type_=sa.String(length=120),
+               existing_nullable=False)
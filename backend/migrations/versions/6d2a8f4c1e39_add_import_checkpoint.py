@@ -0,0 +1,31 @@
+"""Add import_checkpoint table for resumable time entry imports.
+
+Revision ID: 6d2a8f4c1e39
+Revises: 3c9e6b2d7f15
+Create Date: 2026-10-17 22:31:48.117264
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d2a8f4c1e39'
+down_revision = '3c9e6b2d7f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('import_checkpoint',
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('records_done', sa.Integer(), nullable=False),
+    sa.Column('imported', sa.Integer(), nullable=False),
+    sa.Column('rejected', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('import_checkpoint')
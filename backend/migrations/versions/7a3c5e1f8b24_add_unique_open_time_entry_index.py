@@ -0,0 +1,38 @@
+"""Allow at most one open time entry per user.
+
+Older duplicate open entries (possible before this constraint) are closed at
+their own clock-in time, i.e. with zero duration, so the index can be built.
+
+Revision ID: 7a3c5e1f8b24
+Revises: 2e7f4a9c1b58
+Create Date: 2026-10-17 15:48:19.204576
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3c5e1f8b24'
+down_revision = '2e7f4a9c1b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "UPDATE time_entry SET clock_out_time = clock_in_time "
+        "WHERE clock_out_time IS NULL AND id NOT IN ("
+        "SELECT max(id) FROM time_entry WHERE clock_out_time IS NULL GROUP BY user_id)"
+    )
+    with op.batch_alter_table('time_entry', schema=None) as batch_op:
+        batch_op.create_index('uq_time_entry_user_id_open', ['user_id'], unique=True,
+                              sqlite_where=sa.text('clock_out_time IS NULL'),
+                              postgresql_where=sa.text('clock_out_time IS NULL'))
+
+
+def downgrade():
+    with op.batch_alter_table('time_entry', schema=None) as batch_op:
+        batch_op.drop_index('uq_time_entry_user_id_open',
+                            sqlite_where=sa.text('clock_out_time IS NULL'),
+                            postgresql_where=sa.text('clock_out_time IS NULL'))
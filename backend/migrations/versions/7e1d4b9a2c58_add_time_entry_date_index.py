@@ -0,0 +1,26 @@
+"""Add a (date) index on time_entry for team-wide date range queries.
+
+Revision ID: 7e1d4b9a2c58
+Revises: c2d8e4a7f153
+Create Date: 2026-10-18 11:02:37.184406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7e1d4b9a2c58'
+down_revision = 'c2d8e4a7f153'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('time_entry', schema=None) as batch_op:
+        batch_op.create_index('ix_time_entry_date', ['date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('time_entry', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_entry_date')
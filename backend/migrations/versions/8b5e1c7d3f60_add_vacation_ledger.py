@@ -0,0 +1,95 @@
+"""Add vacation_ledger table, backfilled from vacation_request.
+
+Revision ID: 8b5e1c7d3f60
+Revises: 1f7b3d9e5a42
+Create Date: 2026-10-18 00:52:37.281950
+
+"""
+import os
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5e1c7d3f60'
+down_revision = '1f7b3d9e5a42'
+branch_labels = None
+depends_on = None
+
+# The national holidays and the VACATION_DAYS_PER_YEAR default as of this
+# revision, copied rather than imported so later calendar or config changes
+# do not alter what it writes (c2d8e4a7f153 recounts for San Francesco).
+FIXED_HOLIDAYS = [(1, 1), (1, 6), (4, 25), (5, 1), (6, 2), (8, 15), (11, 1), (12, 8), (12, 25), (12, 26)]
+ACCRUED_DAYS = float(os.environ.get('VACATION_DAYS_PER_YEAR', 20))
+
+
+def easter_sunday(year):
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(year):
+    easter = easter_sunday(year)
+    return {date(year, month, day) for month, day in FIXED_HOLIDAYS} | {easter, easter + timedelta(days=1)}
+
+
+def working_days_by_year(start, end):
+    """{year: Monday to Friday days that are not national holidays} in [start, end]."""
+    counts = {}
+    holidays = {}
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            if day.year not in holidays:
+                holidays[day.year] = national_holidays(day.year)
+            if day not in holidays[day.year]:
+                counts[day.year] = counts.get(day.year, 0) + 1
+        day += timedelta(days=1)
+    return counts
+
+
+def upgrade():
+    op.create_table('vacation_ledger',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('accrued_days', sa.Float(), nullable=False),
+    sa.Column('used_days', sa.Integer(), nullable=False),
+    sa.Column('pending_days', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'year')
+    )
+
+    # The same rows as app.vacation_ledger_rows() at this revision: working
+    # days need the holiday calendar, so requests are counted in Python.
+    connection = op.get_bind()
+    vacation_request = sa.table('vacation_request', sa.column('user_id', sa.Integer), sa.column('start_date', sa.Date),
+                                sa.column('end_date', sa.Date), sa.column('status', sa.String))
+    ledger = sa.table('vacation_ledger', sa.column('user_id', sa.Integer), sa.column('year', sa.Integer),
+                      sa.column('accrued_days', sa.Float), sa.column('used_days', sa.Integer),
+                      sa.column('pending_days', sa.Integer))
+    totals = {}
+    for user_id, start_date, end_date, status in connection.execute(
+            sa.select(vacation_request.c.user_id, vacation_request.c.start_date, vacation_request.c.end_date,
+                      vacation_request.c.status).where(vacation_request.c.status.in_(('approved', 'pending')))):
+        for year, days in working_days_by_year(start_date, end_date).items():
+            used_and_pending = totals.setdefault((user_id, year), [0, 0])
+            used_and_pending[0 if status == 'approved' else 1] += days
+    if totals:
+        connection.execute(ledger.insert(), [
+            {'user_id': user_id, 'year': year, 'accrued_days': ACCRUED_DAYS, 'used_days': used, 'pending_days': pending}
+            for (user_id, year), (used, pending) in totals.items()
+        ])
+
+
+def downgrade():
+    op.drop_table('vacation_ledger')
@@ -0,0 +1,26 @@
+"""Add a (date) index on shift for team-wide date range queries.
+
+Revision ID: 8f4a1c6e2d93
+Revises: 5b8d2f6a3c17
+Create Date: 2026-10-17 18:20:13.540917
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f4a1c6e2d93'
+down_revision = '5b8d2f6a3c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.create_index('ix_shift_date', ['date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('shift', schema=None) as batch_op:
+        batch_op.drop_index('ix_shift_date')
@@ -0,0 +1,59 @@
+"""Add monthly_hours_rollup table, backfilled from time_entry.
+
+Revision ID: 9d5b3e8f2a61
+Revises: 4c1e7a2d9f3b
+Create Date: 2026-10-17 11:03:27.540912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d5b3e8f2a61'
+down_revision = '4c1e7a2d9f3b'
+branch_labels = None
+depends_on = None
+
+
+def _duration_microseconds(dialect_name):
+    # Same SQL as app.duration_microseconds; migrations do not import the app.
+    if dialect_name == 'sqlite':
+        return sa.literal_column(
+            "((CAST(strftime('%s', clock_out_time) AS INTEGER) - CAST(strftime('%s', clock_in_time) AS INTEGER)) * 1000000"
+            " + CAST(substr(clock_out_time, 21, 6) AS INTEGER) - CAST(substr(clock_in_time, 21, 6) AS INTEGER))",
+            sa.BigInteger)
+    return sa.literal_column('CAST(EXTRACT(EPOCH FROM (clock_out_time - clock_in_time)) * 1000000 AS BIGINT)', sa.BigInteger)
+
+
+def upgrade():
+    op.create_table('monthly_hours_rollup',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('year', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('month', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('worked_microseconds', sa.BigInteger(), nullable=False),
+    sa.Column('entry_count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'year', 'month')
+    )
+
+    time_entry = sa.table('time_entry', sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+                          sa.column('date', sa.Date), sa.column('clock_in_time', sa.DateTime),
+                          sa.column('clock_out_time', sa.DateTime))
+    rollup = sa.table('monthly_hours_rollup', sa.column('user_id', sa.Integer), sa.column('year', sa.Integer),
+                      sa.column('month', sa.Integer), sa.column('worked_microseconds', sa.BigInteger),
+                      sa.column('entry_count', sa.Integer))
+    year = sa.extract('year', time_entry.c.date)
+    month = sa.extract('month', time_entry.c.date)
+    connection = op.get_bind()
+    connection.execute(rollup.insert().from_select(
+        ['user_id', 'year', 'month', 'worked_microseconds', 'entry_count'],
+        sa.select(time_entry.c.user_id, year, month, sa.func.sum(_duration_microseconds(connection.dialect.name)),
+                  sa.func.count(time_entry.c.id))
+        .where(time_entry.c.clock_out_time.isnot(None))
+        .group_by(time_entry.c.user_id, year, month)
+    ))
+
+
+def downgrade():
+    op.drop_table('monthly_hours_rollup')
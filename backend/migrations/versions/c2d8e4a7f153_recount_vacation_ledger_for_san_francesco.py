@@ -0,0 +1,99 @@
+"""Recount vacation_ledger from 2026, when 4 October became a national holiday.
+
+Revision ID: c2d8e4a7f153
+Revises: 4e8c2a6f9b17
+Create Date: 2026-10-18 11:42:09.118274
+
+"""
+import os
+from datetime import date, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d8e4a7f153'
+down_revision = '4e8c2a6f9b17'
+branch_labels = None
+depends_on = None
+
+FIRST_YEAR = 2026
+
+# The national holidays and the VACATION_DAYS_PER_YEAR default as of this
+# revision, copied rather than imported so later calendar or config changes
+# do not alter what it writes. San Francesco applies from FIRST_YEAR on.
+FIXED_HOLIDAYS = [(1, 1), (1, 6), (4, 25), (5, 1), (6, 2), (8, 15), (11, 1), (12, 8), (12, 25), (12, 26)]
+SAN_FRANCESCO = (10, 4)
+ACCRUED_DAYS = float(os.environ.get('VACATION_DAYS_PER_YEAR', 20))
+
+
+def easter_sunday(year):
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def national_holidays(year, san_francesco):
+    easter = easter_sunday(year)
+    fixed = FIXED_HOLIDAYS + [SAN_FRANCESCO] if san_francesco and year >= FIRST_YEAR else FIXED_HOLIDAYS
+    return {date(year, month, day) for month, day in fixed} | {easter, easter + timedelta(days=1)}
+
+
+def working_days_by_year(start, end, san_francesco):
+    """{year: Monday to Friday days that are not national holidays} in [start, end]."""
+    counts = {}
+    holidays = {}
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            if day.year not in holidays:
+                holidays[day.year] = national_holidays(day.year, san_francesco)
+            if day not in holidays[day.year]:
+                counts[day.year] = counts.get(day.year, 0) + 1
+        day += timedelta(days=1)
+    return counts
+
+
+def recount_from_first_year(san_francesco):
+    """Rewrite the ledger rows of FIRST_YEAR on, the same way as app.vacation_ledger_rows()."""
+    connection = op.get_bind()
+    vacation_request = sa.table('vacation_request', sa.column('user_id', sa.Integer), sa.column('start_date', sa.Date),
+                                sa.column('end_date', sa.Date), sa.column('status', sa.String))
+    ledger = sa.table('vacation_ledger', sa.column('user_id', sa.Integer), sa.column('year', sa.Integer),
+                      sa.column('accrued_days', sa.Float), sa.column('used_days', sa.Integer),
+                      sa.column('pending_days', sa.Integer))
+    totals = {}
+    for user_id, start_date, end_date, status in connection.execute(
+            sa.select(vacation_request.c.user_id, vacation_request.c.start_date, vacation_request.c.end_date,
+                      vacation_request.c.status)
+            .where(vacation_request.c.status.in_(('approved', 'pending')),
+                   vacation_request.c.end_date >= date(FIRST_YEAR, 1, 1))):
+        for year, days in working_days_by_year(max(start_date, date(FIRST_YEAR, 1, 1)), end_date, san_francesco).items():
+            used_and_pending = totals.setdefault((user_id, year), [0, 0])
+            used_and_pending[0 if status == 'approved' else 1] += days
+
+    connection.execute(ledger.delete().where(ledger.c.year >= FIRST_YEAR))
+    if totals:
+        connection.execute(ledger.insert(), [
+            {'user_id': user_id, 'year': year, 'accrued_days': ACCRUED_DAYS, 'used_days': used, 'pending_days': pending}
+            for (user_id, year), (used, pending) in totals.items()
+        ])
+
+
+def upgrade():
+    # Ledger rows are working-day counts; those of 2026 on were taken without
+    # San Francesco and are rebuilt from the requests with it.
+    recount_from_first_year(san_francesco=True)
+
+
+def downgrade():
+    # Back to the counts the previous revision's calendar gives
+    recount_from_first_year(san_francesco=False)
@@ -0,0 +1,24 @@
+"""Overtime derivation by merging worked and scheduled time per user and day.
+
+Both inputs are (user_id, day, microseconds) rows sorted by (user_id, day),
+as produced by one GROUP BY ... ORDER BY query each, so a whole month for a
+large team is compared in a single linear pass with no per-day lookups.
+"""
+
+
+def daily_overtime(worked, scheduled, min_overtime=0):
+    """Yield (user_id, day, microseconds) where worked time exceeds the schedule.
+
+    A day without shifts counts as zero scheduled time. Only excesses larger
+    than min_overtime microseconds are reported.
+    """
+    scheduled = iter(scheduled)
+    planned = next(scheduled, None)
+    for user_id, day, worked_microseconds in worked:
+        key = (user_id, day)
+        while planned is not None and (planned[0], planned[1]) < key:
+            planned = next(scheduled, None)
+        scheduled_microseconds = planned[2] if planned is not None and (planned[0], planned[1]) == key else 0
+        overtime = worked_microseconds - scheduled_microseconds
+        if overtime > min_overtime:
+            yield user_id, day, overtime
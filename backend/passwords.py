@@ -0,0 +1,56 @@
+"""Password hashing on a bounded worker pool.
+
+werkzeug's scrypt and pbkdf2 hashes spend tens of milliseconds in hashlib,
+which releases the GIL, so running them on a few dedicated threads keeps a
+burst of logins from occupying every core. The request thread still waits for
+its hash, so the pool also bounds how many request threads can be waiting:
+at most max_pending hashes are running or queued, and any further one is
+refused at once with PasswordHasherBusy. Keep max_pending below the server's
+request threads (create_app() derives it from REQUEST_THREADS) and the rest
+stay free for other endpoints during a login burst.
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    def __init__(self, method='scrypt', salt_length=16, workers=2, max_pending=4):
+        self.method = method
+        self.salt_length = salt_length
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @functools.cached_property
+    def method_prefix(self):
+        # werkzeug expands defaults into the stored prefix ('scrypt' is written
+        # as 'scrypt:32768:8:1'), so derive it once from a throwaway hash.
+        return generate_password_hash('', self.method, salt_length=1).split('$', 1)[0]
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy('Too many password hashes in progress')
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method, self.salt_length)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        """True when stored_hash was made with a different method or cost."""
+        return stored_hash.split('$', 1)[0] != self.method_prefix
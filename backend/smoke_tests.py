@@ -1,7 +1,71 @@
 import unittest
+import unittest.mock
+import csv
+import gzip
+import io
 import json
+import os
+import random
+import tempfile
+import threading
+from contextlib import contextmanager
 from datetime import datetime, date, time, timedelta
-from app import app, db, User, Shift, TimeEntry, VacationRequest, OvertimeEntry
+from sqlalchemy import event, text
+from app import create_app, db, User, Shift, TimeEntry, VacationRequest, OvertimeEntry, MonthlyHoursRollup, VacationLedger, ImportCheckpoint, LocationClosure, import_time_entries, rebuild_monthly_hours_rollup, report_cache, password_hasher, password_hash_max_pending
+from cache import LRUCache, RedisCache
+from conflicts import ConflictChecker, shift_interval
+from importer import InvalidRecord, parse_time_entry, read_records
+from metrics import RequestMetrics
+from overtime import daily_overtime
+from passwords import PasswordHasher, PasswordHasherBusy
+from tokens import InvalidToken, issue_token, verify_token
+from workcalendar import YearCalendar, day_type, easter_sunday, is_working_day, national_holidays, working_days_by_year
+from werkzeug.security import generate_password_hash
+
+# A throwaway database file (not :memory:, the concurrency tests use several
+# connections), so the suite neither needs nor touches instance/worktime.db.
+TEST_DB_FILE = os.path.join(tempfile.mkdtemp(prefix='turni-tests-'), 'test.db')
+app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{TEST_DB_FILE}', 'TESTING': True})
+with app.app_context():
+    db.create_all()
+
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement sent to the engine while the block runs."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def reference_annual_hours(entries, year):
+    """A straightforward in-Python annual report computation, kept as an oracle.
+
+    Time after midnight on the last day of a month belongs to the next month
+    (and year), so each entry is clipped to every month of the year in turn.
+    """
+    monthly_microseconds = {month: 0 for month in range(1, 13)}
+    for entry_date, clock_in_time, clock_out_time in entries:
+        if clock_out_time is None:
+            continue
+        for month in range(1, 13):
+            month_start = datetime(year, month, 1)
+            month_end = datetime(year + month // 12, month % 12 + 1, 1)
+            overlap = min(clock_out_time, month_end) - max(clock_in_time, month_start)
+            if overlap > timedelta(0):
+                monthly_microseconds[month] += overlap // timedelta(microseconds=1)
+    return {
+        'total_annual_hours': round(sum(monthly_microseconds.values()) / 3600_000_000, 2),
+        'monthly_breakdown': [{'month': m, 'total_hours': round(us / 3600_000_000, 2)} for m, us in monthly_microseconds.items()]
+    }
+
 
 class APISmokeTests(unittest.TestCase):
     test_user_id = None  # Class attribute to store the main test user's ID
@@ -20,6 +84,8 @@ class APISmokeTests(unittest.TestCase):
             TimeEntry.query.filter_by(user_id=existing_user.id).delete()
             VacationRequest.query.filter_by(user_id=existing_user.id).delete()
             OvertimeEntry.query.filter_by(user_id=existing_user.id).delete()
+            MonthlyHoursRollup.query.filter_by(user_id=existing_user.id).delete()
+            VacationLedger.query.filter_by(user_id=existing_user.id).delete()
             db.session.delete(existing_user)
             db.session.commit()
 
@@ -35,6 +101,16 @@ class APISmokeTests(unittest.TestCase):
             raise Exception("Main test user 'testuser_main' not found in DB after registration in setUpClass.")
         APISmokeTests.test_user_id = user.id
 
+        # The main user acts as a manager so tests can work on other users' records;
+        # every request from this client carries its token.
+        user.role = 'manager'
+        db.session.commit()
+        response = cls.client.post('/login',
+                                 data=json.dumps({'username': 'testuser_main', 'password': 'password_main'}),
+                                 content_type='application/json')
+        cls.auth_header = f"Bearer {json.loads(response.data)['token']}"
+        cls.client.environ_base['HTTP_AUTHORIZATION'] = cls.auth_header
+
     @classmethod
     def tearDownClass(cls):
         # Clean up the main test user
@@ -45,6 +121,8 @@ class APISmokeTests(unittest.TestCase):
                 TimeEntry.query.filter_by(user_id=user.id).delete()
                 VacationRequest.query.filter_by(user_id=user.id).delete()
                 OvertimeEntry.query.filter_by(user_id=user.id).delete()
+                MonthlyHoursRollup.query.filter_by(user_id=user.id).delete()
+                VacationLedger.query.filter_by(user_id=user.id).delete()
                 db.session.delete(user)
                 db.session.commit()
         cls.app_context.pop()
@@ -170,6 +248,1289 @@ class APISmokeTests(unittest.TestCase):
         self.assertIn('monthly_breakdown', report_data)
         self.assertEqual(len(report_data['monthly_breakdown']), 12)
 
+    def test_08_shifts_month_filter_boundaries(self):
+        print("\nRunning test_08_shifts_month_filter_boundaries...")
+        created_ids = {}
+        for shift_date in ['2023-11-30', '2023-12-01', '2023-12-31', '2024-01-01']:
+            shift_data = {
+                'user_id': APISmokeTests.test_user_id,
+                'date': shift_date,
+                'start_time': '08:00',
+                'end_time': '12:00'
+            }
+            response = self.app.post('/shifts', data=json.dumps(shift_data), content_type='application/json')
+            self.assertEqual(response.status_code, 201, f"Failed to create shift: {response.data.decode()}")
+            created_ids[shift_date] = json.loads(response.data)['shift']['id']
+
+        response_get = self.app.get(f'/shifts?user_id={APISmokeTests.test_user_id}&year=2023&month=12')
+        self.assertEqual(response_get.status_code, 200)
+        returned_ids = {s['id'] for s in json.loads(response_get.data)}
+        self.assertIn(created_ids['2023-12-01'], returned_ids)
+        self.assertIn(created_ids['2023-12-31'], returned_ids)
+        self.assertNotIn(created_ids['2023-11-30'], returned_ids)
+        self.assertNotIn(created_ids['2024-01-01'], returned_ids)
+
+        response_invalid = self.app.get(f'/shifts?user_id={APISmokeTests.test_user_id}&year=2023&month=13')
+        self.assertEqual(response_invalid.status_code, 400)
+
+    def test_09_list_endpoints_query_count(self):
+        print("\nRunning test_09_list_endpoints_query_count...")
+        other_username = f"testuser_nplus1_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        response = self.app.post('/register',
+                                 data=json.dumps({'username': other_username, 'email': f'{other_username}@example.com', 'password': 'password123'}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        other_user = User.query.filter_by(username=other_username).first()
+        self.addCleanup(self._delete_user, other_user.id)
+
+        def post_shift(user_id, day):
+            shift_data = {'user_id': user_id, 'date': f'2022-03-{day:02d}', 'start_time': '09:00', 'end_time': '17:00'}
+            response = self.app.post('/shifts', data=json.dumps(shift_data), content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+
+        def post_vacation_and_overtime(user_id, day):
+            vac_data = {'user_id': user_id, 'start_date': f'2022-04-{day:02d}', 'end_date': f'2022-04-{day:02d}'}
+            self.assertEqual(self.app.post('/vacation_requests', data=json.dumps(vac_data), content_type='application/json').status_code, 201)
+            ot_data = {'user_id': user_id, 'date': f'2022-04-{day:02d}', 'hours': 1, 'overtime_type': 'weekday'}
+            self.assertEqual(self.app.post('/overtime_entries', data=json.dumps(ot_data), content_type='application/json').status_code, 201)
+
+        urls = [
+            '/shifts?year=2022&month=3',
+            f'/vacation_requests?user_id={other_user.id}',
+            f'/overtime_entries?user_id={other_user.id}',
+        ]
+
+        post_shift(other_user.id, 1)
+        post_vacation_and_overtime(other_user.id, 1)
+        baseline_counts = {}
+        for url in urls:
+            with count_queries() as statements:
+                self.assertEqual(self.app.get(url).status_code, 200)
+            baseline_counts[url] = len(statements)
+
+        for day in range(2, 12):
+            post_shift(other_user.id, day)
+            post_shift(APISmokeTests.test_user_id, day)
+            post_vacation_and_overtime(other_user.id, day)
+
+        for url in urls:
+            with count_queries() as statements:
+                response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertGreater(len(json.loads(response.data)), 10)
+            self.assertEqual(len(statements), baseline_counts[url], f"{url} issued {len(statements)} queries: {statements}")
+
+    def test_10_annual_report_matches_python_reference(self):
+        print("\nRunning test_10_annual_report_matches_python_reference...")
+        username = f"testuser_report_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        response = self.app.post('/register',
+                                 data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        year = 2019
+        for seed in range(25):
+            rng = random.Random(seed)
+            TimeEntry.query.filter_by(user_id=user_id).delete()
+            entries = []
+            has_open_entry = False
+            for _ in range(rng.randint(0, 60)):
+                # Include the neighbouring years' boundary days and open entries.
+                entry_date = date(year, 1, 1) + timedelta(days=rng.randint(-2, 366))
+                clock_in_time = datetime.combine(entry_date, time()) + timedelta(microseconds=rng.randint(0, 86_399_999_999))
+                clock_out_time = None
+                if has_open_entry or rng.random() > 0.1:
+                    clock_out_time = clock_in_time + timedelta(microseconds=rng.randint(0, 16 * 3_600_000_000))
+                else:
+                    has_open_entry = True # Only one open entry per user is allowed
+                entries.append((entry_date, clock_in_time, clock_out_time))
+                db.session.add(TimeEntry(user_id=user_id, date=entry_date, clock_in_time=clock_in_time, clock_out_time=clock_out_time))
+            db.session.flush()
+            rebuild_monthly_hours_rollup(user_id)
+            db.session.commit()
+            report_cache.clear()
+
+            response = self.app.get(f'/reports/annual_hours/{user_id}/{year}')
+            self.assertEqual(response.status_code, 200)
+            report = json.loads(response.data)
+            expected = reference_annual_hours(entries, year)
+            self.assertEqual(report['total_annual_hours'], expected['total_annual_hours'], f"seed={seed}")
+            self.assertEqual(report['monthly_breakdown'], expected['monthly_breakdown'], f"seed={seed}")
+
+    def test_11_clock_out_updates_monthly_rollup(self):
+        print("\nRunning test_11_clock_out_updates_monthly_rollup...")
+        today = date.today()
+        before = db.session.get(MonthlyHoursRollup, (APISmokeTests.test_user_id, today.year, today.month))
+        count_before = before.entry_count if before else 0
+        db.session.rollback()
+
+        response_in = self.app.post('/time_entries/clock_in', data=json.dumps({'user_id': APISmokeTests.test_user_id}), content_type='application/json')
+        self.assertEqual(response_in.status_code, 201, f"Clock-in failed: {response_in.data.decode()}")
+        response_out = self.app.post('/time_entries/clock_out', data=json.dumps({'user_id': APISmokeTests.test_user_id}), content_type='application/json')
+        self.assertEqual(response_out.status_code, 200, f"Clock-out failed: {response_out.data.decode()}")
+
+        rollup = db.session.get(MonthlyHoursRollup, (APISmokeTests.test_user_id, today.year, today.month))
+        self.assertIsNotNone(rollup)
+        self.assertEqual(rollup.entry_count, count_before + 1)
+        incremental_microseconds = rollup.worked_microseconds
+        db.session.rollback()
+
+        # A rebuild from history must land on the same totals as the incremental path.
+        rebuild_monthly_hours_rollup(APISmokeTests.test_user_id)
+        db.session.commit()
+        rebuilt = db.session.get(MonthlyHoursRollup, (APISmokeTests.test_user_id, today.year, today.month))
+        self.assertEqual(rebuilt.entry_count, count_before + 1)
+        self.assertEqual(rebuilt.worked_microseconds, incremental_microseconds)
+
+    def test_12_bulk_create_shifts(self):
+        print("\nRunning test_12_bulk_create_shifts...")
+        user_id = APISmokeTests.test_user_id
+        roster = [{'user_id': user_id, 'date': f'2021-02-{day:02d}', 'start_time': '06:00', 'end_time': '14:00', 'location': 'Bulk'}
+                  for day in range(1, 29)]
+
+        bad_roster = roster[:3] + [
+            {'user_id': user_id, 'date': '2021-02-30', 'start_time': '06:00', 'end_time': '14:00'},
+            {'user_id': 999999999, 'date': '2021-02-01', 'start_time': '06:00', 'end_time': '14:00'},
+            {'user_id': user_id, 'date': '2021-02-01'}
+        ]
+        response = self.app.post('/shifts/bulk', data=json.dumps(bad_roster), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = json.loads(response.data)['errors']
+        self.assertEqual([e['index'] for e in errors], [3, 4, 5])
+        self.assertEqual(errors[1]['message'], 'User not found')
+        self.assertEqual(Shift.query.filter_by(user_id=user_id, location='Bulk').count(), 0, "Rejected batch must not insert anything")
+
+        with count_queries() as statements:
+            response = self.app.post('/shifts/bulk', data=json.dumps({'shifts': roster}), content_type='application/json')
+        self.assertEqual(response.status_code, 201, f"Bulk create failed: {response.data.decode()}")
+        self.assertEqual(json.loads(response.data)['created'], len(roster))
+        self.assertLessEqual(len(statements), 3, f"Expected two conflict index queries and one executemany: {statements}")
+
+        response_get = self.app.get(f'/shifts?user_id={user_id}&year=2021&month=2')
+        self.assertEqual(len([s for s in json.loads(response_get.data) if s['location'] == 'Bulk']), len(roster))
+
+    def test_13_keyset_pagination_and_streaming(self):
+        print("\nRunning test_13_keyset_pagination_and_streaming...")
+        user_id = APISmokeTests.test_user_id
+        # Several shifts share a date so the id tiebreaker is exercised.
+        roster = [{'user_id': user_id, 'date': f'2020-05-{day:02d}', 'start_time': f'{hour:02d}:00', 'end_time': f'{hour + 1:02d}:00'}
+                  for day in range(1, 8) for hour in (6, 14)]
+        response = self.app.post('/shifts/bulk', data=json.dumps(roster), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        base_url = f'/shifts?user_id={user_id}&year=2020&month=5'
+        seen = []
+        url = f'{base_url}&limit=4'
+        while url:
+            response = self.app.get(url)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(response.data)
+            self.assertLessEqual(len(page['items']), 4)
+            seen.extend(page['items'])
+            url = f"{base_url}&limit=4&cursor={page['next_cursor']}" if page['next_cursor'] else None
+        self.assertEqual(len(seen), len(roster))
+        self.assertEqual(len({s['id'] for s in seen}), len(roster))
+        self.assertEqual([(s['date'], s['id']) for s in seen], sorted((s['date'], s['id']) for s in seen))
+
+        response_stream = self.app.get(f'{base_url}&stream=1')
+        self.assertEqual(response_stream.status_code, 200)
+        self.assertEqual(sorted(s['id'] for s in json.loads(response_stream.data)), sorted(s['id'] for s in seen))
+        response_stream_empty = self.app.get(f'/shifts?user_id={user_id}&year=1999&month=1&stream=1')
+        self.assertEqual(json.loads(response_stream_empty.data), [])
+
+        # Descending endpoints page newest first
+        for day in (1, 2, 3):
+            ot_data = {'user_id': user_id, 'date': f'2020-05-{day:02d}', 'hours': 1, 'overtime_type': 'weekday'}
+            self.app.post('/overtime_entries', data=json.dumps(ot_data), content_type='application/json')
+        page = json.loads(self.app.get(f'/overtime_entries?user_id={user_id}&limit=2').data)
+        self.assertEqual(len(page['items']), 2)
+        self.assertGreaterEqual(page['items'][0]['date'], page['items'][1]['date'])
+        self.assertIsNotNone(page['next_cursor'])
+
+        self.assertEqual(self.app.get(f'{base_url}&limit=0').status_code, 400)
+        self.assertEqual(self.app.get(f'{base_url}&limit=5&cursor=not-a-cursor').status_code, 400)
+
+    def test_14_etag_revalidation(self):
+        print("\nRunning test_14_etag_revalidation...")
+        user_id = APISmokeTests.test_user_id
+        shifts_url = f'/shifts?user_id={user_id}&year=2020&month=7'
+
+        first = self.app.get(shifts_url)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        self.assertTrue(etag.startswith('W/'))
+        self.assertIn('no-cache', first.headers['Cache-Control'])
+
+        repeat = self.app.get(shifts_url, headers={'If-None-Match': etag})
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.data, b'')
+
+        shift_data = {'user_id': user_id, 'date': '2020-07-04', 'start_time': '09:00', 'end_time': '17:00'}
+        self.app.post('/shifts', data=json.dumps(shift_data), content_type='application/json')
+        changed = self.app.get(shifts_url, headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+        current_year = date.today().year
+        report_url = f'/reports/annual_hours/{user_id}/{current_year}'
+        report = self.app.get(report_url)
+        self.assertEqual(report.status_code, 200)
+        report_etag = report.headers['ETag']
+        self.assertEqual(self.app.get(report_url, headers={'If-None-Match': report_etag}).status_code, 304)
+
+        clock_in_time = datetime(current_year, 1, 1, 8, 0)
+        db.session.add(TimeEntry(user_id=user_id, date=clock_in_time.date(), clock_in_time=clock_in_time, clock_out_time=clock_in_time + timedelta(hours=3)))
+        db.session.flush()
+        rebuild_monthly_hours_rollup(user_id)
+        db.session.commit()
+        report_cache.clear()
+        self.assertEqual(self.app.get(report_url, headers={'If-None-Match': report_etag}).status_code, 200)
+
+        past_report = self.app.get(f'/reports/annual_hours/{user_id}/{current_year - 1}')
+        self.assertIn('max-age=', past_report.headers['Cache-Control'])
+
+    def test_15_clock_out_invalidates_cached_report(self):
+        print("\nRunning test_15_clock_out_invalidates_cached_report...")
+        user_id = APISmokeTests.test_user_id
+        current_year = date.today().year
+        current_url = f'/reports/annual_hours/{user_id}/{current_year}'
+        # A second worker process: its own app, caches and engine on the same database
+        worker_b = create_app({'SQLALCHEMY_DATABASE_URI': app.config['SQLALCHEMY_DATABASE_URI'], 'SECRET_KEY': app.config['SECRET_KEY']})
+        client_b = worker_b.test_client()
+        client_b.environ_base['HTTP_AUTHORIZATION'] = self.auth_header
+
+        def total_hours(client):
+            response = client.get(current_url)
+            self.assertEqual(response.status_code, 200, response.data)
+            return json.loads(response.data)['total_annual_hours']
+
+        def clock_three_hours():
+            self.app.post('/time_entries/clock_in', data=json.dumps({'user_id': user_id}), content_type='application/json')
+            TimeEntry.query.filter_by(user_id=user_id, clock_out_time=None).update(
+                {TimeEntry.clock_in_time: datetime.now() - timedelta(hours=3)})
+            db.session.commit()
+            response = self.app.post('/time_entries/clock_out', data=json.dumps({'user_id': user_id}), content_type='application/json')
+            self.assertEqual(response.status_code, 200, response.data)
+
+        # Per-process caches keep past years only, so worker B sees worker A's clock-out at once
+        self.assertEqual(self.app.get(f'/reports/annual_hours/{user_id}/{current_year - 1}').status_code, 200)
+        hits_before = report_cache.stats()['hits']
+        self.app.get(f'/reports/annual_hours/{user_id}/{current_year - 1}')
+        self.assertEqual(report_cache.stats()['hits'], hits_before + 1)
+        before = total_hours(client_b)
+        self.assertEqual(total_hours(self.app), before)
+        self.assertIsNone(report_cache.get((user_id, current_year)), "the current year is not cached per process")
+        same_year = (datetime.now() - timedelta(hours=3)).year == current_year # not on New Year's night
+        if same_year:
+            clock_three_hours()
+            self.assertAlmostEqual(total_hours(client_b), before + 3, places=1)
+
+        # A shared cache also keeps the current year, and clock_out invalidates it for every worker
+        shared = FakeRedis()
+        for worker in (app, worker_b):
+            worker.extensions['report_cache'] = RedisCache(shared)
+        self.addCleanup(app.extensions.__setitem__, 'report_cache', app.extensions['report_cache'])
+        self.addCleanup(app.config.__setitem__, 'REPORT_CACHE_URL', None)
+        app.config['REPORT_CACHE_URL'] = worker_b.config['REPORT_CACHE_URL'] = 'redis://shared'
+        before = total_hours(client_b)
+        self.assertIsNotNone(report_cache.get((user_id, current_year)))
+        self.app.post('/time_entries/clock_in', data=json.dumps({'user_id': user_id}), content_type='application/json')
+        self.app.post('/time_entries/clock_out', data=json.dumps({'user_id': user_id}), content_type='application/json')
+        self.assertIsNone(report_cache.get((user_id, current_year)), "clock_out must drop the affected report")
+        if same_year:
+            clock_three_hours()
+            self.assertAlmostEqual(total_hours(client_b), before + 3, places=1)
+
+        response = self.app.get('/reports/cache_stats')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('misses', json.loads(response.data))
+
+    def test_16_shifts_date_range_grouped(self):
+        print("\nRunning test_16_shifts_date_range_grouped...")
+        user_id = APISmokeTests.test_user_id
+        other_username = f"testuser_team_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': other_username, 'email': f'{other_username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        other_id = User.query.filter_by(username=other_username).first().id
+        self.addCleanup(self._delete_user, other_id)
+
+        roster = [
+            {'user_id': user_id, 'date': '2019-01-31', 'start_time': '14:00', 'end_time': '22:00', 'location': 'A'},
+            {'user_id': other_id, 'date': '2019-01-31', 'start_time': '06:00', 'end_time': '14:00', 'location': 'B'},
+            {'user_id': user_id, 'date': '2019-02-15', 'start_time': '09:00', 'end_time': '17:00'},
+            {'user_id': user_id, 'date': '2019-03-31', 'start_time': '09:00', 'end_time': '17:00'},
+            {'user_id': user_id, 'date': '2019-04-01', 'start_time': '09:00', 'end_time': '17:00'},
+        ]
+        self.assertEqual(self.app.post('/shifts/bulk', data=json.dumps(roster), content_type='application/json').status_code, 201)
+
+        response = self.app.get(f'/shifts?user_ids={user_id},{other_id}&start_date=2019-01-01&end_date=2019-03-31&group_by=date')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['fields'], ['id', 'user_id', 'start_time', 'end_time', 'location'])
+        self.assertEqual(sorted(data['days']), ['2019-01-31', '2019-02-15', '2019-03-31'])
+        self.assertEqual(data['days']['2019-01-31']['count'], 2)
+        self.assertEqual([row[1:] for row in data['days']['2019-01-31']['shifts']],
+                         [[other_id, '06:00:00', '14:00:00', 'B'], [user_id, '14:00:00', '22:00:00', 'A']])
+
+        response_flat = self.app.get(f'/shifts?user_id={user_id}&start_date=2019-02-01&end_date=2019-03-31')
+        self.assertEqual(sorted(s['date'] for s in json.loads(response_flat.data)), ['2019-02-15', '2019-03-31'])
+
+        self.assertEqual(self.app.get('/shifts?user_ids=1,x').status_code, 400)
+        self.assertEqual(self.app.get('/shifts?start_date=2019-13-01').status_code, 400)
+        self.assertEqual(self.app.get('/shifts?group_by=user').status_code, 400)
+
+    def test_17_vacation_request_views(self):
+        print("\nRunning test_17_vacation_request_views...")
+        username = f"testuser_views_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        today = date.today()
+        fixtures = {
+            'future_approved': ('approved', today + timedelta(days=10), today + timedelta(days=12)),
+            'past_approved': ('approved', today - timedelta(days=30), today - timedelta(days=28)),
+            'ongoing_approved': ('approved', today - timedelta(days=1), today + timedelta(days=1)),
+            'rejected': ('rejected', today + timedelta(days=40), today + timedelta(days=41)),
+            'pending': ('pending', today + timedelta(days=5), today + timedelta(days=6)),
+        }
+        ids = {}
+        for name, (status, start, end) in fixtures.items():
+            req = VacationRequest(user_id=user_id, start_date=start, end_date=end, status=status)
+            db.session.add(req)
+            db.session.flush()
+            ids[name] = req.id
+        db.session.commit()
+
+        def fetch_ids(query_string):
+            response = self.app.get(f'/vacation_requests?user_id={user_id}&{query_string}')
+            self.assertEqual(response.status_code, 200, response.data.decode())
+            return {r['id'] for r in json.loads(response.data)}
+
+        self.assertEqual(fetch_ids('view=upcoming'), {ids['future_approved']})
+        self.assertEqual(fetch_ids('view=pending'), {ids['pending']})
+        self.assertEqual(fetch_ids('view=history'), {ids['past_approved'], ids['rejected']})
+        self.assertEqual(fetch_ids('status=approved,rejected'),
+                         {ids['future_approved'], ids['past_approved'], ids['ongoing_approved'], ids['rejected']})
+        self.assertEqual(fetch_ids(f'start_date={today.isoformat()}&end_date={(today + timedelta(days=10)).isoformat()}'),
+                         {ids['future_approved'], ids['ongoing_approved'], ids['pending']})
+
+        self.assertEqual(self.app.get(f'/vacation_requests?user_id={user_id}&view=someday').status_code, 400)
+
+    def test_18_concurrent_clock_in_and_out(self):
+        print("\nRunning test_18_concurrent_clock_in_and_out...")
+        username = f"testuser_rush_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        def hammer(url, n_threads=16):
+            barrier = threading.Barrier(n_threads)
+            statuses = []
+            lock = threading.Lock()
+
+            def tap():
+                client = app.test_client()
+                barrier.wait()
+                response = client.post(url, data=json.dumps({'user_id': user_id}), content_type='application/json',
+                                       headers={'Authorization': APISmokeTests.auth_header})
+                with lock:
+                    statuses.append(response.status_code)
+
+            threads = [threading.Thread(target=tap) for _ in range(n_threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return sorted(statuses)
+
+        self.assertEqual(hammer('/time_entries/clock_in'), [201] + [409] * 15)
+        self.assertEqual(TimeEntry.query.filter_by(user_id=user_id, clock_out_time=None).count(), 1)
+        self.assertEqual(hammer('/time_entries/clock_out'), [200] + [404] * 15)
+        self.assertEqual(TimeEntry.query.filter_by(user_id=user_id).count(), 1)
+        rollup = db.session.get(MonthlyHoursRollup, (user_id, date.today().year, date.today().month))
+        self.assertEqual(rollup.entry_count, 1)
+        db.session.rollback()
+
+        response = self.app.post('/time_entries/clock_in', data=json.dumps({'user_id': 999999999}), content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_19_token_authentication(self):
+        print("\nRunning test_19_token_authentication...")
+        username = f"testuser_token_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        client = app.test_client()
+        self.assertEqual(client.get('/time_entries').status_code, 401)
+        response = client.post('/login', data=json.dumps({'username': username, 'password': 'password123'}),
+                               content_type='application/json')
+        token = json.loads(response.data)['token']
+        self.assertEqual(client.get('/time_entries', headers={'Authorization': f'Bearer {token}x'}).status_code, 401)
+        client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+
+        # The caller's own records need no user lookup; user_id defaults to the caller
+        with count_queries() as statements:
+            response = client.get('/time_entries')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('FROM user' in statement for statement in statements), statements)
+        self.assertEqual(client.get(f'/time_entries?user_id={user_id}').status_code, 200)
+        response = client.post('/vacation_requests',
+                               data=json.dumps({'start_date': '2030-01-07', 'end_date': '2030-01-08'}),
+                               content_type='application/json')
+        self.assertEqual(json.loads(response.data)['request']['user_id'], user_id)
+
+        # An employee cannot read or write anyone else's records
+        other_id = APISmokeTests.test_user_id
+        self.assertEqual(client.get(f'/time_entries?user_id={other_id}').status_code, 403)
+        self.assertEqual(client.get(f'/shifts?user_ids={user_id},{other_id}').status_code, 403)
+        self.assertEqual(client.get(f'/reports/annual_hours/{other_id}/2024').status_code, 403)
+        self.assertEqual(client.post('/time_entries/clock_in', data=json.dumps({'user_id': other_id}),
+                                     content_type='application/json').status_code, 403)
+        response = client.post('/shifts/bulk', data=json.dumps([
+            {'date': '2030-01-07', 'start_time': '09:00', 'end_time': '17:00'},
+            {'user_id': other_id, 'date': '2030-01-07', 'start_time': '09:00', 'end_time': '17:00'},
+        ]), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in json.loads(response.data)['errors']], [1])
+        self.assertEqual(client.get('/reports/cache_stats').status_code, 403)
+        response = client.post('/register', data=json.dumps({
+            'username': f'{username}_boss', 'email': f'{username}_boss@example.com', 'password': 'x', 'role': 'manager'
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        # Shift listings are narrowed to the caller
+        Shift.query.filter_by(user_id=other_id, date=date(2030, 1, 7)).delete()
+        db.session.add(Shift(user_id=other_id, date=date(2030, 1, 7), start_at=datetime(2030, 1, 7, 9), end_at=datetime(2030, 1, 7, 17)))
+        db.session.add(Shift(user_id=user_id, date=date(2030, 1, 7), start_at=datetime(2030, 1, 7, 9), end_at=datetime(2030, 1, 7, 17)))
+        db.session.commit()
+        shifts = json.loads(client.get('/shifts?start_date=2030-01-07&end_date=2030-01-07').data)
+        self.assertEqual({s['user_id'] for s in shifts}, {user_id})
+
+        # A manager may act on other users
+        self.assertEqual(self.app.get(f'/time_entries?user_id={user_id}').status_code, 200)
+        self.assertEqual(self.app.get('/time_entries?user_id=999999999').status_code, 404)
+        Shift.query.filter_by(user_id=other_id, date=date(2030, 1, 7)).delete()
+        db.session.commit()
+
+    def test_20_login_rehashes_outdated_password_hash(self):
+        print("\nRunning test_20_login_rehashes_outdated_password_hash...")
+        username = f"testuser_rehash_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        user = User(username=username, email=f'{username}@example.com', role='employee',
+                    password_hash=generate_password_hash('password123', 'pbkdf2:sha256:1000'))
+        db.session.add(user)
+        db.session.commit()
+        self.addCleanup(self._delete_user, user.id)
+
+        def login(password):
+            return self.app.post('/login', data=json.dumps({'username': username, 'password': password}),
+                                 content_type='application/json')
+
+        self.assertEqual(login('wrong').status_code, 401)
+        self.assertTrue(db.session.get(User, user.id).password_hash.startswith('pbkdf2:sha256:1000$'))
+        self.assertEqual(login('password123').status_code, 200)
+        db.session.expire_all()
+        upgraded = db.session.get(User, user.id).password_hash
+        self.assertFalse(password_hasher.needs_rehash(upgraded), upgraded)
+        self.assertEqual(login('password123').status_code, 200)
+        db.session.expire_all()
+        self.assertEqual(db.session.get(User, user.id).password_hash, upgraded)
+
+    def test_21_columnar_list_format(self):
+        print("\nRunning test_21_columnar_list_format...")
+        user_id = APISmokeTests.test_user_id
+        self.app.post('/time_entries/clock_in', data=json.dumps({}), content_type='application/json')
+        for url in (f'/shifts?user_id={user_id}', '/time_entries', '/vacation_requests', '/overtime_entries'):
+            rows = json.loads(self.app.get(url).data)
+            self.assertTrue(rows, url)
+            columnar = json.loads(self.app.get(f'{url}{"&" if "?" in url else "?"}format=columnar').data)
+            self.assertEqual([dict(zip(columnar['fields'], values)) for values in zip(*columnar['columns'])], rows, url)
+
+        entries = json.loads(self.app.get('/time_entries').data)
+        self.assertTrue(any(entry['clock_out_time'] is None and entry['duration_hours'] is None for entry in entries))
+        page = json.loads(self.app.get('/time_entries?format=columnar&limit=1').data)
+        self.assertEqual(len(page['items']['columns'][0]), 1)
+        self.assertIsNotNone(page['next_cursor'])
+        self.assertEqual(self.app.get('/time_entries?format=xml').status_code, 400)
+        self.assertEqual(self.app.get('/time_entries?format=columnar&stream=1').status_code, 400)
+        self.app.post('/time_entries/clock_out', data=json.dumps({}), content_type='application/json')
+
+    def test_22_schedule_matrix(self):
+        print("\nRunning test_22_schedule_matrix...")
+        username = f"testuser_matrix_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+        main_id = APISmokeTests.test_user_id
+        start = date(2031, 3, 1)
+        Shift.query.filter(Shift.date >= start, Shift.date < start + timedelta(days=7)).delete()
+        def shift(shift_user_id, day, start_hour, end_hour, location):
+            start_at, end_at = shift_interval(start + timedelta(days=day), time(start_hour), time(end_hour))
+            return Shift(user_id=shift_user_id, date=start_at.date(), start_at=start_at, end_at=end_at, location=location)
+        db.session.add_all([
+            shift(user_id, 0, 14, 22, 'Nord'),
+            shift(user_id, 0, 6, 10, 'Nord'),
+            shift(user_id, 6, 9, 17, 'Sud'),
+            shift(main_id, 2, 9, 17, 'Sud'),
+            shift(main_id, 7, 9, 17, 'Sud'),
+        ])
+        # Written by something other than SQLAlchemy: no microseconds in the text
+        db.session.execute(text("INSERT INTO shift (user_id, date, start_at, end_at, location) "
+                                "VALUES (:user_id, '2031-03-04', '2031-03-04 07:30:00', '2031-03-04 15:30:00', 'Sud')"),
+                           {'user_id': main_id})
+        db.session.commit()
+        self.addCleanup(lambda: (Shift.query.filter_by(user_id=main_id).filter(Shift.date >= start).delete(), db.session.commit()))
+
+        with count_queries() as statements:
+            response = self.app.get('/schedule/matrix?start=2031-03-01&end=2031-03-07')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(len(statements), 2, statements) # ETag stamp + the range query
+        matrix = json.loads(response.data)
+        self.assertEqual(len(matrix['days']), 7)
+        self.assertEqual((matrix['days'][0], matrix['days'][-1]), ('2031-03-01', '2031-03-07'))
+        rows = {row['user_id']: row for row in matrix['users']}
+        self.assertEqual(set(rows), {user_id, main_id})
+        cells = rows[user_id]['cells']
+        self.assertEqual([[shift[1] for shift in cell] for cell in cells],
+                         [['06:00:00', '14:00:00'], [], [], [], [], [], ['09:00:00']])
+        self.assertEqual([len(cell) for cell in rows[main_id]['cells']], [0, 0, 1, 1, 0, 0, 0])
+        self.assertEqual(rows[main_id]['cells'][3][0][1:3], ['07:30:00', '15:30:00'])
+        self.assertEqual(dict(zip(matrix['fields'], rows[main_id]['cells'][2][0]))['location'], 'Sud')
+
+        matrix = json.loads(self.app.get('/schedule/matrix?start=2031-03-01&end=2031-03-07&location=Nord').data)
+        self.assertEqual([row['user_id'] for row in matrix['users']], [user_id])
+        self.assertEqual(self.app.get('/schedule/matrix?start=2031-03-01').status_code, 400)
+        self.assertEqual(self.app.get('/schedule/matrix?start=2031-03-07&end=2031-03-01').status_code, 400)
+        self.assertEqual(self.app.get('/schedule/matrix?start=2031-01-01&end=2031-12-31').status_code, 400)
+
+        response = self.app.post('/login', data=json.dumps({'username': username, 'password': 'password123'}),
+                                 content_type='application/json')
+        employee_auth = {'Authorization': f"Bearer {json.loads(response.data)['token']}"}
+        self.assertEqual(self.app.get('/schedule/matrix?start=2031-03-01&end=2031-03-07', headers=employee_auth).status_code, 403)
+
+    def test_23_shift_conflicts(self):
+        print("\nRunning test_23_shift_conflicts...")
+        username = f"testuser_conflict_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+        db.session.add(VacationRequest(user_id=user_id, start_date=date(2032, 4, 10), end_date=date(2032, 4, 12), status='approved'))
+        db.session.add(VacationRequest(user_id=user_id, start_date=date(2032, 4, 20), end_date=date(2032, 4, 22), status='pending'))
+        db.session.commit()
+
+        def post_shift(day, start_time, end_time):
+            return self.app.post('/shifts', data=json.dumps({'user_id': user_id, 'date': f'2032-04-{day:02d}',
+                                                            'start_time': start_time, 'end_time': end_time}),
+                                 content_type='application/json')
+
+        self.assertEqual(post_shift(1, '22:00', '06:00').status_code, 201) # overnight
+        response = post_shift(3, '08:00', '08:00') # almost always a typo, not a 24h shift
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('must differ', json.loads(response.data)['message'])
+        response = post_shift(2, '05:00', '09:00')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([c['type'] for c in json.loads(response.data)['conflicts']], ['overlap'])
+        response = post_shift(2, '14:00', '20:00') # only 8h after the night shift ended
+        self.assertEqual(response.status_code, 409)
+        conflict = json.loads(response.data)['conflicts'][0]
+        self.assertEqual((conflict['type'], conflict['rest_hours']), ('rest', 8.0))
+        self.assertIn('shift_id', conflict)
+        self.assertEqual(post_shift(2, '17:00', '23:00').status_code, 201)
+        self.assertEqual(post_shift(5, '08:00', '12:00').status_code, 201)
+        response = post_shift(5, '15:00', '19:00') # split shift, same roster day
+        self.assertEqual(response.status_code, 201, response.data)
+        response = post_shift(11, '09:00', '17:00')
+        self.assertEqual(json.loads(response.data)['conflicts'], [{'type': 'vacation', 'start_date': '2032-04-10', 'end_date': '2032-04-12'}])
+        self.assertEqual(post_shift(9, '23:00', '03:00').status_code, 409) # runs into the vacation
+        self.assertEqual(post_shift(20, '09:00', '17:00').status_code, 201) # pending vacation does not block
+
+        roster = [{'user_id': user_id, 'date': '2032-04-25', 'start_time': '08:00', 'end_time': '16:00'},
+                  {'user_id': user_id, 'date': '2032-04-25', 'start_time': '15:00', 'end_time': '18:00'},
+                  {'user_id': user_id, 'date': '2032-04-26', 'start_time': '03:00', 'end_time': '08:00'}]
+        response = self.app.post('/shifts/bulk', data=json.dumps(roster), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        errors = json.loads(response.data)['errors']
+        self.assertEqual([e['index'] for e in errors], [1, 2])
+        self.assertEqual(errors[0]['conflicts'][0], {'index': 0, 'type': 'overlap', 'start': '2032-04-25T08:00:00', 'end': '2032-04-25T16:00:00'})
+        self.assertEqual(errors[1]['conflicts'][0]['type'], 'rest')
+        response = self.app.post('/shifts/bulk', data=json.dumps([roster[0], roster[2]]), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+    def test_24_overnight_shifts_and_cross_month_hours(self):
+        print("\nRunning test_24_overnight_shifts_and_cross_month_hours...")
+        username = f"testuser_night_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        response = self.app.post('/shifts', data=json.dumps({'user_id': user_id, 'date': '2033-01-31', 'start_time': '22:00', 'end_time': '06:00'}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.data)
+        shift = json.loads(response.data)['shift']
+        self.assertEqual((shift['start_at'], shift['end_at']), ('2033-01-31T22:00:00', '2033-02-01T06:00:00'))
+        listed = json.loads(self.app.get(f'/shifts?user_id={user_id}&year=2033&month=1').data)
+        self.assertEqual([(s['date'], s['start_time'], s['end_time'], s['end_at']) for s in listed],
+                         [('2033-01-31', '22:00:00', '06:00:00', '2033-02-01T06:00:00')])
+
+        # A closed entry across New Year's Eve counts toward both years
+        db.session.add(TimeEntry(user_id=user_id, date=date(2032, 12, 31),
+                                 clock_in_time=datetime(2032, 12, 31, 20), clock_out_time=datetime(2033, 1, 1, 4, 30)))
+        db.session.flush()
+        rebuild_monthly_hours_rollup(user_id)
+        db.session.commit()
+        report_cache.clear()
+        december = json.loads(self.app.get(f'/reports/annual_hours/{user_id}/2032').data)
+        january = json.loads(self.app.get(f'/reports/annual_hours/{user_id}/2033').data)
+        self.assertEqual((december['total_annual_hours'], december['monthly_breakdown'][11]['total_hours']), (4.0, 4.0))
+        self.assertEqual((january['total_annual_hours'], january['monthly_breakdown'][0]['total_hours']), (4.5, 4.5))
+
+        # Clocking out of a shift started before midnight on the last day of last month
+        month_start = datetime.combine(date.today().replace(day=1), time())
+        previous_month = month_start - timedelta(hours=1)
+        db.session.add(TimeEntry(user_id=user_id, date=previous_month.date(), clock_in_time=previous_month))
+        db.session.commit()
+        response = self.app.post('/time_entries/clock_out', data=json.dumps({'user_id': user_id}), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.data)
+        rollup = db.session.get(MonthlyHoursRollup, (user_id, previous_month.year, previous_month.month))
+        self.assertEqual((rollup.worked_microseconds, rollup.entry_count), (3600_000_000, 1))
+        rollup = db.session.get(MonthlyHoursRollup, (user_id, month_start.year, month_start.month))
+        self.assertGreater(rollup.worked_microseconds, 0)
+        db.session.rollback()
+
+    def test_25_import_time_entries(self):
+        print("\nRunning test_25_import_time_entries...")
+        username = f"testuser_import_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        csv_body = (
+            'user_id,clock_in_time,clock_out_time\n'
+            f'{user_id},2034-03-01T08:00:00,2034-03-01T16:30:00\n'
+            f'{user_id},2034-03-31T22:00:00,2034-04-01T06:00:00\n'
+            '999999999,2034-03-02T08:00:00,2034-03-02T16:00:00\n'
+            f'{user_id},2034-03-03T08:00:00,2034-03-03T07:00:00\n'
+            f'{user_id},not a time,2034-03-03T07:00:00\n'
+        )
+        app.config['IMPORT_CHUNK_SIZE'] = 2
+        self.addCleanup(app.config.update, IMPORT_CHUNK_SIZE=10_000)
+        response = self.app.post('/time_entries/import', data=csv_body, content_type='text/csv')
+        self.assertEqual(response.status_code, 200, response.data)
+        stats = json.loads(response.data)
+        self.assertEqual((stats['records'], stats['imported'], stats['rejected']), (5, 2, 3))
+        self.assertEqual([e['record'] for e in stats['errors']], [3, 4, 5])
+        self.assertEqual(stats['errors'][0]['message'], 'User not found')
+        report = json.loads(self.app.get(f'/reports/annual_hours/{user_id}/2034').data)
+        self.assertEqual([m['total_hours'] for m in report['monthly_breakdown'][2:4]], [10.5, 6.0])
+
+        # An import interrupted after its first chunk resumes from the checkpoint
+        records = [{'username': username, 'clock_in_time': f'2035-01-{day:02d}T09:00', 'clock_out_time': f'2035-01-{day:02d}T17:00'}
+                   for day in range(1, 8)]
+        checkpoint = f'test-{username}'
+        self.addCleanup(lambda: (ImportCheckpoint.query.filter_by(name=checkpoint).delete(), db.session.commit()))
+
+        def interrupted():
+            yield from records[:3]
+            raise OSError('connection reset')
+        with self.assertRaises(OSError):
+            import_time_entries(interrupted(), checkpoint, chunk_size=2)
+        self.assertEqual(db.session.get(ImportCheckpoint, checkpoint).records_done, 2)
+        stats = import_time_entries(iter(records), checkpoint, chunk_size=2)
+        self.assertEqual((stats['skipped'], stats['imported'], stats['records']), (2, 5, 7))
+        self.assertEqual(TimeEntry.query.filter(TimeEntry.user_id == user_id, TimeEntry.date >= date(2035, 1, 1)).count(), 7)
+        rollup = db.session.get(MonthlyHoursRollup, (user_id, 2035, 1))
+        self.assertEqual((rollup.worked_microseconds, rollup.entry_count), (7 * 8 * 3600_000_000, 7))
+
+        ndjson_body = json.dumps({'user_id': user_id, 'clock_in_time': '2036-05-01T08:00:00', 'clock_out_time': '2036-05-01T12:00:00'}) + '\n{oops\n'
+        response = self.app.post('/time_entries/import?format=ndjson', data=ndjson_body)
+        self.assertEqual((json.loads(response.data)['imported'], json.loads(response.data)['rejected']), (1, 1))
+        self.assertEqual(self.app.post('/time_entries/import', data=ndjson_body).status_code, 400)
+
+    def test_26_payroll_export(self):
+        print("\nRunning test_26_payroll_export...")
+        username = f"testuser_payroll_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+        db.session.add_all([
+            TimeEntry(user_id=user_id, date=date(2037, 4, 30), clock_in_time=datetime(2037, 4, 30, 22), clock_out_time=datetime(2037, 5, 1, 6)),
+            TimeEntry(user_id=user_id, date=date(2037, 5, 4), clock_in_time=datetime(2037, 5, 4, 8), clock_out_time=datetime(2037, 5, 4, 12, 30)),
+            TimeEntry(user_id=user_id, date=date(2037, 6, 1), clock_in_time=datetime(2037, 6, 1, 8), clock_out_time=datetime(2037, 6, 1, 12)),
+            OvertimeEntry(user_id=user_id, date=date(2037, 5, 9), hours=2.5, overtime_type='weekend', status='approved'),
+            VacationRequest(user_id=user_id, start_date=date(2037, 5, 28), end_date=date(2037, 6, 3), status='approved'),
+        ])
+        db.session.commit()
+
+        response = self.app.get('/exports/payroll?year=2037&month=5')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.mimetype, 'text/csv')
+        rows = [row for row in csv.DictReader(io.StringIO(response.get_data(as_text=True))) if row['user_id'] == str(user_id)]
+        self.assertEqual([(row['record_type'], row['date'], row['hours']) for row in rows],
+                         [('time_entry', '2037-04-30', '6.0'), ('time_entry', '2037-05-04', '4.5'),
+                          ('overtime', '2037-05-09', '2.5'), ('vacation', '2037-05-28', '')])
+        self.assertEqual({row['username'] for row in rows}, {username})
+
+        response = self.app.get('/exports/payroll?year=2037&month=5&format=ndjson', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        records = [json.loads(line) for line in gzip.decompress(response.get_data()).splitlines()]
+        records = [record for record in records if record['user_id'] == user_id]
+        self.assertEqual(len(records), 4)
+        self.assertEqual((records[2]['category'], records[3]['end']), ('weekend', '2037-06-03'))
+
+        self.assertEqual(self.app.get('/exports/payroll?year=2037&month=13').status_code, 400)
+        response = self.app.post('/login', data=json.dumps({'username': username, 'password': 'password123'}),
+                                 content_type='application/json')
+        employee_auth = {'Authorization': f"Bearer {json.loads(response.data)['token']}"}
+        self.assertEqual(self.app.get('/exports/payroll?year=2037&month=5', headers=employee_auth).status_code, 403)
+
+    def test_27_derive_overtime(self):
+        print("\nRunning test_27_derive_overtime...")
+        username = f"testuser_derive_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        def shift(day, start_hour, end_hour):
+            start_at, end_at = shift_interval(day, time(start_hour), time(end_hour))
+            return Shift(user_id=user_id, date=day, start_at=start_at, end_at=end_at)
+
+        def entry(day, start_hour, hours):
+            clock_in_time = datetime.combine(day, time(start_hour))
+            return TimeEntry(user_id=user_id, date=day, clock_in_time=clock_in_time, clock_out_time=clock_in_time + timedelta(hours=hours))
+        db.session.add_all([
+            shift(date(2038, 4, 23), 22, 6), entry(date(2038, 4, 23), 22, 9.5), # Friday night shift, 1.5h over
+            shift(date(2038, 4, 24), 9, 13), entry(date(2038, 4, 24), 9, 4.1), # Saturday, only 6 minutes over
+            entry(date(2038, 4, 25), 9, 3),                                   # Easter Sunday, unscheduled
+            entry(date(2038, 4, 26), 8, 2), entry(date(2038, 4, 26), 14, 2),  # Easter Monday, unscheduled
+            shift(date(2038, 4, 27), 8, 16), entry(date(2038, 4, 27), 8, 7),  # under the schedule
+        ])
+        db.session.commit()
+
+        derive = lambda: self.app.post('/overtime_entries/derive', data=json.dumps(
+            {'start_date': '2038-04-20', 'end_date': '2038-04-30', 'user_ids': [user_id]}), content_type='application/json')
+        response = derive()
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(json.loads(response.data), {'inserted': 3, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0})
+        entries = OvertimeEntry.query.filter_by(user_id=user_id).order_by(OvertimeEntry.date).all()
+        self.assertEqual([(e.date.day, e.hours, e.overtime_type, e.status, e.source) for e in entries],
+                         [(23, 1.5, 'weekday', 'pending', 'derived'), (25, 3.0, 'holiday', 'pending', 'derived'),
+                          (26, 4.0, 'holiday', 'pending', 'derived')])
+
+        # Rerunning after corrections updates and removes pending rows but keeps decided ones
+        entries[1].status = 'approved'
+        TimeEntry.query.filter_by(user_id=user_id, date=date(2038, 4, 26)).delete()
+        TimeEntry.query.filter_by(user_id=user_id, date=date(2038, 4, 25)).delete()
+        db.session.add(entry(date(2038, 4, 23), 7, 1))
+        db.session.commit()
+        self.assertEqual(json.loads(derive().data), {'inserted': 0, 'updated': 1, 'deleted': 1, 'unchanged': 0, 'skipped': 0})
+        self.assertEqual([(e.date.day, e.hours, e.status) for e in OvertimeEntry.query.filter_by(user_id=user_id).order_by(OvertimeEntry.date)],
+                         [(23, 2.5, 'pending'), (25, 3.0, 'approved')])
+
+        # A day already entered by hand is not derived again, and its pending derived row goes
+        db.session.add_all([
+            OvertimeEntry(user_id=user_id, date=date(2038, 4, 23), hours=2, overtime_type='weekday', status='pending'),
+            entry(date(2038, 4, 28), 8, 5), # Wednesday, unscheduled
+            OvertimeEntry(user_id=user_id, date=date(2038, 4, 28), hours=5, overtime_type='weekday', status='rejected'),
+        ])
+        db.session.commit()
+        self.assertEqual(json.loads(derive().data), {'inserted': 1, 'updated': 0, 'deleted': 1, 'unchanged': 0, 'skipped': 1})
+        self.assertEqual([(e.date.day, e.hours, e.source) for e in OvertimeEntry.query.filter_by(user_id=user_id).order_by(OvertimeEntry.date, OvertimeEntry.id)],
+                         [(23, 2.0, 'manual'), (25, 3.0, 'derived'), (28, 5.0, 'manual'), (28, 5.0, 'derived')])
+        self.assertEqual(self.app.post('/overtime_entries/derive', data=json.dumps({'start_date': '2038-04-20'}),
+                                       content_type='application/json').status_code, 400)
+
+    def test_28_batch_decisions(self):
+        print("\nRunning test_28_batch_decisions...")
+        username = f"testuser_decide_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+        requests_ = [VacationRequest(user_id=user_id, start_date=date(2039, 7, day), end_date=date(2039, 7, day + 1), status=status)
+                     for day, status in ((1, 'pending'), (5, 'pending'), (9, 'rejected'))]
+        overtime = [OvertimeEntry(user_id=user_id, date=date(2039, 7, day), hours=1, overtime_type='weekday') for day in (1, 2)]
+        db.session.add_all(requests_ + overtime)
+        db.session.commit()
+        ids = [r.id for r in requests_]
+
+        body = {'ids': ids + [999_999_999, ids[0]], 'decision': 'approve'}
+        with count_queries() as statements:
+            response = self.app.post('/vacation_requests/decisions', data=json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(sum(statement.lstrip().upper().startswith('UPDATE') for statement in statements), 1, statements)
+        data = json.loads(response.data)
+        self.assertEqual(data['updated'], 2)
+        self.assertEqual([(r['id'], r['outcome'], r['status']) for r in data['results']],
+                         [(ids[0], 'updated', 'approved'), (ids[1], 'updated', 'approved'),
+                          (ids[2], 'conflict', 'rejected'), (999_999_999, 'not_found', None)])
+        # Deciding again is a conflict for every id: nothing is pending any more
+        data = json.loads(self.app.post('/vacation_requests/decisions', data=json.dumps({'ids': ids[:2], 'decision': 'reject'}),
+                                        content_type='application/json').data)
+        self.assertEqual((data['updated'], {r['outcome'] for r in data['results']}), (0, {'conflict'}))
+        self.assertEqual([r.status for r in VacationRequest.query.filter(VacationRequest.id.in_(ids)).order_by(VacationRequest.id)],
+                         ['approved', 'approved', 'rejected'])
+
+        response = self.app.post('/overtime_entries/decisions', data=json.dumps({'ids': [e.id for e in overtime], 'decision': 'reject'}),
+                                 content_type='application/json')
+        self.assertEqual(json.loads(response.data)['updated'], 2)
+        self.assertEqual(self.app.post('/overtime_entries/decisions', data=json.dumps({'ids': [1], 'decision': 'maybe'}),
+                                       content_type='application/json').status_code, 400)
+        self.assertEqual(self.app.post('/overtime_entries/decisions', data=json.dumps({'ids': [], 'decision': 'approve'}),
+                                       content_type='application/json').status_code, 400)
+        response = self.app.post('/login', data=json.dumps({'username': username, 'password': 'password123'}),
+                                 content_type='application/json')
+        employee_auth = {'Authorization': f"Bearer {json.loads(response.data)['token']}"}
+        self.assertEqual(self.app.post('/vacation_requests/decisions', data=json.dumps(body), content_type='application/json',
+                                       headers=employee_auth).status_code, 403)
+
+    def test_29_vacation_balance(self):
+        print("\nRunning test_29_vacation_balance...")
+        username = f"testuser_balance_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+
+        def post_vacation(start_date, end_date):
+            response = self.app.post('/vacation_requests', data=json.dumps({'user_id': user_id, 'start_date': start_date, 'end_date': end_date}),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 201, response.data)
+            return json.loads(response.data)['request']['id']
+
+        def balance(year):
+            response = self.app.get(f'/vacation_balance?user_id={user_id}&year={year}')
+            self.assertEqual(response.status_code, 200, response.data)
+            data = json.loads(response.data)
+            return data['used_days'], data['pending_days'], data['available_days']
+
+        accrued = app.config['VACATION_DAYS_PER_YEAR']
+        self.assertEqual(balance(2040), (0, 0, accrued))
+        # Mon 2040-04-02 is Easter Monday: the week has four working days
+        easter_week = post_vacation('2040-04-02', '2040-04-08')
+        # Thu 2040-12-27 to Fri 2041-01-04: 3 working days in 2040, 2 in 2041 (New Year, Epiphany on Sat)
+        new_year = post_vacation('2040-12-27', '2041-01-04')
+        self.assertEqual(balance(2040), (0, 7, accrued - 7))
+        self.assertEqual(balance(2041), (0, 3, accrued - 3))
+
+        with count_queries() as statements:
+            self.app.get(f'/vacation_balance?user_id={user_id}&year=2040')
+        self.assertEqual(len(statements), 2, statements) # the manager's user existence check + one ledger row
+
+        self.app.post('/vacation_requests/decisions', data=json.dumps({'ids': [easter_week], 'decision': 'approve'}),
+                      content_type='application/json')
+        self.app.post('/vacation_requests/decisions', data=json.dumps({'ids': [new_year], 'decision': 'reject'}),
+                      content_type='application/json')
+        self.assertEqual(balance(2040), (4, 0, accrued - 4))
+        self.assertEqual(balance(2041), (0, 0, accrued))
+
+        VacationLedger.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+        result = app.test_cli_runner().invoke(args=['rebuild-vacation-ledger', '--user-id', str(user_id)])
+        self.assertIn('Rebuilt 1 vacation ledger rows', result.output)
+        self.assertEqual(balance(2040), (4, 0, accrued - 4))
+
+    def test_30_location_closures(self):
+        print("\nRunning test_30_location_closures...")
+        username = f"testuser_closure_{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        self.app.post('/register',
+                      data=json.dumps({'username': username, 'email': f'{username}@example.com', 'password': 'password123'}),
+                      content_type='application/json')
+        user_id = User.query.filter_by(username=username).first().id
+        self.addCleanup(self._delete_user, user_id)
+        location = f'Torino {username}'
+        self.addCleanup(lambda: (LocationClosure.query.filter_by(location=location).delete(), db.session.commit()))
+
+        def working_days():
+            response = self.app.get('/calendar', query_string={'year': 2042, 'location': location})
+            self.assertEqual(response.status_code, 200, response.data)
+            return json.loads(response.data)['working_days']
+
+        self.assertEqual(working_days(), 251)
+        body = {'location': location, 'date': '2042-06-24', 'name': 'San Giovanni'} # a Tuesday
+        response = self.app.post('/calendar/closures', data=json.dumps(body), content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.data)
+        closure_id = json.loads(response.data)['closure']['id']
+        self.assertEqual(self.app.post('/calendar/closures', data=json.dumps(body), content_type='application/json').status_code, 409)
+        self.assertEqual(self.app.post('/calendar/closures', data=json.dumps(dict(body, date='24/06/2042')),
+                                       content_type='application/json').status_code, 400)
+        self.assertEqual(working_days(), 250)
+        with count_queries() as statements:
+            working_days()
+        self.assertEqual(statements, []) # the location's calendar is cached
+        holidays = json.loads(self.app.get('/calendar', query_string={'year': 2042, 'location': location}).data)['holidays']
+        self.assertIn({'date': '2042-06-24', 'name': 'San Giovanni'}, holidays)
+        self.assertEqual(len(holidays), 14)
+        self.assertEqual(json.loads(self.app.get('/calendar?year=2042').data)['working_days'], 251)
+        listed = json.loads(self.app.get('/calendar/closures', query_string={'location': location}).data)
+        self.assertEqual([(c['id'], c['date'], c['name']) for c in listed], [(closure_id, '2042-06-24', 'San Giovanni')])
+
+        # Work at that location on its closure day is holiday overtime; elsewhere it is a weekday
+        start_at, end_at = shift_interval(date(2042, 6, 24), time(9), time(13))
+        db.session.add_all([
+            Shift(user_id=user_id, date=date(2042, 6, 24), start_at=start_at, end_at=end_at, location=location),
+            TimeEntry(user_id=user_id, date=date(2042, 6, 24), clock_in_time=start_at, clock_out_time=end_at + timedelta(hours=2)),
+            TimeEntry(user_id=user_id, date=date(2042, 6, 25), clock_in_time=start_at + timedelta(days=1),
+                      clock_out_time=end_at + timedelta(days=1)),
+        ])
+        db.session.commit()
+        response = self.app.post('/overtime_entries/derive', data=json.dumps(
+            {'start_date': '2042-06-24', 'end_date': '2042-06-25', 'user_ids': [user_id]}), content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([(e.date.day, e.hours, e.overtime_type) for e in OvertimeEntry.query.filter_by(user_id=user_id).order_by(OvertimeEntry.date)],
+                         [(24, 2.0, 'holiday'), (25, 4.0, 'weekday')])
+
+        matrix = json.loads(self.app.get('/schedule/matrix', query_string={'start': '2042-06-01', 'end': '2042-06-24', 'location': location}).data)
+        self.assertEqual(matrix['holidays'][1], 'Festa della Repubblica')
+        self.assertEqual(matrix['holidays'][23], 'San Giovanni')
+        self.assertEqual(matrix['holidays'].count(None), 22)
+
+        self.assertEqual(self.app.delete(f'/calendar/closures/{closure_id}').status_code, 200)
+        self.assertEqual(self.app.delete(f'/calendar/closures/{closure_id}').status_code, 404)
+        self.assertEqual(working_days(), 251)
+
+    def test_31_metrics(self):
+        print("\nRunning test_31_metrics...")
+        self.app.get('/shifts?date=2042-06-01')
+        self.app.get('/shifts?date=2042-06-02')
+        self.app.get('/no_such_page')
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.data.decode()
+        labels = 'endpoint="api.get_shifts",method="GET"'
+        counts = {line.rsplit(' ', 1)[0]: float(line.rsplit(' ', 1)[1]) for line in text.splitlines() if not line.startswith('#')}
+        self.assertGreaterEqual(counts[f'worktime_http_requests_total{{{labels},status="200"}}'], 2)
+        self.assertEqual(counts[f'worktime_http_request_duration_seconds_count{{{labels}}}'],
+                         counts[f'worktime_http_request_duration_seconds_bucket{{{labels},le="+Inf"}}'])
+        self.assertGreaterEqual(counts[f'worktime_sql_statements_per_request_sum{{{labels}}}'], 2)
+        self.assertGreater(counts[f'worktime_sql_seconds_total{{{labels}}}'], 0)
+        self.assertIn('worktime_http_requests_total{endpoint="unmatched",method="GET",status="404"}', text)
+        self.assertIn('worktime_cache_hits_total{cache="report"}', text)
+
+        # Threshold logging: every request here runs at least one statement
+        app.config['SLOW_REQUEST_QUERIES'] = 1
+        self.addCleanup(app.config.update, SLOW_REQUEST_QUERIES=0)
+        with self.assertLogs(app.logger, 'WARNING') as logs:
+            self.app.get('/shifts?date=2042-06-01')
+        self.assertIn('Slow request GET /shifts (api.get_shifts)', logs.output[0])
+
+        # Scrapers use METRICS_TOKEN; employees cannot read metrics
+        app.config['METRICS_TOKEN'] = 'scrape-secret'
+        self.addCleanup(app.config.update, METRICS_TOKEN=None)
+        self.assertEqual(self.app.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code, 200)
+        self.assertEqual(self.app.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        token, _ = issue_token(app.config['SECRET_KEY'], self.test_user_id, 'employee', 60)
+        self.assertEqual(self.app.get('/metrics', headers={'Authorization': f'Bearer {token}'}).status_code, 403)
+
+    @staticmethod
+    def _delete_user(user_id):
+        Shift.query.filter_by(user_id=user_id).delete()
+        TimeEntry.query.filter_by(user_id=user_id).delete()
+        VacationRequest.query.filter_by(user_id=user_id).delete()
+        OvertimeEntry.query.filter_by(user_id=user_id).delete()
+        MonthlyHoursRollup.query.filter_by(user_id=user_id).delete()
+        VacationLedger.query.filter_by(user_id=user_id).delete()
+        User.query.filter_by(id=user_id).delete()
+        db.session.commit()
+
+
+class FakeRedis:
+    """Just enough of the redis-py client API for RedisCache."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = value.encode()
+
+    def delete(self, *names):
+        return sum(self.data.pop(name, None) is not None for name in names)
+
+    def incr(self, name):
+        self.data[name] = str(int(self.data.get(name, 0)) + 1).encode()
+        return int(self.data[name])
+
+    def expire(self, name, seconds):
+        return name in self.data
+
+    def scan_iter(self, match):
+        prefix = match.rstrip('*')
+        return [name for name in list(self.data) if name.startswith(prefix)]
+
+
+class ReportCacheTests(unittest.TestCase):
+    def test_lru_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set((1, 2023), {'total': 1})
+        cache.set((1, 2024), {'total': 2})
+        self.assertEqual(cache.get((1, 2023)), {'total': 1})
+        cache.set((2, 2024), {'total': 3})
+        self.assertIsNone(cache.get((1, 2024)))
+        self.assertEqual(cache.get((1, 2023)), {'total': 1})
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['size']), (2, 1, 1, 2))
+
+    def test_lru_expires_after_ttl(self):
+        now = [100.0]
+        cache = LRUCache(maxsize=10, ttl=5, clock=lambda: now[0])
+        cache.set((1, 2024), 'report')
+        now[0] += 4.9
+        self.assertEqual(cache.get((1, 2024)), 'report')
+        now[0] += 0.2
+        self.assertIsNone(cache.get((1, 2024)))
+
+    def test_lru_delete_is_precise(self):
+        cache = LRUCache()
+        cache.set((1, 2024), 'a')
+        cache.set((1, 2023), 'b')
+        cache.delete((1, 2024))
+        self.assertIsNone(cache.get((1, 2024)))
+        self.assertEqual(cache.get((1, 2023)), 'b')
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_set_skips_value_read_before_an_invalidation(self):
+        for cache in (LRUCache(), RedisCache(FakeRedis(), prefix='test:', ttl=60)):
+            version = cache.version((1, 2024))  # a reader starts building the report
+            cache.delete((1, 2024))              # a clock-out commits and invalidates
+            cache.set((1, 2024), 'stale', version=version)
+            self.assertIsNone(cache.get((1, 2024)), type(cache).__name__)
+            cache.set((1, 2024), 'fresh', version=cache.version((1, 2024)))
+            self.assertEqual(cache.get((1, 2024)), 'fresh')
+
+    def test_redis_backend_round_trip(self):
+        client = FakeRedis()
+        cache = RedisCache(client, prefix='test:', ttl=60)
+        cache.set((7, 2024), {'monthly_breakdown': [{'month': 1, 'total_hours': 1.5}]})
+        self.assertIn('test:7:2024', client.data)
+        self.assertEqual(cache.get((7, 2024)), {'monthly_breakdown': [{'month': 1, 'total_hours': 1.5}]})
+        self.assertIsNone(cache.get((7, 2023)))
+        cache.set((7, 2023), {})
+        cache.delete((7, 2024))
+        self.assertIsNone(cache.get((7, 2024)))
+        cache.clear()
+        self.assertEqual(client.data, {'test-version:7:2024': b'1'}, "values go, invalidation versions stay")
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['invalidations']), (1, 2, 2))
+
+
+class PasswordHasherTests(unittest.TestCase):
+    def test_hash_verify_and_rehash(self):
+        hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1)
+        stored = hasher.hash('secret')
+        self.assertTrue(stored.startswith('pbkdf2:sha256:1000$'))
+        self.assertTrue(hasher.verify(stored, 'secret'))
+        self.assertFalse(hasher.verify(stored, 'Secret'))
+        self.assertFalse(hasher.needs_rehash(stored))
+        self.assertTrue(PasswordHasher('pbkdf2:sha256:2000').needs_rehash(stored))
+        self.assertTrue(PasswordHasher('scrypt').needs_rehash(stored))
+
+    def test_refuses_work_beyond_max_pending(self):
+        hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1, max_pending=1)
+        release = threading.Event()
+        started = threading.Event()
+
+        def blocking_hash():
+            started.set()
+            release.wait()
+
+        waiter = threading.Thread(target=hasher._run, args=(blocking_hash,))
+        waiter.start()
+        started.wait()
+        with self.assertRaises(PasswordHasherBusy):
+            hasher.hash('secret')
+        release.set()
+        waiter.join()
+        self.assertTrue(hasher.verify(hasher.hash('secret'), 'secret'))
+
+    def test_pending_bound_leaves_request_threads_free(self):
+        self.assertEqual(password_hash_max_pending(8), 4)
+        self.assertEqual(password_hash_max_pending(1), 1)
+        self.assertEqual(password_hash_max_pending(8, '7'), 7)
+        for request_threads, configured in ((8, 8), (8, 64), (8, 0), (0, None)):
+            with self.assertRaises(RuntimeError):
+                password_hash_max_pending(request_threads, configured)
+        worker = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'REQUEST_THREADS': 6, 'TESTING': True})
+        self.assertEqual(worker.extensions['password_hasher'].max_pending, 3)
+
+
+class ConflictCheckerTests(unittest.TestCase):
+    def test_overlap_rest_and_vacation(self):
+        checker = ConflictChecker(min_rest=timedelta(hours=11))
+        checker.add_shift(1, *shift_interval(date(2024, 3, 4), time(22), time(6)), ref={'shift_id': 7})
+        checker.add_shift(2, *shift_interval(date(2024, 3, 5), time(9), time(17)))
+        checker.set_vacations(1, [(date(2024, 3, 15), date(2024, 3, 16)), (date(2024, 3, 10), date(2024, 3, 14))])
+
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 5), time(5), time(9)))[0]['type'], 'overlap')
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 5), time(16), time(22)))[0]['rest_hours'], 10.0)
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 5), time(17), time(22))), [])
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 4), time(6), time(11))), [])
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 5), time(16), time(22)))[0]['shift_id'], 7)
+        # Split shifts: no minimum rest between shifts of the same roster day
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 4), time(8), time(12))), [])
+        self.assertEqual(checker.check(2, *shift_interval(date(2024, 3, 5), time(5), time(8))), [])
+        no_rest = ConflictChecker(min_rest=timedelta(0))
+        no_rest.add_shift(1, *shift_interval(date(2024, 3, 4), time(22), time(6)))
+        self.assertEqual(no_rest.check(1, *shift_interval(date(2024, 3, 5), time(6), time(10))), [])
+        self.assertEqual(checker.check(3, *shift_interval(date(2024, 3, 5), time(9), time(17))), [])
+        # Adjacent vacations are merged into one range
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 16), time(9), time(17))),
+                         [{'type': 'vacation', 'start_date': '2024-03-10', 'end_date': '2024-03-16'}])
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 17), time(9), time(17))), [])
+        self.assertEqual(checker.check(1, *shift_interval(date(2024, 3, 9), time(20), time(0))), [])
+
+
+class ImporterTests(unittest.TestCase):
+    def test_read_and_parse_records(self):
+        stream = io.StringIO('username, clock_in_time,clock_out_time,date\r\nanna,2024-01-31T22:00,2024-02-01T06:00,\r\n\r\nbob,2024-02-01T08:00,2024-02-01T12:00,2024-01-31\r\n')
+        records = list(read_records(stream, 'csv'))
+        self.assertEqual(len(records), 2)
+        row = parse_time_entry(records[0], {1}, {'anna': 1})
+        self.assertEqual(row, {'user_id': 1, 'date': date(2024, 1, 31), 'clock_in_time': datetime(2024, 1, 31, 22),
+                               'clock_out_time': datetime(2024, 2, 1, 6)})
+        with self.assertRaises(InvalidRecord):
+            parse_time_entry(records[1], {1}, {'anna': 1})
+        self.assertEqual(parse_time_entry(records[1], {2}, {'bob': 2})['date'], date(2024, 1, 31))
+
+        records = list(read_records(io.StringIO('{"user_id": 1, "clock_in_time": "2024-01-01T08:00+01:00", "clock_out_time": "2024-01-01T09:00"}\n[1\n'), 'ndjson'))
+        for record in records:
+            with self.assertRaises(InvalidRecord):
+                parse_time_entry(record, {1}, {})
+
+
+class OvertimeDerivationTests(unittest.TestCase):
+    def test_sorted_merge(self):
+        d1, d2, d3 = date(2024, 3, 4), date(2024, 3, 5), date(2024, 3, 6)
+        worked = [(1, d1, 500), (1, d3, 100), (2, d1, 300), (3, d2, 50)]
+        scheduled = [(1, d1, 400), (1, d2, 400), (2, d1, 300), (2, d2, 400), (4, d1, 10)]
+        self.assertEqual(list(daily_overtime(worked, scheduled)), [(1, d1, 100), (1, d3, 100), (3, d2, 50)])
+        self.assertEqual(list(daily_overtime(worked, scheduled, min_overtime=60)), [(1, d1, 100), (1, d3, 100)])
+        self.assertEqual(list(daily_overtime(worked, [])), worked)
+
+
+class WorkCalendarTests(unittest.TestCase):
+    def test_working_days(self):
+        # 2024-04-22..28: Thursday the 25th is Liberation Day, the weekend does not count
+        self.assertEqual(working_days_by_year(date(2024, 4, 22), date(2024, 4, 28)), {2024: 4})
+        self.assertEqual(working_days_by_year(date(2024, 12, 30), date(2025, 1, 7)), {2024: 2, 2025: 3})
+        self.assertEqual(working_days_by_year(date(2024, 4, 27), date(2024, 4, 28)), {})
+
+    def test_year_calendar(self):
+        closures = {date(2024, 12, 6): 'Ponte', date(2024, 12, 7): "Sant'Ambrogio", date(2025, 12, 7): 'next year'}
+        calendar = YearCalendar(2024, closures)
+        self.assertEqual(calendar.day_type(date(2024, 12, 6)), 'holiday')
+        self.assertEqual(calendar.day_type(date(2024, 12, 7)), 'holiday') # a Saturday, but closed anyway
+        self.assertEqual(len(calendar.holidays()), 14)
+        self.assertEqual(calendar.working_days(date(2024, 12, 2), date(2024, 12, 8)), 4)
+        self.assertEqual(calendar.working_days(date(2023, 6, 1), date(2025, 6, 1)), 253)
+        self.assertEqual(calendar.working_days(date(2025, 1, 1), date(2025, 6, 1)), 0)
+        with self.assertRaises(ValueError):
+            calendar.is_holiday(date(2025, 1, 1))
+        # Prefix sums agree with a day by day count
+        day = date(2024, 1, 1)
+        for _ in range(200):
+            end = day + timedelta(days=random.randrange(60))
+            count = sum(is_working_day(day + timedelta(days=n)) for n in range((end - day).days + 1))
+            self.assertEqual(sum(working_days_by_year(day, end).values()), count)
+            day = end + timedelta(days=1)
+
+    def test_day_types(self):
+        self.assertEqual(easter_sunday(2024), date(2024, 3, 31))
+        self.assertEqual(easter_sunday(2038), date(2038, 4, 25))
+        self.assertEqual(len(national_holidays(2024)), 12)
+        self.assertEqual(national_holidays(2026)[date(2026, 10, 4)], "San Francesco d'Assisi")
+        self.assertEqual(day_type(date(2027, 10, 4)), 'holiday') # a Monday
+        self.assertEqual(day_type(date(2025, 10, 6)), 'weekday')
+        self.assertEqual(len(national_holidays(2025)), 12) # from 2026 only
+        self.assertEqual(day_type(date(2024, 4, 1)), 'holiday') # Easter Monday
+        self.assertEqual(day_type(date(2024, 12, 26)), 'holiday')
+        self.assertEqual(day_type(date(2024, 4, 6)), 'weekend')
+        self.assertEqual(day_type(date(2024, 4, 5)), 'weekday')
+
+
+class MetricsTests(unittest.TestCase):
+    def test_render_histograms_and_caches(self):
+        metrics = RequestMetrics(latency_buckets=(0.1, 1), statement_buckets=(1, 10))
+        metrics.observe('api.get_shifts', 'GET', 200, 0.1, 1, 0.02)
+        metrics.observe('api.get_shifts', 'GET', 500, 3, 12, 0.5)
+        metrics.observe('say "hi"', 'POST', 201, 0.5, 0, 0)
+        lines = metrics.render({'report': {'hits': 3, 'misses': 1, 'size': 2, 'hit_ratio': 0.75}}).splitlines()
+        labels = 'endpoint="api.get_shifts",method="GET"'
+        for line in [
+            f'worktime_http_requests_total{{{labels},status="500"}} 1',
+            f'worktime_http_request_duration_seconds_bucket{{{labels},le="0.1"}} 1', # bounds are inclusive
+            f'worktime_http_request_duration_seconds_bucket{{{labels},le="1"}} 1',
+            f'worktime_http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2',
+            f'worktime_http_request_duration_seconds_count{{{labels}}} 2',
+            f'worktime_sql_statements_per_request_bucket{{{labels},le="10"}} 1',
+            f'worktime_sql_statements_per_request_sum{{{labels}}} 13',
+            f'worktime_sql_seconds_total{{{labels}}} 0.52',
+            'worktime_http_requests_total{endpoint="say \\"hi\\"",method="POST",status="201"} 1',
+            '# TYPE worktime_cache_hits_total counter',
+            'worktime_cache_hits_total{cache="report"} 3',
+            'worktime_cache_size{cache="report"} 2',
+        ]:
+            self.assertIn(line, lines)
+        self.assertFalse(any('hit_ratio' in line or 'evictions' in line for line in lines))
+
+
+class TokenTests(unittest.TestCase):
+    def test_round_trip_and_expiry(self):
+        token, expires_at = issue_token('secret', 42, 'employee', ttl=60, now=1000)
+        self.assertEqual(expires_at, 1060)
+        self.assertEqual(verify_token('secret', token, now=1059), {'user_id': 42, 'role': 'employee'})
+        with self.assertRaises(InvalidToken):
+            verify_token('secret', token, now=1060)
+
+    def test_rejects_tampering(self):
+        token, _ = issue_token('secret', 42, 'employee', ttl=60)
+        with self.assertRaises(InvalidToken):
+            verify_token('other secret', token)
+        forged, _ = issue_token('secret', 42, 'admin', ttl=60)
+        with self.assertRaises(InvalidToken):
+            verify_token('secret', forged.split('.')[0] + '.' + token.split('.')[1])
+        for garbage in ('', 'abc', 'a.b.c', 'é.é'):
+            with self.assertRaises(InvalidToken):
+                verify_token('secret', garbage)
+
+    def test_secret_key_required_outside_tests(self):
+        with unittest.mock.patch.dict(os.environ):
+            os.environ.pop('SECRET_KEY', None)
+            with self.assertRaises(RuntimeError):
+                create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})
+            # Tests and debug runs get a random key of their own
+            keys = {create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://', mode: True}).config['SECRET_KEY']
+                    for mode in ('TESTING', 'DEBUG')}
+            self.assertEqual(len(keys), 2)
+            os.environ['SECRET_KEY'] = 'shared'
+            self.assertEqual(create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}).config['SECRET_KEY'], 'shared')
+
 
 if __name__ == '__main__':
     suite = unittest.TestSuite()
@@ -181,6 +1542,38 @@ if __name__ == '__main__':
     suite.addTest(APISmokeTests('test_05_vacation_request'))
     suite.addTest(APISmokeTests('test_06_overtime_entry'))
     suite.addTest(APISmokeTests('test_07_annual_report'))
+    suite.addTest(APISmokeTests('test_08_shifts_month_filter_boundaries'))
+    suite.addTest(APISmokeTests('test_09_list_endpoints_query_count'))
+    suite.addTest(APISmokeTests('test_10_annual_report_matches_python_reference'))
+    suite.addTest(APISmokeTests('test_11_clock_out_updates_monthly_rollup'))
+    suite.addTest(APISmokeTests('test_12_bulk_create_shifts'))
+    suite.addTest(APISmokeTests('test_13_keyset_pagination_and_streaming'))
+    suite.addTest(APISmokeTests('test_14_etag_revalidation'))
+    suite.addTest(APISmokeTests('test_15_clock_out_invalidates_cached_report'))
+    suite.addTest(APISmokeTests('test_16_shifts_date_range_grouped'))
+    suite.addTest(APISmokeTests('test_17_vacation_request_views'))
+    suite.addTest(APISmokeTests('test_18_concurrent_clock_in_and_out'))
+    suite.addTest(APISmokeTests('test_19_token_authentication'))
+    suite.addTest(APISmokeTests('test_20_login_rehashes_outdated_password_hash'))
+    suite.addTest(APISmokeTests('test_21_columnar_list_format'))
+    suite.addTest(APISmokeTests('test_22_schedule_matrix'))
+    suite.addTest(APISmokeTests('test_23_shift_conflicts'))
+    suite.addTest(APISmokeTests('test_24_overnight_shifts_and_cross_month_hours'))
+    suite.addTest(APISmokeTests('test_25_import_time_entries'))
+    suite.addTest(APISmokeTests('test_26_payroll_export'))
+    suite.addTest(APISmokeTests('test_27_derive_overtime'))
+    suite.addTest(APISmokeTests('test_28_batch_decisions'))
+    suite.addTest(APISmokeTests('test_29_vacation_balance'))
+    suite.addTest(APISmokeTests('test_30_location_closures'))
+    suite.addTest(APISmokeTests('test_31_metrics'))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(ReportCacheTests))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(PasswordHasherTests))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(TokenTests))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(MetricsTests))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(ImporterTests))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(OvertimeDerivationTests))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(WorkCalendarTests))
+    suite.addTests(unittest.defaultTestLoader.loadTestsFromTestCase(ConflictCheckerTests))
 
     runner = unittest.TextTestRunner(verbosity=2)
     result = runner.run(suite)
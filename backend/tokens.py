@@ -0,0 +1,50 @@
+"""Stateless signed access tokens (stdlib HMAC-SHA256).
+
+A token is ``<payload>.<signature>``, both base64url without padding. The
+payload is compact JSON carrying the user id, role and expiry, so verifying a
+request needs the secret key only, no database lookup.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _sign(secret_key, payload):
+    return hmac.new(secret_key.encode(), payload.encode('ascii'), hashlib.sha256).digest()
+
+
+def issue_token(secret_key, user_id, role, ttl, now=None):
+    """Return (token, expires_at) for the user; expires_at is a Unix timestamp."""
+    expires_at = int(now if now is not None else time.time()) + ttl
+    payload = _b64encode(json.dumps({'uid': user_id, 'role': role, 'exp': expires_at}, separators=(',', ':')).encode())
+    return f'{payload}.{_b64encode(_sign(secret_key, payload))}', expires_at
+
+
+def verify_token(secret_key, token, now=None):
+    """Return {'user_id', 'role'} for a valid token or raise InvalidToken."""
+    try:
+        payload, signature = token.split('.')
+        valid = hmac.compare_digest(_b64decode(signature), _sign(secret_key, payload))
+    except (ValueError, UnicodeError):
+        raise InvalidToken('Malformed token')
+    if not valid:
+        raise InvalidToken('Bad signature')
+
+    claims = json.loads(_b64decode(payload))
+    if claims['exp'] <= (now if now is not None else time.time()):
+        raise InvalidToken('Token expired')
+    return {'user_id': claims['uid'], 'role': claims['role']}
@@ -0,0 +1,148 @@
+"""Working calendar: Italian national public holidays, per-location closures
+and day classification.
+
+Each year is precomputed into a YearCalendar: one byte per day of the year
+flags the closed days, and a prefix sum over the working days answers "how
+many working days between two dates" with two array reads, so lookups cost
+the same whatever the length of the range.
+"""
+import functools
+from array import array
+from datetime import date, timedelta
+from itertools import accumulate
+
+# (month, day, name) of the holidays that fall on the same date every year
+FIXED_HOLIDAYS = [
+    (1, 1, 'Capodanno'),
+    (1, 6, 'Epifania'),
+    (4, 25, 'Festa della Liberazione'),
+    (5, 1, 'Festa del Lavoro'),
+    (6, 2, 'Festa della Repubblica'),
+    (8, 15, 'Ferragosto'),
+    (11, 1, 'Ognissanti'),
+    (12, 8, 'Immacolata Concezione'),
+    (12, 25, 'Natale'),
+    (12, 26, 'Santo Stefano'),
+]
+
+# (first year, month, day, name) of fixed holidays introduced later on
+LATER_FIXED_HOLIDAYS = [
+    (2026, 10, 4, "San Francesco d'Assisi"),
+]
+
+
+def easter_sunday(year):
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+@functools.lru_cache(maxsize=None)
+def national_holidays(year):
+    """{date: name} of the national public holidays in a year; do not modify."""
+    holidays = {date(year, month, day): name for month, day, name in FIXED_HOLIDAYS}
+    holidays.update((date(year, month, day), name) for first_year, month, day, name in LATER_FIXED_HOLIDAYS
+                    if year >= first_year)
+    easter = easter_sunday(year)
+    holidays[easter] = 'Pasqua'
+    holidays[easter + timedelta(days=1)] = "Lunedì dell'Angelo"
+    return holidays
+
+
+class YearCalendar:
+    """Closed and working days of one year, indexed by day of the year.
+
+    closures is an optional {date: name} of extra closed days on top of the
+    national holidays (e.g. a location's patron saint); dates outside the
+    year are ignored. Instances are immutable once built.
+    """
+
+    def __init__(self, year, closures=None):
+        self.year = year
+        self._first_ordinal = date(year, 1, 1).toordinal()
+        n_days = date(year + 1, 1, 1).toordinal() - self._first_ordinal
+        self.names = dict(national_holidays(year))
+        self.names.update((day, name) for day, name in (closures or {}).items() if day.year == year)
+        self._closed = bytearray(n_days)
+        for day in self.names:
+            self._closed[day.toordinal() - self._first_ordinal] = 1
+        first_weekday = date(year, 1, 1).weekday()
+        self._weekend = bytes((first_weekday + offset) % 7 >= 5 for offset in range(n_days))
+        # _working_prefix[i] is the number of working days before day index i
+        self._working_prefix = array('H', accumulate(
+            (not (closed or weekend) for closed, weekend in zip(self._closed, self._weekend)), initial=0
+        ))
+
+    def _index(self, day):
+        index = day.toordinal() - self._first_ordinal
+        if not 0 <= index < len(self._closed):
+            raise ValueError(f'{day} is not in {self.year}')
+        return index
+
+    def is_holiday(self, day):
+        """National holiday or closure."""
+        return bool(self._closed[self._index(day)])
+
+    def day_type(self, day):
+        """'holiday', 'weekend' or 'weekday', the OvertimeEntry.overtime_type values."""
+        index = self._index(day)
+        if self._closed[index]:
+            return 'holiday'
+        return 'weekend' if self._weekend[index] else 'weekday'
+
+    def is_working_day(self, day):
+        """Monday to Friday and neither a holiday nor a closure."""
+        index = self._index(day)
+        return self._working_prefix[index + 1] != self._working_prefix[index]
+
+    def working_days(self, start, end):
+        """Working days in the inclusive range [start, end], clipped to this year."""
+        start_index = max(start.toordinal() - self._first_ordinal, 0)
+        end_index = min(end.toordinal() - self._first_ordinal + 1, len(self._closed))
+        if end_index <= start_index:
+            return 0
+        return self._working_prefix[end_index] - self._working_prefix[start_index]
+
+    def holidays(self):
+        """[(date, name)] of the year's holidays and closures in date order."""
+        return sorted(self.names.items())
+
+
+@functools.lru_cache(maxsize=64)
+def national_calendar(year):
+    """YearCalendar with the national holidays only."""
+    return YearCalendar(year)
+
+
+def day_type(day, calendar=None):
+    """'holiday', 'weekend' or 'weekday', the OvertimeEntry.overtime_type values.
+
+    calendar is the day's YearCalendar, national holidays only by default.
+    """
+    return (calendar or national_calendar(day.year)).day_type(day)
+
+
+def is_working_day(day):
+    """Monday to Friday and not a national holiday."""
+    return national_calendar(day.year).is_working_day(day)
+
+
+def working_days_by_year(start, end, calendar_for=national_calendar):
+    """{year: number of working days} in the inclusive range [start, end].
+
+    calendar_for(year) returns the YearCalendar to count with.
+    """
+    counts = {}
+    for year in range(start.year, end.year + 1):
+        days = calendar_for(year).working_days(start, end)
+        if days:
+            counts[year] = days
+    return counts
@@ -0,0 +1,24 @@
+"""Production entry point.
+
+    REQUEST_THREADS=8 gunicorn --workers 4 --threads 8 --bind 0.0.0.0:8000 wsgi:app
+
+Keep REQUEST_THREADS equal to the server's threads per worker: password
+hashing may hold at most PASSWORD_HASH_MAX_PENDING of them (default half),
+and logins beyond that get a 503 so the remaining threads serve other requests.
+
+Pool sizing (DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+DB_POOL_PRE_PING) applies per worker process for PostgreSQL; SQLite is tuned
+with SQLITE_WAL, SQLITE_BUSY_TIMEOUT_MS and SQLITE_MMAP_SIZE. For an ASGI
+server, wrap it: uvicorn --interface wsgi wsgi:app.
+
+Set SECRET_KEY (and optionally AUTH_TOKEN_TTL, in seconds), the same for every
+worker: create_app() refuses to start without it outside tests and debug runs.
+
+/metrics (Prometheus text, scraped with METRICS_TOKEN as a bearer token)
+reports the worker that answers the scrape only. SLOW_QUERY_MS,
+SLOW_REQUEST_MS and SLOW_REQUEST_QUERIES turn on warning logs for slow
+statements and slow or query-heavy requests.
+"""
+from app import create_app
+
+app = create_app()
@@ -2,12 +2,23 @@
 document.addEventListener('DOMContentLoaded', async function() {
     const userId = localStorage.getItem('userId');
     const userData = JSON.parse(localStorage.getItem('workTimeUser'));
+    const authToken = localStorage.getItem('authToken');
 
-    if (!userId || !userData) {
+    if (!userId || !userData || !authToken) {
         window.location.href = '/login.html';
         return;
     }
 
+    // API calls carry the token issued at login; once it expires, log in again
+    async function apiFetch(url, options = {}) {
+        const response = await fetch(url, { ...options, headers: { ...options.headers, 'Authorization': `Bearer ${authToken}` } });
+        if (response.status === 401) {
+            localStorage.removeItem('authToken');
+            window.location.href = '/login.html';
+        }
+        return response;
+    }
+
     // Page elements
     const shiftsTableBody = document.querySelector('table tbody');
     const addShiftButtonTrigger = Array.from(document.querySelectorAll('button .truncate')).find(el => el.textContent.trim() === 'Aggiungi Turno')?.closest('button');
@@ -62,7 +73,7 @@ document.addEventListener('DOMContentLoaded', async function() {
         shiftsTableBody.innerHTML = '';
 
         try {
-            const response = await fetch(`/shifts?user_id=${userId}&year=${year}&month=${month}`);
+            const response = await apiFetch(`/shifts?user_id=${userId}&year=${year}&month=${month}`);
             if (!response.ok) {
                 const errorData = await response.json();
                 throw new Error(errorData.message || `HTTP error! status: ${response.status}`);
@@ -132,8 +143,12 @@ document.addEventListener('DOMContentLoaded', async function() {
                 showUIMessageGT('Data, Ora Inizio e Ora Fine sono obbligatori.', 'error');
                 return;
             }
-            if (startTime >= endTime) {
-                showUIMessageGT('L\'ora di inizio deve essere precedente all\'ora di fine.', 'error');
+            if (startTime === endTime) {
+                showUIMessageGT('L\'ora di inizio e l\'ora di fine devono essere diverse.', 'error');
+                return;
+            }
+            // An end before the start is a night shift ending the next day (e.g. 22:00-06:00)
+            if (endTime < startTime && !confirm(`Il turno termina il giorno successivo alle ${endTime}. Confermi?`)) {
                 return;
             }
 
@@ -143,7 +158,7 @@ document.addEventListener('DOMContentLoaded', async function() {
             };
 
             try {
-                const response = await fetch('/shifts', {
+                const response = await apiFetch('/shifts', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
                     body: JSON.stringify(shiftData)